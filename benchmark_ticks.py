@@ -0,0 +1,71 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import argparse
+import logging
+import random
+import time
+from importlib import import_module
+
+from pendulum import duration
+
+
+def benchmark_ticks(setup_module_name, ticks, tick_length_s, slot_length_m,
+                    max_offer_traversal_length, seed):
+    """
+    Prints the time the setup takes to be built and activated, and then the time of each of
+    its first ticks.
+
+    The areas are built with get_setup and ticked directly instead of running a Simulation,
+    so that large setups like 1000_houses, whose area names are not unique, can be timed.
+    """
+    from d3a.models.config import SimulationConfig
+    from d3a.models.const import ConstSettings
+
+    logging.disable(logging.CRITICAL)
+    random.seed(seed)
+    ConstSettings.GeneralSettings.MAX_OFFER_TRAVERSAL_LENGTH = max_offer_traversal_length
+    config = SimulationConfig(duration=duration(hours=1),
+                              slot_length=duration(minutes=slot_length_m),
+                              tick_length=duration(seconds=tick_length_s),
+                              market_count=1, cloud_coverage=0, market_maker_rate='30',
+                              iaa_fee=1)
+
+    start = time.time()
+    area = import_module("d3a.setup.{}".format(setup_module_name)).get_setup(config)
+    area.activate()
+    print("setup and activation: {:.3f} s".format(time.time() - start), flush=True)
+
+    ticks_start = time.time()
+    for tick in range(ticks):
+        tick_start = time.time()
+        area.tick(is_root_area=True)
+        print("tick {}: {:.3f} s".format(tick, time.time() - tick_start), flush=True)
+    print("{} ticks: {:.3f} s".format(ticks, time.time() - ticks_start))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the ticks of a setup")
+    parser.add_argument("setup_module_name", nargs="?", default="1000_houses")
+    parser.add_argument("--ticks", type=int, default=12)
+    parser.add_argument("--tick-length", type=int, default=15, help="seconds")
+    parser.add_argument("--slot-length", type=int, default=15, help="minutes")
+    parser.add_argument("--max-offer-traversal-length", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    benchmark_ticks(args.setup_module_name, args.ticks, args.tick_length, args.slot_length,
+                    args.max_offer_traversal_length, args.seed)
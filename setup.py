@@ -24,7 +24,7 @@ setup(
     version=VERSION,
     packages=find_packages(where="src", exclude=["tests"]),
     package_dir={"": "src"},
-    package_data={'d3a': ['contracts/*.sol', 'resources/*.csv']},
+    package_data={'d3a': ['contracts/*.sol', 'resources/*.csv', 'templates/*.html']},
     install_requires=REQUIREMENTS,
     entry_points={
         'console_scripts': [
@@ -19,6 +19,7 @@ import json
 
 from d3a.models.area import Area # NOQA
 from d3a.models.budget_keeper import BudgetKeeper
+from d3a.models.read_user_profile import TimeOfDayProfile
 from d3a.models.strategy import BaseStrategy
 from d3a.models.appliance.simple import SimpleAppliance # NOQA
 
@@ -46,6 +47,8 @@ class AreaEncoder(json.JSONEncoder):
             return self._encode_leaf(obj)
         elif isinstance(obj, (BaseStrategy, SimpleAppliance, BudgetKeeper)):
             return self._encode_subobject(obj)
+        elif isinstance(obj, TimeOfDayProfile):
+            return dict(obj)
 
     def _encode_area(self, area):
         result = {"name": area.name}
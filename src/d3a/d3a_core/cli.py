@@ -15,7 +15,9 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
+import ast
 import logging
+import os
 from logging import getLogger
 
 import click
@@ -23,13 +25,15 @@ import dill
 from click.types import Choice, File
 from click_default_group import DefaultGroup
 from colorlog.colorlog import ColoredFormatter
+from pendulum import DateTime
 
+from d3a.constants import TIME_ZONE
 from d3a.d3a_core.exceptions import D3AException
 from d3a.models.config import SimulationConfig
 from d3a.models.const import ConstSettings
 from d3a.d3a_core.simulation import Simulation
+from d3a.d3a_core.sweep import export_sweep_results, run_sweep
 from d3a.d3a_core.util import IntervalType, available_simulation_scenarios
-from d3a.d3a_core.web import start_web
 from d3a.d3a_core.util import read_settings_from_file
 from d3a.d3a_core.util import update_advanced_settings
 
@@ -58,24 +62,47 @@ def main(log_level):
 _setup_modules = available_simulation_scenarios
 
 
+_config_options = [
+    click.option('-d', '--duration', type=IntervalType('D:H'), default="1d", show_default=True,
+                 help="Duration of simulation"),
+    click.option('-t', '--tick-length', type=IntervalType('M:S'), default="1s",
+                 show_default=True, help="Length of a tick"),
+    click.option('-s', '--slot-length', type=IntervalType('M:S'), default="15m",
+                 show_default=True, help="Length of a market slot"),
+    click.option('-c', '--cloud_coverage', type=int,
+                 default=ConstSettings.PVSettings.DEFAULT_POWER_PROFILE, show_default=True,
+                 help="Cloud coverage, 0 for sunny, 1 for partial coverage, 2 for clouds."),
+    click.option('-r', '--market_maker_rate', type=str,
+                 default=str(ConstSettings.GeneralSettings.DEFAULT_MARKET_MAKER_RATE),
+                 show_default=True, help="Market maker rate"),
+    click.option('-f', '--iaa_fee', type=int,
+                 default=ConstSettings.IAASettings.FEE_PERCENTAGE, show_default=True,
+                 help="Inter-Area-Agent Fee in percentage"),
+    click.option('-m', '--market-count', type=int, default=1, show_default=True,
+                 help="Number of tradable market slots into the future"),
+    click.option('--live-past-market-count', type=int, default=None,
+                 help="Number of past market slots kept in full, older ones are only kept as "
+                      "summaries.  [default: keep all]"),
+]
+
+
+def _with_config_options(func):
+    """Options shared by all commands that start a simulation"""
+    for option in reversed(_config_options):
+        func = option(func)
+    return func
+
+
+def _simulation_config(settings_file, config_params):
+    if settings_file is not None:
+        simulation_settings, advanced_settings = read_settings_from_file(settings_file)
+        update_advanced_settings(advanced_settings)
+        return SimulationConfig(**simulation_settings)
+    return SimulationConfig(**config_params)
+
+
 @main.command()
-@click.option('-d', '--duration', type=IntervalType('D:H'), default="1d", show_default=True,
-              help="Duration of simulation")
-@click.option('-t', '--tick-length', type=IntervalType('M:S'), default="1s", show_default=True,
-              help="Length of a tick")
-@click.option('-s', '--slot-length', type=IntervalType('M:S'), default="15m", show_default=True,
-              help="Length of a market slot")
-@click.option('-c', '--cloud_coverage', type=int,
-              default=ConstSettings.PVSettings.DEFAULT_POWER_PROFILE, show_default=True,
-              help="Cloud coverage, 0 for sunny, 1 for partial coverage, 2 for clouds.")
-@click.option('-r', '--market_maker_rate', type=str,
-              default=str(ConstSettings.GeneralSettings.DEFAULT_MARKET_MAKER_RATE),
-              show_default=True, help="Market maker rate")
-@click.option('-f', '--iaa_fee', type=int,
-              default=ConstSettings.IAASettings.FEE_PERCENTAGE, show_default=True,
-              help="Inter-Area-Agent Fee in percentage")
-@click.option('-m', '--market-count', type=int, default=1, show_default=True,
-              help="Number of tradable market slots into the future")
+@_with_config_options
 @click.option('-i', '--interface', default="0.0.0.0", show_default=True,
               help="REST-API server listening interface")
 @click.option('-p', '--port', type=int, default=5000, show_default=True,
@@ -107,18 +134,15 @@ _setup_modules = available_simulation_scenarios
 @click.option('--export/--no-export', default=False, help="Export Simulation data in a CSV File")
 @click.option('--export-path',  type=str, default=None, show_default=False,
               help="Specify a path for the csv export files (default: ~/d3a-simulation)")
+@click.option('--progressive-export', is_flag=True, default=False,
+              help="Write the csv export files slot by slot during the run (implies --export)")
 @click.option('--enable-bc', is_flag=True, default=False, help="Run simulation on Blockchain")
 @click.option('--enable_bm', is_flag=True, default=False, help="Run simulation on BalancingMarket")
 def run(interface, port, setup_module_name, settings_file, slowdown, seed, paused, pause_after,
-        repl, export, export_path, reset_on_finish, reset_on_finish_wait, exit_on_finish,
-        exit_on_finish_wait, enable_bc, enable_bm, **config_params):
+        repl, export, export_path, progressive_export, reset_on_finish, reset_on_finish_wait,
+        exit_on_finish, exit_on_finish_wait, enable_bc, enable_bm, **config_params):
     try:
-        if settings_file is not None:
-            simulation_settings, advanced_settings = read_settings_from_file(settings_file)
-            update_advanced_settings(advanced_settings)
-            simulation_config = SimulationConfig(**simulation_settings)
-        else:
-            simulation_config = SimulationConfig(**config_params)
+        simulation_config = _simulation_config(settings_file, config_params)
 
         api_url = "http://{}:{}/api".format(interface, port)
         ConstSettings.BalancingSettings.ENABLE_BALANCING_MARKET = enable_bm
@@ -132,6 +156,7 @@ def run(interface, port, setup_module_name, settings_file, slowdown, seed, pause
             use_repl=repl,
             export=export,
             export_path=export_path,
+            progressive_export=progressive_export,
             reset_on_finish=reset_on_finish,
             reset_on_finish_wait=reset_on_finish_wait,
             exit_on_finish=exit_on_finish,
@@ -142,10 +167,101 @@ def run(interface, port, setup_module_name, settings_file, slowdown, seed, pause
         )
     except D3AException as ex:
         raise click.BadOptionUsage(ex.args[0])
+    from d3a.d3a_core.web import start_web
     start_web(interface, port, simulation)
     simulation.run()
 
 
+@main.command()
+@_with_config_options
+@click.option('--setup', 'setup_module_name', default="default_2a",
+              help="Simulation setup module use. Available modules: [{}]".format(
+                  ', '.join(_setup_modules)))
+@click.option('-g', '--settings_file', default=None,
+              help="Settings file path")
+@click.option('--seed', help="Manually specify random seed")
+@click.option('--export/--no-export', default=False, help="Export Simulation data in a CSV File")
+@click.option('--export-path',  type=str, default=None, show_default=False,
+              help="Specify a path for the csv export files (default: ~/d3a-simulation)")
+@click.option('--progressive-export', is_flag=True, default=False,
+              help="Write the csv export files slot by slot during the run (implies --export)")
+@click.option('--enable-bc', is_flag=True, default=False, help="Run simulation on Blockchain")
+@click.option('--enable_bm', is_flag=True, default=False, help="Run simulation on BalancingMarket")
+def batch(setup_module_name, settings_file, seed, export, export_path, progressive_export,
+          enable_bc, enable_bm, **config_params):
+    """Run a simulation to the end without console, REST-API or Redis"""
+    try:
+        simulation_config = _simulation_config(settings_file, config_params)
+        ConstSettings.BalancingSettings.ENABLE_BALANCING_MARKET = enable_bm
+        simulation = Simulation(
+            setup_module_name=setup_module_name,
+            simulation_config=simulation_config,
+            seed=seed,
+            export=export,
+            export_path=export_path,
+            progressive_export=progressive_export,
+            redis_job_id=None,
+            use_bc=enable_bc
+        )
+    except D3AException as ex:
+        raise click.BadOptionUsage(ex.args[0])
+    simulation.run_batch()
+
+
+def _parse_sweep_parameter(ctx, param, values):
+    grid = {}
+    for value in values:
+        name, sep, grid_values = value.partition('=')
+        if not sep or not grid_values:
+            raise click.BadParameter("Expected NAME=VALUE[,VALUE...], got '{}'".format(value))
+        grid[name.strip()] = [_literal(v.strip()) for v in grid_values.split(',')]
+    return grid
+
+
+def _literal(value):
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return value
+
+
+@main.command()
+@_with_config_options
+@click.option('--setup', 'setup_module_name', default="default_2a",
+              help="Simulation setup module use. Available modules: [{}]".format(
+                  ', '.join(_setup_modules)))
+@click.option('-g', '--settings_file', default=None,
+              help="Settings file path")
+@click.option('-P', '--parameter', 'grid', multiple=True, callback=_parse_sweep_parameter,
+              help="Swept parameter as NAME=VALUE[,VALUE...]. NAME is an option of this "
+                   "command (e.g. iaa_fee), 'seed' or a ConstSettings variable "
+                   "(e.g. IAASettings.MARKET_TYPE). Can be given multiple times.")
+@click.option('-w', '--workers', type=int, default=None,
+              help="Number of worker processes  [default: number of CPUs]")
+@click.option('--export-path',  type=str, default=None, show_default=False,
+              help="Specify a path for the results table (default: ~/d3a-simulation/sweep_<now>)")
+@click.option('--enable_bm', is_flag=True, default=False, help="Run simulation on BalancingMarket")
+def sweep(setup_module_name, settings_file, grid, workers, export_path, enable_bm,
+          **config_params):
+    """Run a batch simulation for every combination of the swept parameters"""
+    try:
+        if settings_file is not None:
+            config_params, advanced_settings = read_settings_from_file(settings_file)
+            update_advanced_settings(advanced_settings)
+        # Fail early on invalid parameters, before any simulation is started
+        SimulationConfig(**config_params)
+    except D3AException as ex:
+        raise click.BadOptionUsage(ex.args[0])
+    ConstSettings.BalancingSettings.ENABLE_BALANCING_MARKET = enable_bm
+    if export_path is None:
+        export_path = os.path.join(
+            "~/d3a-simulation", "sweep_{}".format(DateTime.now(tz=TIME_ZONE).isoformat())
+        )
+    results = run_sweep(setup_module_name, config_params, grid, max_workers=workers)
+    export_sweep_results(results, os.path.expanduser(export_path))
+    log.error("Results of %d simulations written to %s", len(results), export_path)
+
+
 @main.command()
 @click.option('-i', '--interface', default="0.0.0.0", show_default=True,
               help="REST-API server listening interface")
@@ -153,6 +269,7 @@ def run(interface, port, setup_module_name, settings_file, slowdown, seed, pause
               help="REST-API server listening port")
 @click.argument('save-file', type=File(mode='rb'))
 def resume(save_file, interface, port):
+    from d3a.d3a_core.web import start_web
     simulation = dill.load(save_file)
     start_web(interface, port, simulation)
     simulation.run(resume=True)
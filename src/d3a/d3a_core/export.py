@@ -16,18 +16,30 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 import csv
+import json
 import logging
+import multiprocessing
 import pathlib
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import plotly as py
 import plotly.graph_objs as go
 import pendulum
 import shutil
+from collections import namedtuple
+from functools import lru_cache, partial
+from itertools import chain
+from jinja2 import Environment, PackageLoader, select_autoescape
+from plotly.offline import get_plotlyjs
+from plotly.utils import PlotlyJSONEncoder
 
 from d3a.constants import TIME_ZONE
 from d3a.models.market.market_structures import Trade, BalancingTrade, Bid, Offer, BalancingOffer
 from d3a.models.area import Area
-from d3a.d3a_core.sim_results.file_export_endpoints import FileExportEndpoints
+from d3a.d3a_core.sim_results.area_statistics import FoldedMarkets
+from d3a.d3a_core.sim_results.file_export_endpoints import FileExportEndpoints, \
+    ExportBalancingData, ExportData
 
 
 _log = logging.getLogger(__name__)
@@ -42,15 +54,126 @@ def mkdir_from_str(directory: str, exist_ok=True, parents=True):
     return out_dir
 
 
+def export_directory(path: str, subdir: str):
+    if path is not None:
+        path = os.path.abspath(path)
+    return pathlib.Path(path or "~/d3a-simulation", subdir).expanduser()
+
+
+def csv_file_path(directory: dir, slug: str):
+    file_name = ("%s.csv" % slug).replace(' ', '_')
+    return directory.joinpath(file_name).as_posix()
+
+
+AreaCSVFile = namedtuple('AreaCSVFile', ('slug', 'labels', 'past_markets', 'rows_of',
+                                         'skip_if_empty'))
+
+
+def _trade_rows(trade_log, past_markets):
+    # The columns of Trade._to_csv, read from the trade log
+    for row in trade_log.rows_of_slots([market.time_slot for market in past_markets]):
+        yield (trade_log.time_slots[trade_log.slot_index[row]], trade_log.trade_ids[row],
+               trade_log.time(row), round(trade_log.rate[row], 4), trade_log.energy[row],
+               trade_log.actors[trade_log.trade_seller_id[row]],
+               trade_log.actors[trade_log.buyer_id[row]])
+
+
+def _offer_rows(past_markets):
+    for market in past_markets:
+        for offer in market.offers.values():
+            yield (market.time_slot,) + offer._to_csv()
+
+
+def _bid_rows(past_markets):
+    for market in past_markets:
+        for bid in market.bids.values():
+            yield (market.time_slot,) + bid._to_csv()
+
+
+def area_csv_files(area: Area):
+    """
+    The csv files of area: the stats of its past markets (for leaf areas the stats of the
+    markets it trades in), plus the trades, offers and bids of its own past markets.
+    rows_of returns the rows of any part of past_markets, files that are skipped if empty are
+    only written once they have a row.
+    """
+    files = [
+        AreaCSVFile(area.slug + suffix, data.labels(), data.past_markets(), data.rows_of, True)
+        for suffix, data in (("", ExportData.create(area)),
+                             ("-balancing", ExportBalancingData(area)))
+    ]
+    if area.children:
+        files += [
+            AreaCSVFile(f"{area.slug}-trades", ("slot",) + Trade._csv_fields(),
+                        area.past_markets, partial(_trade_rows, area.trade_log), False),
+            AreaCSVFile(f"{area.slug}-balancing-trades", ("slot",) + BalancingTrade._csv_fields(),
+                        area.past_balancing_markets,
+                        partial(_trade_rows, area.balancing_trade_log), False),
+            AreaCSVFile(f"{area.slug}-offers", ("slot",) + Offer._csv_fields(),
+                        area.past_markets, _offer_rows, False),
+            AreaCSVFile(f"{area.slug}-bids", ("slot",) + Bid._csv_fields(),
+                        area.past_markets, _bid_rows, False),
+            AreaCSVFile(f"{area.slug}-balancing-offers", ("slot",) + BalancingOffer._csv_fields(),
+                        area.past_balancing_markets, _offer_rows, False),
+        ]
+    return files
+
+
+def _write_csv_rows(file_path: str, mode: str, labels, rows):
+    try:
+        with open(file_path, mode) as csv_file:
+            writer = csv.writer(csv_file)
+            if labels is not None:
+                writer.writerow(labels)
+            writer.writerows(rows)
+    except OSError:
+        _log.exception("Could not export %s", file_path)
+
+
+# The export whose csv files are being written. Forked export workers inherit it together with
+# the area tree, so that neither has to be pickled.
+_csv_export = None  # type: ExportAndPlot
+
+
+def _can_fork_csv_workers():
+    # A forked process only inherits the thread that forked it, locks held by other threads
+    # (e.g. of logging) would never be released in the workers. The web server and the Redis
+    # subscriber run in threads, the csv files are then written by this process.
+    return "fork" in multiprocessing.get_all_start_methods() and \
+        threading.active_count() == 1
+
+
+def _plot_worker_context():
+    # The plot workers are passed their figures, so they are started by a fork server (or
+    # spawned) instead of being forked from a process that may run other threads
+    start_methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context(
+        "forkserver" if "forkserver" in start_methods else "spawn")
+
+
+def _export_csv_job(job_index):
+    area, directory = _csv_export.csv_jobs[job_index]
+    _csv_export._export_area_csv_files(area, directory)
+    return area.slug
+
+
 class ExportAndPlot:
 
-    def __init__(self, root_area: Area, path: str, subdir: str):
+    def __init__(self, root_area: Area, path: str, subdir: str, max_workers: int = None,
+                 export_csv: bool = True):
+        """
+        The csv files of the areas are written by max_workers processes (default: one per
+        CPU), the plots are generated afterwards. With export_csv False only the plots are
+        generated, for csv files that were written by a ProgressiveCSVExport.
+        """
         self.area = root_area
-        self.export_data = FileExportEndpoints(root_area)
+        self.max_workers = max_workers if max_workers is not None else os.cpu_count()
+        self.export_csv = export_csv
+        self.csv_jobs = []
+        self.export_data = None  # type: FileExportEndpoints
+        self.plot_renderer = None  # type: PlotRenderer
         try:
-            if path is not None:
-                path = os.path.abspath(path)
-            self.directory = pathlib.Path(path or "~/d3a-simulation", subdir).expanduser()
+            self.directory = export_directory(path, subdir)
             mkdir_from_str(str(self.directory.mkdir))
         except Exception as ex:
             _log.error("Could not open directory for csv exports: %s" % str(ex))
@@ -62,20 +185,20 @@ class ExportAndPlot:
 
         self.export()
 
-    @staticmethod
-    def _file_path(directory: dir, slug: str):
-        file_name = ("%s.csv" % slug).replace(' ', '_')
-        return directory.joinpath(file_name).as_posix()
-
     def export(self):
         """Wrapping function, executes all export and plotting functions"""
 
-        self._export_area_with_children(self.area, self.directory)
+        if self.export_csv:
+            self._export_area_with_children(self.area, self.directory)
+        # Only the plots need the aggregated stats, the csv files are written from the markets
+        self.export_data = FileExportEndpoints(self.area)
+        self.plot_renderer = PlotRenderer(self.area, self.plot_dir, self.max_workers)
         self.plot_trade_partner_cell_tower(self.area, self.plot_dir)
         self.plot_energy_profile(self.area, self.plot_dir)
         self.plot_all_unmatched_loads()
         self.plot_avg_trade_price(self.area, self.plot_dir)
         self.plot_ess_soc_history(self.area, self.plot_dir)
+        self.plot_renderer.finish()
 
         self.move_root_plot_folder()
 
@@ -95,94 +218,56 @@ class ExportAndPlot:
 
     def _export_area_with_children(self, area: Area, directory: dir):
         """
-        Uses the FileExportEndpoints object and writes them to csv files
-        Runs _export_area_energy and _export_area_stats_csv_file
+        Writes the csv files of area and of all areas below it, see _export_area_csv_files
         """
+        self.csv_jobs = []
+        self._collect_csv_jobs(area, directory)
+        if self.max_workers > 1 and len(self.csv_jobs) > 1 and _can_fork_csv_workers():
+            self._export_csv_jobs_in_parallel()
+        else:
+            for job_index, (job_area, job_directory) in enumerate(self.csv_jobs):
+                self._export_area_csv_files(job_area, job_directory)
+                self._log_csv_progress(job_index + 1)
+
+    def _collect_csv_jobs(self, area: Area, directory: dir):
         if area.children:
             subdirectory = pathlib.Path(directory, area.slug.replace(' ', '_'))
             subdirectory.mkdir(exist_ok=True, parents=True)
             for child in area.children:
-                self._export_area_with_children(child, subdirectory)
-        self._export_area_stats_csv_file(area, directory, balancing=False)
-        self._export_area_stats_csv_file(area, directory, balancing=True)
-        if area.children:
-            self._export_trade_csv_files(area, directory, balancing=False)
-            self._export_trade_csv_files(area, directory, balancing=True)
-            self._export_area_offers_bids_csv_files(area, directory, "offers",
-                                                    Offer, "offers", area.past_markets)
-            self._export_area_offers_bids_csv_files(area, directory, "bids",
-                                                    Bid, "bids", area.past_markets)
-            self._export_area_offers_bids_csv_files(area, directory, "balancing-offers",
-                                                    BalancingOffer, "offers",
-                                                    area.past_balancing_markets)
-
-    def _export_area_offers_bids_csv_files(self, area, directory, file_suffix,
-                                           offer_type, market_member, past_markets):
-        """
-        Exports files containing individual offers, bids or balancing offers
-        (*-bids/offers/balancing-offers.csv files)
-        return: dict[out_keys]
-        """
-        file_path = self._file_path(directory, f"{area.slug}-{file_suffix}")
-        labels = ("slot",) + offer_type._csv_fields()
-        try:
-            with open(file_path, 'w') as csv_file:
-                writer = csv.writer(csv_file)
-                writer.writerow(labels)
-                for market in past_markets:
-                    for offer in getattr(market, market_member).values():
-                        row = (market.time_slot,) + offer._to_csv()
-                        writer.writerow(row)
-        except OSError:
-            _log.exception("Could not export area balancing offers")
-
-    def _export_trade_csv_files(self, area: Area, directory: dir, balancing: bool = False):
-        """
-        Exports files containing individual trades  (*-trades.csv  files)
-        return: dict[out_keys]
-        """
-
-        if balancing:
-            file_path = self._file_path(directory, "{}-balancing-trades".format(area.slug))
-            labels = ("slot",) + BalancingTrade._csv_fields()
-            past_markets = area.past_balancing_markets
-        else:
-            file_path = self._file_path(directory, "{}-trades".format(area.slug))
-            labels = ("slot",) + Trade._csv_fields()
-            past_markets = area.past_markets
+                self._collect_csv_jobs(child, subdirectory)
+        self.csv_jobs.append((area, directory))
 
+    def _export_csv_jobs_in_parallel(self):
+        global _csv_export
+        _csv_export = self
         try:
-            with open(file_path, 'w') as csv_file:
-                writer = csv.writer(csv_file)
-                writer.writerow(labels)
-                for market in past_markets:
-                    for trade in market.trades:
-                        row = (market.time_slot,) + trade._to_csv()
-                        writer.writerow(row)
-        except OSError:
-            _log.exception("Could not export area trades")
-
-    def _export_area_stats_csv_file(self, area: Area, directory: dir, balancing: bool):
+            with ProcessPoolExecutor(max_workers=self.max_workers,
+                                     mp_context=multiprocessing.get_context("fork")) as executor:
+                futures = [executor.submit(_export_csv_job, job_index)
+                           for job_index in range(len(self.csv_jobs))]
+                for exported_count, future in enumerate(as_completed(futures), start=1):
+                    future.result()
+                    self._log_csv_progress(exported_count)
+        finally:
+            _csv_export = None
+
+    def _log_csv_progress(self, exported_count):
+        job_count = len(self.csv_jobs)
+        if exported_count == job_count or exported_count % max(1, job_count // 10) == 0:
+            _log.info("Exported csv files of %d/%d areas", exported_count, job_count)
+
+    def _export_area_csv_files(self, area: Area, directory: dir):
         """
-        Exports stats (*.csv files)
+        Writes the csv files of area, see area_csv_files
         """
-
-        area_name = area.slug
-        if balancing:
-            area_name += "-balancing"
-        data = self.export_data.generate_market_export_data(area, balancing)
-        rows = data.rows()
-        if not rows:
-            return
-
-        try:
-            with open(self._file_path(directory, area_name), 'w') as csv_file:
-                writer = csv.writer(csv_file)
-                writer.writerow(data.labels())
-                for row in rows:
-                    writer.writerow(row)
-        except Exception as ex:
-            _log.error("Could not export area data: %s" % str(ex))
+        for csv_file in area_csv_files(area):
+            rows = csv_file.rows_of(csv_file.past_markets)
+            if csv_file.skip_if_empty:
+                first_row = next(rows, None)
+                if first_row is None:
+                    continue
+                rows = chain((first_row,), rows)
+            _write_csv_rows(csv_file_path(directory, csv_file.slug), 'w', csv_file.labels, rows)
 
     def plot_trade_partner_cell_tower(self, area: Area, subdir: str):
         """
@@ -204,7 +289,8 @@ class ExportAndPlot:
         higt.arrange_data()
         mkdir_from_str(plot_dir)
         higt.plot_pie_chart("Energy Trade Partners for {}".format(load),
-                            os.path.join(plot_dir, "energy_trade_partner_{}.html".format(load)))
+                            os.path.join(plot_dir, "energy_trade_partner_{}.html".format(load)),
+                            self.plot_renderer)
 
     def plot_energy_profile(self, area: Area, subdir: str):
         """
@@ -248,7 +334,8 @@ class ExportAndPlot:
         mkdir_from_str(plot_dir)
         output_file = os.path.join(plot_dir,
                                    'energy_profile_{}.html'.format(market_name))
-        BarGraph.plot_bar_graph(barmode, title, xtitle, ytitle, data, output_file)
+        BarGraph.plot_bar_graph(barmode, title, xtitle, ytitle, data, output_file,
+                                self.plot_renderer, market_name)
 
     def _plot_energy_graph(self, trades, market_name, agent, agent_label, key, scale_value):
         internal_data = []
@@ -290,7 +377,8 @@ class ExportAndPlot:
         plot_dir = os.path.join(self.plot_dir)
         mkdir_from_str(plot_dir)
         output_file = os.path.join(plot_dir, 'unmatched_loads_{}.html'.format(root_name))
-        BarGraph.plot_bar_graph(barmode, title, xtitle, ytitle, data, output_file)
+        BarGraph.plot_bar_graph(barmode, title, xtitle, ytitle, data, output_file,
+                                self.plot_renderer, root_name)
 
     def plot_ess_soc_history(self, area, subdir):
         """
@@ -331,7 +419,8 @@ class ExportAndPlot:
         plot_dir = os.path.join(self.plot_dir, subdir)
         mkdir_from_str(plot_dir)
         output_file = os.path.join(plot_dir, 'ess_soc_history_{}.html'.format(root_name))
-        BarGraph.plot_bar_graph(barmode, title, xtitle, ytitle, data, output_file)
+        BarGraph.plot_bar_graph(barmode, title, xtitle, ytitle, data, output_file,
+                                self.plot_renderer, root_name)
 
     def plot_avg_trade_price(self, area, subdir):
         """
@@ -381,7 +470,8 @@ class ExportAndPlot:
         plot_dir = os.path.join(self.plot_dir, subdir)
         mkdir_from_str(plot_dir)
         output_file = os.path.join(plot_dir, 'average_trade_price_{}.html'.format(area_list[0]))
-        BarGraph.plot_bar_graph(barmode, title, xtitle, ytitle, data, output_file)
+        BarGraph.plot_bar_graph(barmode, title, xtitle, ytitle, data, output_file,
+                                self.plot_renderer, area_list[0])
 
     def _plot_avg_trade_graph(self, stats, area_name, key, label):
         graph_obj = BarGraph(stats[area_name.lower()], key)
@@ -392,6 +482,143 @@ class ExportAndPlot:
         return data_obj
 
 
+class ProgressiveCSVExport:
+    """
+    Writes the csv files of ExportAndPlot while the simulation runs: the rows of every
+    market are appended to the files of its area once it was rotated into the past markets.
+    """
+
+    def __init__(self, root_area: Area, directory: pathlib.Path):
+        self.area = root_area
+        self.directory = directory
+        self._exported_markets = FoldedMarkets()
+        self._created_files = set()
+
+    def export_new_past_markets(self):
+        self._export_area(self.area, self.directory)
+
+    def _export_area(self, area: Area, directory: pathlib.Path):
+        if area.children:
+            subdirectory = pathlib.Path(directory, area.slug.replace(' ', '_'))
+            subdirectory.mkdir(exist_ok=True, parents=True)
+            for child in area.children:
+                self._export_area(child, subdirectory)
+        for csv_file in area_csv_files(area):
+            file_path = csv_file_path(directory, csv_file.slug)
+            markets = self._exported_markets.new_markets(file_path, csv_file.past_markets)
+            if file_path in self._created_files:
+                if markets:
+                    _write_csv_rows(file_path, 'a', None, csv_file.rows_of(markets))
+                continue
+            rows = csv_file.rows_of(markets)
+            first_row = next(rows, None)
+            if first_row is None and csv_file.skip_if_empty:
+                continue
+            self._created_files.add(file_path)
+            _write_csv_rows(file_path, 'w', csv_file.labels,
+                            rows if first_row is None else chain((first_row,), rows))
+
+
+def _render_plot(figure, filename, include_plotlyjs):
+    py.offline.plot(figure, filename=filename, auto_open=False, include_plotlyjs=include_plotlyjs,
+                    validate=False)
+
+
+class PlotRenderer:
+    """
+    Writes the plot files of an export in max_workers processes. The plot files reference
+    a single copy of plotly.js in the plot directory instead of embedding it.
+
+    The figures are also collected per area for the dashboard, one page that loads the
+    figures of an area from its data file once the area is selected.
+    """
+    PLOTLY_JS = "plotly.min.js"
+    DASHBOARD = "dashboard.html"
+    DASHBOARD_DATA_DIR = "dashboard-data"
+
+    def __init__(self, root_area: Area, plot_dir: str, max_workers: int):
+        self.root_area = root_area
+        self.plot_dir = os.path.abspath(plot_dir)
+        # The plots of the root area are moved to plot_dir after they were rendered, see
+        # ExportAndPlot.move_root_plot_folder
+        self._root_area_plot_dir = os.path.join(self.plot_dir, root_area.slug)
+        self._executor = None
+        if max_workers > 1:
+            self._executor = ProcessPoolExecutor(max_workers=max_workers,
+                                                 mp_context=_plot_worker_context())
+        self._futures = []
+        # area slug -> figures of the area
+        self._area_figures = {}
+        with open(os.path.join(self.plot_dir, self.PLOTLY_JS), 'w') as plotly_js_file:
+            plotly_js_file.write(get_plotlyjs())
+
+    def _final_directory(self, filename):
+        directory = os.path.dirname(os.path.abspath(filename))
+        if directory == self._root_area_plot_dir or \
+                directory.startswith(self._root_area_plot_dir + os.sep):
+            return self.plot_dir + directory[len(self._root_area_plot_dir):]
+        return directory
+
+    def render(self, figure, filename: str, area_slug: str):
+        if isinstance(figure, go.Figure):
+            figure = figure.to_dict()
+        self._area_figures.setdefault(area_slug, []).append(figure)
+        plotly_js = os.path.relpath(os.path.join(self.plot_dir, self.PLOTLY_JS),
+                                    self._final_directory(filename))
+        if self._executor is None:
+            _render_plot(figure, filename, plotly_js)
+        else:
+            self._futures.append(self._executor.submit(_render_plot, figure, filename, plotly_js))
+
+    def finish(self):
+        """
+        Waits until all plots are written, and writes the dashboard
+        """
+        if self._executor is not None:
+            for rendered_count, future in enumerate(as_completed(self._futures), start=1):
+                future.result()
+                if rendered_count % max(1, len(self._futures) // 10) == 0:
+                    _log.info("Rendered %d/%d plots", rendered_count, len(self._futures))
+            self._executor.shutdown()
+        self._write_dashboard()
+
+    def _write_dashboard(self):
+        data_dir = mkdir_from_str(os.path.join(self.plot_dir, self.DASHBOARD_DATA_DIR))
+        areas = []
+        for area in _areas_depth_first(self.root_area):
+            figures = self._area_figures.get(area.slug)
+            if not figures:
+                continue
+            areas.append({"name": area.name, "slug": area.slug,
+                          "titles": [_figure_title(figure) for figure in figures]})
+            with open(str(data_dir.joinpath(area.slug + ".js")), 'w') as data_file:
+                data_file.write("areaFiguresLoaded({}, {});".format(
+                    json.dumps(area.slug), json.dumps(figures, cls=PlotlyJSONEncoder)))
+        with open(os.path.join(self.plot_dir, self.DASHBOARD), 'w') as dashboard_file:
+            dashboard_file.write(_dashboard_template().render(
+                root_area=self.root_area, areas=areas, plotly_js=self.PLOTLY_JS,
+                data_dir=self.DASHBOARD_DATA_DIR
+            ))
+
+
+def _figure_title(figure):
+    title = figure["layout"].get("title")
+    return title.get("text") if isinstance(title, dict) else title
+
+
+def _areas_depth_first(area):
+    yield area
+    for child in area.children:
+        yield from _areas_depth_first(child)
+
+
+@lru_cache()
+def _dashboard_template():
+    environment = Environment(loader=PackageLoader("d3a", "templates"),
+                              autoescape=select_autoescape(["html"]))
+    return environment.get_template("dashboard.html")
+
+
 class BarGraph:
     def __init__(self, dataset: dict, key: str):
         self.key = key
@@ -436,7 +663,8 @@ class BarGraph:
         return [start_time, end_time], data
 
     @classmethod
-    def plot_bar_graph(cls, barmode: str, title: str, xtitle: str, ytitle: str, data, iname: str):
+    def plot_bar_graph(cls, barmode: str, title: str, xtitle: str, ytitle: str, data, iname: str,
+                       renderer: 'PlotRenderer', area_slug: str):
         try:
             time_range, data = cls.modify_time_axis(data, title)
         except ValueError:
@@ -459,7 +687,7 @@ class BarGraph:
         )
 
         fig = go.Figure(data=data, layout=layout)
-        py.offline.plot(fig, filename=iname, auto_open=False)
+        renderer.render(fig, iname, area_slug)
 
 
 class TradeHistory:
@@ -480,7 +708,7 @@ class TradeHistory:
                 else:
                     self.trade_history[ki] = abs(self.dataset[self.key]["energy [kWh]"][ii])
 
-    def plot_pie_chart(self, title, filename):
+    def plot_pie_chart(self, title, filename, renderer: 'PlotRenderer'):
         fig = {
             "data": [
                 {
@@ -498,4 +726,4 @@ class TradeHistory:
             fig["data"][0]["values"].append(value)
             fig["data"][0]["labels"].append(key)
 
-        py.offline.plot(fig, filename=filename, auto_open=False)
+        renderer.render(fig, filename, self.key)
@@ -17,10 +17,15 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 import os
 import json
+import time
+import zlib
 from logging import getLogger
+from threading import Lock
 from redis import StrictRedis
 from redis.exceptions import ConnectionError
 
+from d3a.models.const import ConstSettings
+
 
 log = getLogger(__name__)
 
@@ -28,6 +33,122 @@ log = getLogger(__name__)
 REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost')
 
 
+def report_changes(previous, current, path=None):
+    """
+    Changes that turn the JSON report previous into current.
+
+    Every change is a dict with the operation "op", the "path" of keys and list indices to
+    the changed value, and the new "value":
+    - "set" sets the value at path
+    - "extend" appends the items of value to the list at path
+    - "delete" removes the key at path (no value)
+    """
+    path = [] if path is None else path
+    if isinstance(previous, dict) and isinstance(current, dict):
+        changes = []
+        for key, value in current.items():
+            if key not in previous:
+                changes.append({"op": "set", "path": path + [key], "value": value})
+            elif previous[key] != value:
+                changes.extend(report_changes(previous[key], value, path + [key]))
+        changes.extend({"op": "delete", "path": path + [key]}
+                       for key in previous.keys() if key not in current)
+        return changes
+    if isinstance(previous, list) and isinstance(current, list) and \
+            len(current) >= len(previous):
+        changes = []
+        for index, value in enumerate(previous):
+            if current[index] != value:
+                changes.extend(report_changes(value, current[index], path + [index]))
+        if len(current) > len(previous):
+            changes.append({"op": "extend", "path": path, "value": current[len(previous):]})
+        return changes
+    if previous != current:
+        return [{"op": "set", "path": path, "value": current}]
+    return []
+
+
+def apply_report_changes(report, changes):
+    """
+    Applies the changes returned by report_changes to report, in place
+    """
+    for change in changes:
+        parent = report
+        for key in change["path"][:-1]:
+            parent = parent[key]
+        key = change["path"][-1]
+        if change["op"] == "set":
+            parent[key] = change["value"]
+        elif change["op"] == "extend":
+            parent[key].extend(change["value"])
+        elif change["op"] == "delete":
+            del parent[key]
+    return report
+
+
+class ResultPublisher:
+    """
+    Publishes the result reports of a simulation, see ConstSettings.GeneralSettings for the
+    options.
+
+    With REDIS_PUBLISH_MODE 2 the first message and the final one contain the full report plus
+    its "sequence" number. Every other message only contains the changes since the previous
+    one: {"job_id", "sequence", "base_sequence", "changes"}, see report_changes.
+    A subscriber that missed a message, i.e. whose last sequence number is not base_sequence,
+    requests a full report on the "<job_id>/resync" channel.
+
+    resync is called by the Redis pubsub thread, `_lock` guards the sequence number and the
+    published report against the simulation thread publishing at the same time.
+    """
+
+    def __init__(self, redis_db, channel):
+        self.redis_db = redis_db
+        self.channel = channel
+        self._lock = Lock()
+        self._sequence = 0
+        # The report as the subscribers know it, None until the next full report
+        self._published_report = None
+        self._last_publish_time = None
+
+    def resync(self):
+        with self._lock:
+            self._published_report = None
+
+    def publish(self, report, final=False):
+        now = time.monotonic()
+        if not final and self._last_publish_time is not None and \
+                now - self._last_publish_time < \
+                ConstSettings.GeneralSettings.REDIS_PUBLISH_MIN_INTERVAL:
+            # The changes are part of the next message
+            return
+        self._last_publish_time = now
+        if ConstSettings.GeneralSettings.REDIS_PUBLISH_MODE != 2:
+            self._publish(json.dumps(report))
+            return
+
+        # The round trip normalizes the report to what the subscribers decode
+        report = json.loads(json.dumps(report))
+        with self._lock:
+            self._sequence += 1
+            if final or self._published_report is None:
+                message = {"sequence": self._sequence, **report}
+            else:
+                message = {
+                    "job_id": report.get("job_id"),
+                    "sequence": self._sequence,
+                    "base_sequence": self._sequence - 1,
+                    "changes": report_changes(self._published_report, report)
+                }
+            self._published_report = report
+            # Published under the lock, a resync is answered by the message after this one
+            self._publish(json.dumps(message))
+
+    def _publish(self, message):
+        if ConstSettings.GeneralSettings.REDIS_PUBLISH_COMPRESSION:
+            message = zlib.compress(message.encode("utf-8"))
+        self.redis_db.publish(self.channel, message)
+
+
 class RedisSimulationCommunication:
     def __init__(self, simulation, simulation_id):
         if simulation_id is None:
@@ -38,11 +159,13 @@ class RedisSimulationCommunication:
                                    self._simulation_id + "/stop": self._stop_callback,
                                    self._simulation_id + "/pause": self._pause_callback,
                                    self._simulation_id + "/resume": self._resume_callback,
-                                   self._simulation_id + "/slowdown": self._slowdown_callback}
+                                   self._simulation_id + "/slowdown": self._slowdown_callback,
+                                   self._simulation_id + "/resync": self._resync_callback}
         self.result_channel = "d3a-results"
 
         try:
             self.redis_db = StrictRedis.from_url(REDIS_URL)
+            self.result_publisher = ResultPublisher(self.redis_db, self.result_channel)
             self.pubsub = self.redis_db.pubsub()
             self._subscribe_to_channels()
         except ConnectionError:
@@ -68,6 +191,9 @@ class RedisSimulationCommunication:
         if self._simulation.paused:
             self._simulation.toggle_pause()
 
+    def _resync_callback(self, _):
+        self.result_publisher.resync()
+
     def _slowdown_callback(self, message):
         data = json.loads(message["data"])
         slowdown = data.get('slowdown')
@@ -87,9 +213,9 @@ class RedisSimulationCommunication:
     def publish_results(self, endpoint_buffer):
         if not hasattr(self, 'pubsub'):
             return
-        self.redis_db.publish(self.result_channel,
-                              json.dumps(endpoint_buffer.generate_result_report()))
+        self.result_publisher.publish(endpoint_buffer.generate_result_report(), final=True)
 
     def publish_intermediate_results(self, endpoint_buffer):
-        # Should have a different format in the future, hence the code duplication
-        self.publish_results(endpoint_buffer)
+        if not hasattr(self, 'pubsub'):
+            return
+        self.result_publisher.publish(endpoint_buffer.generate_result_report())
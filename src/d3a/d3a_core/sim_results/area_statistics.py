@@ -15,16 +15,12 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
-from collections import namedtuple, defaultdict, OrderedDict
-from statistics import mean
+from collections import defaultdict, OrderedDict
 from d3a.models.strategy.storage import StorageStrategy
 from d3a.models.strategy.area_agents.one_sided_agent import InterAreaAgent
 from d3a.models.strategy.pv import PVStrategy
 from d3a.models.strategy.load_hours import CellTowerLoadHoursStrategy, LoadHoursStrategy
-from d3a.d3a_core.util import area_name_from_area_or_iaa_name, make_iaa_name
-
-loads_avg_prices = namedtuple('loads_avg_prices', ['load', 'price'])
-prices_pv_stor_energy = namedtuple('prices_pv_stor_energy', ['price', 'pv_energ', 'stor_energ'])
+from d3a.d3a_core.util import make_iaa_name
 
 
 def get_area_type_string(area):
@@ -38,79 +34,234 @@ def get_area_type_string(area):
         return "unknown"
 
 
-def gather_area_loads_and_trade_prices(area, load_price_lists):
+def markets_after(markets, time_slot):
+    """
+    Returns the markets of the chronologically ordered list markets that are newer than
+    time_slot (all markets if time_slot is None)
+    """
+    if time_slot is None:
+        return markets
+    index = len(markets)
+    while index > 0 and markets[index - 1].time_slot > time_slot:
+        index -= 1
+    return markets[index:]
+
+
+class FoldedMarkets:
+    """
+    Keeps track of the past markets that were already folded into running totals.
+
+    Past markets do not change anymore, therefore each of them only needs to be folded once,
+    and only the markets that were rotated since the last update need to be visited.
+    """
+    def __init__(self):
+        # key -> time slot of the newest folded market
+        self._last_time_slot = {}
+
+    def new_markets(self, key, markets):
+        new_markets = markets_after(markets, self._last_time_slot.get(key))
+        if new_markets:
+            self._last_time_slot[key] = new_markets[-1].time_slot
+        return new_markets
+
+
+def trade_log_of(area, past_market_types):
+    """
+    Trade log of the markets of area in past_market_types
+    """
+    return area.trade_log if past_market_types == "past_markets" else area.balancing_trade_log
+
+
+def fold_past_markets(area, statistics, folded_markets=None):
+    """
+    Folds the past markets of area and all its subareas that were not folded yet into each of
+    statistics, in a single traversal of the area tree.
+
+    Every statistic collects what it needs from a market of an area in its fold method, reading
+    the trades of the market from the trade log of the area, all its views are then derived
+    from the collected totals.
+    """
+    if folded_markets is None:
+        folded_markets = FoldedMarkets()
+    for past_market_types in ("past_markets", "past_balancing_markets"):
+        for market in folded_markets.new_markets((area.name, past_market_types),
+                                                 getattr(area, past_market_types)):
+            for statistic in statistics:
+                statistic.fold(area, market, past_market_types)
     for child in area.children:
-        if child.children == [] and not \
-                (isinstance(child.strategy, StorageStrategy) or
-                 isinstance(child.strategy, PVStrategy) or
-                 isinstance(child.strategy, InterAreaAgent)):
-            for market in child.parent.past_markets:
-                slot = market.time_slot
-                if slot.hour not in load_price_lists.keys():
-                    load_price_lists[slot.hour] = loads_avg_prices(load=[], price=[])
-                load_price_lists[slot.hour].load.append(abs(market.traded_energy[child.name]))
-                trade_prices = [
-                    # Convert from cents to euro
-                    t.offer.price / 100.0 / t.offer.energy
-                    for t in market.trades
-                    if t.buyer == child.name
-                ]
-                load_price_lists[slot.hour].price.extend(trade_prices)
-        else:
-            load_price_lists = gather_area_loads_and_trade_prices(child, load_price_lists)
-    return load_price_lists
+        fold_past_markets(child, statistics, folded_markets)
+
 
+def _is_cumulative_load(area):
+    return area.children == [] and not \
+        (isinstance(area.strategy, StorageStrategy) or
+         isinstance(area.strategy, PVStrategy) or
+         isinstance(area.strategy, InterAreaAgent))
 
-def gather_prices_pv_stor_energ(area, price_energ_lists):
+
+def _cumulative_load_areas(area):
     for child in area.children:
-        for market in child.parent.past_markets:
-            slot = market.time_slot
-            slot_time_str = "%02d:00" % slot.hour
-            if slot_time_str not in price_energ_lists.keys():
-                price_energ_lists[slot_time_str] = prices_pv_stor_energy(price=[],
-                                                                         pv_energ=[],
-                                                                         stor_energ=[])
-            trade_prices = [
+        if _is_cumulative_load(child):
+            yield child
+        else:
+            yield from _cumulative_load_areas(child)
+
+
+class CumulativeLoads:
+    """
+    Running totals behind export_cumulative_loads, per load and hour of the day
+    """
+    def __init__(self):
+        # load name -> hour -> [traded energy, trade price sum, trade count]
+        self._totals = defaultdict(OrderedDict)
+
+    def fold(self, area, market, past_market_types):
+        if past_market_types != "past_markets":
+            return
+        hour = market.time_slot.hour
+        load_totals = {}
+        for load in area.children:
+            if not _is_cumulative_load(load):
+                continue
+            totals = self._totals[load.name]
+            if hour not in totals:
+                totals[hour] = [0, 0, 0]
+            load_totals[load.name] = totals[hour]
+            totals[hour][0] += abs(market.traded_energy[load.name])
+        trade_log = area.trade_log
+        for row in trade_log.rows_of_slot(market.time_slot):
+            hour_totals = load_totals.get(trade_log.actors[trade_log.buyer_id[row]])
+            if hour_totals is not None:
                 # Convert from cents to euro
-                t.offer.price / 100.0 / t.offer.energy
-                for t in market.trades
-                if t.buyer == child.name
-            ]
-            price_energ_lists[slot_time_str].price.extend(trade_prices)
-
-            if child.children == [] and isinstance(child.strategy, PVStrategy):
-                traded_energy = [
-                    t.offer.energy
-                    for t in market.trades
-                    if t.seller == child.name
-                ]
-                price_energ_lists[slot_time_str].pv_energ.extend(traded_energy)
-
-            if child.children == [] and \
-                    (isinstance(child.strategy, StorageStrategy)):
-                traded_energy = []
-
-                for t in market.trades:
-                    if t.seller == child.name:
-                        traded_energy.append(-t.offer.energy)
-                    elif t.buyer == child.name:
-                        traded_energy.append(t.offer.energy)
-                price_energ_lists[slot_time_str].stor_energ.extend(traded_energy)
-
-        if child.children != []:
-            price_energ_lists = gather_prices_pv_stor_energ(child, price_energ_lists)
-    return price_energ_lists
+                hour_totals[1] += trade_log.price[row] / 100.0 / trade_log.energy[row]
+                hour_totals[2] += 1
+
+    def export(self, area):
+        hours = OrderedDict()
+        for load in _cumulative_load_areas(area):
+            for hour, (energy, price_sum, trade_count) in self._totals[load.name].items():
+                if hour not in hours:
+                    hours[hour] = [0, 0, 0]
+                hours[hour][0] += energy
+                hours[hour][1] += price_sum
+                hours[hour][2] += trade_count
+        return [
+            {
+                "time": hour,
+                "load": round(energy, 3),
+                "price": round(price_sum / trade_count, 2) if trade_count > 0 else 0
+            } for hour, (energy, price_sum, trade_count) in hours.items()
+        ]
 
 
 def export_cumulative_loads(area):
-    load_price_lists = gather_area_loads_and_trade_prices(area, {})
-    return [
-        {
-            "time": hour,
-            "load": round(sum(load_price.load), 3) if len(load_price.load) > 0 else 0,
-            "price": round(mean(load_price.price), 2) if len(load_price.price) > 0 else 0
-        } for hour, load_price in load_price_lists.items()
-    ]
+    cumulative_loads = CumulativeLoads()
+    fold_past_markets(area, [cumulative_loads])
+    return cumulative_loads.export(area)
+
+
+def _new_slot_totals():
+    # [trade price sum, trade count, min trade price, max trade price, PV energy,
+    #  storage energy]
+    return [0, 0, None, None, 0, 0]
+
+
+def _add_prices(totals, price_sum, trade_count, min_price, max_price):
+    totals[0] += price_sum
+    totals[1] += trade_count
+    totals[2] = min_price if totals[2] is None else min(totals[2], min_price)
+    totals[3] = max_price if totals[3] is None else max(totals[3], max_price)
+
+
+def _merge_slot_totals(target, source):
+    for slot_time_str, slot_totals in source.items():
+        if slot_time_str not in target:
+            target[slot_time_str] = _new_slot_totals()
+        if slot_totals[1] > 0:
+            _add_prices(target[slot_time_str], *slot_totals[:4])
+        target[slot_time_str][4] += slot_totals[4]
+        target[slot_time_str][5] += slot_totals[5]
+
+
+class PriceEnergyDay:
+    """
+    Running totals behind export_price_energy_day, per area and hour of the day
+    """
+    def __init__(self):
+        # area name -> "HH:00" -> slot totals
+        self._totals = defaultdict(OrderedDict)
+
+    def fold(self, area, market, past_market_types):
+        if past_market_types != "past_markets" or not area.children:
+            return
+        totals = self._totals[area.name]
+        slot_time_str = "%02d:00" % market.time_slot.hour
+        if slot_time_str not in totals:
+            totals[slot_time_str] = _new_slot_totals()
+        slot_totals = totals[slot_time_str]
+        child_names = {child.name for child in area.children}
+        pv_names = {child.name for child in area.children
+                    if child.children == [] and isinstance(child.strategy, PVStrategy)}
+        storage_names = {child.name for child in area.children
+                         if child.children == [] and isinstance(child.strategy, StorageStrategy)}
+        trade_log = area.trade_log
+        actors = trade_log.actors
+        for row in trade_log.rows_of_slot(market.time_slot):
+            buyer = actors[trade_log.buyer_id[row]]
+            seller = actors[trade_log.trade_seller_id[row]]
+            energy = trade_log.energy[row]
+            if buyer in child_names:
+                # Convert from cents to euro
+                price = trade_log.price[row] / 100.0 / energy
+                _add_prices(slot_totals, price, 1, price, price)
+            if seller in pv_names:
+                slot_totals[4] += energy
+            if seller in storage_names:
+                slot_totals[5] -= energy
+            if buyer in storage_names and buyer != seller:
+                slot_totals[5] += energy
+
+    def _subtree_totals(self, area, subtree_totals):
+        totals = OrderedDict()
+        _merge_slot_totals(totals, self._totals[area.name])
+        for child in area.children:
+            if child.children:
+                _merge_slot_totals(totals, self._subtree_totals(child, subtree_totals))
+        subtree_totals[area.name] = totals
+        return totals
+
+    def export_subtrees(self, area):
+        """
+        Returns the export of area and of each of its subareas that have children, keyed by the
+        name of the area. The totals of a subtree are merged only once for all of these.
+        """
+        subtree_totals = OrderedDict()
+        if area.children:
+            self._subtree_totals(area, subtree_totals)
+        return OrderedDict(
+            (area_name, [
+                {
+                    "timeslot": ii,
+                    "time": slot_time_str,
+                    "av_price": round(price_sum / trade_count if trade_count > 0 else 0, 2),
+                    "min_price": round(min_price if trade_count > 0 else 0, 2),
+                    "max_price": round(max_price if trade_count > 0 else 0, 2),
+                    "cum_pv_gen": round(-1 * pv_energy, 2),
+                    "cum_stor_prof": round(storage_energy, 2)
+                } for ii, (slot_time_str, (price_sum, trade_count, min_price, max_price,
+                                           pv_energy, storage_energy)) in enumerate(totals.items())
+            ])
+            for area_name, totals in subtree_totals.items()
+        )
+
+    def export(self, area):
+        return self.export_subtrees(area).get(area.name, [])
+
+
+def export_price_energy_day(area):
+    price_energy_day = PriceEnergyDay()
+    fold_past_markets(area, [price_energy_day])
+    return price_energy_day.export(area)
 
 
 def _is_house_node(area):
@@ -125,98 +276,144 @@ def _is_load_node(area):
     return isinstance(area.strategy, LoadHoursStrategy)
 
 
-def _accumulate_load_trades(load, grid, accumulated_trades, is_cell_tower):
-    accumulated_trades[load.name] = {
-        "type": "cell_tower" if is_cell_tower else "load",
-        "id": load.area_id,
-        "produced": 0.0,
-        "earned": 0.0,
-        "consumedFrom": defaultdict(int),
-        "spentTo": defaultdict(int),
-    }
-    for market in grid.past_markets:
-        for trade in market.trades:
-            if trade.buyer == load.name:
-                sell_id = area_name_from_area_or_iaa_name(trade.seller)
-                accumulated_trades[load.name]["consumedFrom"][sell_id] += trade.offer.energy
-                accumulated_trades[load.name]["spentTo"][sell_id] += trade.offer.price
-    return accumulated_trades
-
-
-def _accumulate_house_trades(house, grid, accumulated_trades, past_market_types):
-    if house.name not in accumulated_trades:
-        accumulated_trades[house.name] = {
-            "type": "house",
-            "id": house.area_id,
-            "produced": 0.0,
-            "earned": 0.0,
-            "consumedFrom": defaultdict(int),
-            "spentTo": defaultdict(int),
+class _AreaTrades:
+    def __init__(self, area_id):
+        self.id = area_id
+        self.produced = 0.0
+        self.earned = 0.0
+        self.consumed_from = defaultdict(int)
+        self.spent_to = defaultdict(int)
+
+    def as_dict(self, area_type):
+        return {
+            "type": area_type,
+            "id": self.id,
+            "produced": self.produced,
+            "earned": self.earned,
+            "consumedFrom": defaultdict(int, self.consumed_from),
+            "spentTo": defaultdict(int, self.spent_to),
         }
-    house_IAA_name = make_iaa_name(house)
-    child_names = [c.name for c in house.children]
-    for market in getattr(house, past_market_types):
-        for trade in market.trades:
-            if area_name_from_area_or_iaa_name(trade.seller) in child_names and \
-                    area_name_from_area_or_iaa_name(trade.buyer) in child_names:
-                # House self-consumption trade
-                accumulated_trades[house.name]["produced"] -= trade.offer.energy
-                accumulated_trades[house.name]["earned"] += trade.offer.price
-                accumulated_trades[house.name]["consumedFrom"][house.name] += trade.offer.energy
-                accumulated_trades[house.name]["spentTo"][house.name] += trade.offer.price
-            elif trade.buyer == house_IAA_name:
-                accumulated_trades[house.name]["earned"] += trade.offer.price
-                accumulated_trades[house.name]["produced"] -= trade.offer.energy
-
-    for market in getattr(grid, past_market_types):
-        for trade in market.trades:
-            if trade.buyer == house_IAA_name and trade.buyer != trade.offer.seller:
-                seller_id = area_name_from_area_or_iaa_name(trade.seller)
-                accumulated_trades[house.name]["consumedFrom"][seller_id] += trade.offer.energy
-                accumulated_trades[house.name]["spentTo"][seller_id] += trade.offer.price
-    return accumulated_trades
-
-
-def _accumulate_grid_trades(area, accumulated_trades, past_market_types):
-    for child in area.children:
-        if _is_cell_tower_node(child):
-            accumulated_trades = _accumulate_load_trades(
-                child, area, accumulated_trades, is_cell_tower=True
-            )
-        elif _is_house_node(child):
-            accumulated_trades = \
-                _accumulate_house_trades(child, area, accumulated_trades, past_market_types)
-        elif child.children == []:
-            # Leaf node, no need for calculating cumulative trades, continue iteration
-            continue
-        else:
-            accumulated_trades = _accumulate_grid_trades(
-                child, accumulated_trades, past_market_types
-            )
-    return accumulated_trades
 
 
-def _accumulate_grid_trades_all_devices(area, accumulated_trades, past_market_types):
-    for child in area.children:
-        if _is_cell_tower_node(child):
-            accumulated_trades = _accumulate_load_trades(
-                child, area, accumulated_trades, is_cell_tower=True
-            )
-        if _is_load_node(child):
-            accumulated_trades = _accumulate_load_trades(
-                child, area, accumulated_trades, is_cell_tower=False
-            )
-        elif child.children == []:
-            # Leaf node, no need for calculating cumulative trades, continue iteration
-            continue
-        else:
-            accumulated_trades = _accumulate_house_trades(
-                child, area, accumulated_trades, past_market_types
-            )
-            accumulated_trades = _accumulate_grid_trades_all_devices(
-                child, accumulated_trades, past_market_types
-            )
-    return accumulated_trades
+class CumulativeGridTrades:
+    """
+    Running totals behind export_cumulative_grid_trades, per house, load and cell tower
+    """
+    def __init__(self):
+        # ("load", area name) or ("house", area name, past market types) -> _AreaTrades
+        self._totals = {}
+
+    def _area_trades(self, key, area):
+        if key not in self._totals:
+            self._totals[key] = _AreaTrades(area.area_id)
+        return self._totals[key]
+
+    def fold(self, area, market, past_market_types):
+        # Trades of the area as a house
+        house_trades = self._area_trades(("house", area.name, past_market_types), area)
+        house_IAA_name = make_iaa_name(area)
+        child_names = [c.name for c in area.children]
+        # Trades of the children of the area as houses, keyed by their IAA
+        children_by_iaa_name = {make_iaa_name(c): c for c in area.children}
+        # Trades of the children of the area as loads. Loads only trade in the spot markets.
+        loads = {c.name: c for c in area.children if _is_load_node(c)} \
+            if past_market_types == "past_markets" else {}
+        trade_log = trade_log_of(area, past_market_types)
+        actors = trade_log.actors
+        area_names = trade_log.actor_area_names
+        for row in trade_log.rows_of_slot(market.time_slot):
+            buyer_id = trade_log.buyer_id[row]
+            buyer = actors[buyer_id]
+            seller_area_name = area_names[trade_log.trade_seller_id[row]]
+            energy = trade_log.energy[row]
+            price = trade_log.price[row]
+            if seller_area_name in child_names and area_names[buyer_id] in child_names:
+                # House self-consumption trade
+                house_trades.produced -= energy
+                house_trades.earned += price
+                house_trades.consumed_from[area.name] += energy
+                house_trades.spent_to[area.name] += price
+            elif buyer == house_IAA_name:
+                house_trades.earned += price
+                house_trades.produced -= energy
+
+            if buyer in children_by_iaa_name and buyer != actors[trade_log.seller_id[row]]:
+                child = children_by_iaa_name[buyer]
+                child_trades = self._area_trades(("house", child.name, past_market_types), child)
+                child_trades.consumed_from[seller_area_name] += energy
+                child_trades.spent_to[seller_area_name] += price
+            if buyer in loads:
+                load_trades = self._area_trades(("load", buyer), loads[buyer])
+                load_trades.consumed_from[seller_area_name] += energy
+                load_trades.spent_to[seller_area_name] += price
+
+    def _accumulate_load_trades(self, load, accumulated_trades, is_cell_tower):
+        accumulated_trades[load.name] = self._area_trades(("load", load.name), load).as_dict(
+            "cell_tower" if is_cell_tower else "load")
+        return accumulated_trades
+
+    def _accumulate_house_trades(self, house, accumulated_trades, past_market_types):
+        accumulated_trades[house.name] = self._area_trades(
+            ("house", house.name, past_market_types), house).as_dict("house")
+        return accumulated_trades
+
+    def _accumulate_grid_trades(self, area, accumulated_trades, past_market_types):
+        for child in area.children:
+            if _is_cell_tower_node(child):
+                accumulated_trades = self._accumulate_load_trades(
+                    child, accumulated_trades, is_cell_tower=True
+                )
+            elif _is_house_node(child):
+                accumulated_trades = self._accumulate_house_trades(
+                    child, accumulated_trades, past_market_types
+                )
+            elif child.children == []:
+                # Leaf node, no need for calculating cumulative trades, continue iteration
+                continue
+            else:
+                accumulated_trades = self._accumulate_grid_trades(
+                    child, accumulated_trades, past_market_types
+                )
+        return accumulated_trades
+
+    def _accumulate_grid_trades_all_devices(self, area, accumulated_trades, past_market_types):
+        for child in area.children:
+            if _is_cell_tower_node(child):
+                accumulated_trades = self._accumulate_load_trades(
+                    child, accumulated_trades, is_cell_tower=True
+                )
+            if _is_load_node(child):
+                accumulated_trades = self._accumulate_load_trades(
+                    child, accumulated_trades, is_cell_tower=False
+                )
+            elif child.children == []:
+                # Leaf node, no need for calculating cumulative trades, continue iteration
+                continue
+            else:
+                accumulated_trades = self._accumulate_house_trades(
+                    child, accumulated_trades, past_market_types
+                )
+                accumulated_trades = self._accumulate_grid_trades_all_devices(
+                    child, accumulated_trades, past_market_types
+                )
+        return accumulated_trades
+
+    def export(self, area, past_market_types, all_devices=False):
+        accumulated_trades = \
+            self._accumulate_grid_trades_all_devices(area, {}, past_market_types) \
+            if all_devices \
+            else self._accumulate_grid_trades(area, {}, past_market_types)
+        return {
+            "unit": "kWh",
+            "areas": sorted(accumulated_trades.keys()),
+            "cumulative-grid-trades": [
+                # Append first produced energy for all areas
+                _generate_produced_energy_entries(accumulated_trades),
+                # Then self consumption energy for all areas
+                _generate_self_consumption_entries(accumulated_trades),
+                # Then consumption entries for intra-house trades
+                *_generate_intraarea_consumption_entries(accumulated_trades)]
+        }
 
 
 def _generate_produced_energy_entries(accumulated_trades):
@@ -286,33 +483,6 @@ def _generate_intraarea_consumption_entries(accumulated_trades):
 
 
 def export_cumulative_grid_trades(area, past_market_types, all_devices=False):
-    accumulated_trades = _accumulate_grid_trades_all_devices(area, {}, past_market_types) \
-        if all_devices \
-        else _accumulate_grid_trades(area, {}, past_market_types)
-    return {
-        "unit": "kWh",
-        "areas": sorted(accumulated_trades.keys()),
-        "cumulative-grid-trades": [
-            # Append first produced energy for all areas
-            _generate_produced_energy_entries(accumulated_trades),
-            # Then self consumption energy for all areas
-            _generate_self_consumption_entries(accumulated_trades),
-            # Then consumption entries for intra-house trades
-            *_generate_intraarea_consumption_entries(accumulated_trades)]
-
-    }
-
-
-def export_price_energy_day(area):
-    price_lists = gather_prices_pv_stor_energ(area, OrderedDict())
-    return [
-        {
-            "timeslot": ii,
-            "time": hour,
-            "av_price": round(mean(trades.price) if len(trades.price) > 0 else 0, 2),
-            "min_price": round(min(trades.price) if len(trades.price) > 0 else 0, 2),
-            "max_price": round(max(trades.price) if len(trades.price) > 0 else 0, 2),
-            "cum_pv_gen": round(-1 * sum(trades.pv_energ), 2),
-            "cum_stor_prof": round(sum(trades.stor_energ), 2)
-        } for ii, (hour, trades) in enumerate(price_lists.items())
-    ]
+    cumulative_grid_trades = CumulativeGridTrades()
+    fold_past_markets(area, [cumulative_grid_trades])
+    return cumulative_grid_trades.export(area, past_market_types, all_devices)
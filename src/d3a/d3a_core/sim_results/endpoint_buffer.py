@@ -15,10 +15,10 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
-from d3a.d3a_core.sim_results.area_statistics import export_cumulative_grid_trades, \
-    export_cumulative_loads, export_price_energy_day
-from d3a.d3a_core.sim_results.export_unmatched_loads import export_unmatched_loads
-from d3a.d3a_core.sim_results.stats import energy_bills
+from d3a.d3a_core.sim_results.area_statistics import CumulativeGridTrades, \
+    CumulativeLoads, FoldedMarkets, PriceEnergyDay, fold_past_markets
+from d3a.d3a_core.sim_results.export_unmatched_loads import UnmatchedLoads
+from d3a.d3a_core.sim_results.stats import EnergyBills
 from collections import OrderedDict
 from statistics import mean
 
@@ -45,6 +45,21 @@ class SimulationEndpointBuffer:
         self.tree_summary = {}
         self.bills = {}
         self.balancing_energy_bills = {}
+        self._reset_running_totals(None)
+
+    def _reset_running_totals(self, area):
+        # Past markets are folded into the running totals once, the views of each update are
+        # derived from the totals
+        self._root_area = area
+        self._folded_markets = FoldedMarkets()
+        self._unmatched_loads = UnmatchedLoads()
+        self._cumulative_loads = CumulativeLoads()
+        self._price_energy_day = PriceEnergyDay()
+        self._cumulative_grid_trades = CumulativeGridTrades()
+        self._energy_bills = EnergyBills()
+        self._statistics = [self._unmatched_loads, self._cumulative_loads,
+                            self._price_energy_day, self._cumulative_grid_trades,
+                            self._energy_bills]
 
     def generate_result_report(self):
         return {
@@ -61,34 +76,51 @@ class SimulationEndpointBuffer:
 
     def update_stats(self, area, simulation_status):
         self.status = simulation_status
+        self._fold_past_markets(area)
+        price_energy_day = self._price_energy_day.export_subtrees(area)
 
-        self.unmatched_loads_redis = {"unmatched_loads": export_unmatched_loads(area)}
-        self.unmatched_loads = {"unmatched_loads": export_unmatched_loads(area, all_devices=True)}
+        self.unmatched_loads_redis = {"unmatched_loads": self._unmatched_loads.export(area)}
+        self.unmatched_loads = {
+            "unmatched_loads": self._unmatched_loads.export(area, all_devices=True)
+        }
 
         self.cumulative_loads = {
             "price-currency": "Euros",
             "load-unit": "kWh",
-            "cumulative-load-price": export_cumulative_loads(area)
+            "cumulative-load-price": self._cumulative_loads.export(area)
         }
         self.price_energy_day = {
             "price-currency": "Euros",
             "load-unit": "kWh",
-            "price-energy-day": export_price_energy_day(area)
+            "price-energy-day": price_energy_day.get(area.name, [])
         }
 
-        self.cumulative_grid_trades_redis = export_cumulative_grid_trades(area, "past_markets")
-        self.cumulative_grid_trades = export_cumulative_grid_trades(
+        self.cumulative_grid_trades_redis = \
+            self._cumulative_grid_trades.export(area, "past_markets")
+        self.cumulative_grid_trades = self._cumulative_grid_trades.export(
             area, "past_markets", all_devices=True
         )
         self.cumulative_grid_balancing_trades = \
-            export_cumulative_grid_trades(area, "past_balancing_markets")
+            self._cumulative_grid_trades.export(area, "past_balancing_markets")
         self.bills = self._update_bills(area, "past_markets")
         self.balancing_energy_bills = self._update_bills(area, "past_balancing_markets")
 
-        self._update_tree_summary(area)
+        self._update_tree_summary(area, price_energy_day)
+
+    def _fold_past_markets(self, root_area):
+        if root_area is not self._root_area:
+            # The simulation has been reset
+            self._reset_running_totals(root_area)
+        # A single traversal of the area tree collects the new past markets for all views
+        fold_past_markets(root_area, self._statistics, self._folded_markets)
+
+    @property
+    def folded_energy_bills(self):
+        # Cumulative bills of the markets folded so far, which are only appended to
+        return self._energy_bills
 
-    def _update_tree_summary(self, area):
-        price_energy_list = export_price_energy_day(area)
+    def _update_tree_summary(self, area, price_energy_day):
+        price_energy_list = price_energy_day.get(area.name, [])
 
         def calculate_prices(key, functor):
             # Need to convert to euro cents to avoid having to change the backend
@@ -103,8 +135,8 @@ class SimulationEndpointBuffer:
         }
         for child in area.children:
             if child.children != []:
-                self._update_tree_summary(child)
+                self._update_tree_summary(child, price_energy_day)
 
     def _update_bills(self, area, past_market_types):
-        result = energy_bills(area, past_market_types)
+        result = self._energy_bills.export(area, past_market_types)
         return OrderedDict(sorted(result.items()))
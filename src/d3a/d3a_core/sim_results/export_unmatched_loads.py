@@ -15,11 +15,12 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
-from collections import OrderedDict
+from collections import defaultdict, OrderedDict
 
 from d3a.models.strategy.load_hours import LoadHoursStrategy, CellTowerLoadHoursStrategy
 from d3a.models.strategy.predefined_load import DefinedLoadStrategy
-from d3a.d3a_core.sim_results.area_statistics import get_area_type_string
+from d3a.d3a_core.sim_results.area_statistics import fold_past_markets, \
+    get_area_type_string
 
 
 DEFICIT_THRESHOLD_Wh = 0.0001
@@ -78,18 +79,15 @@ def _accumulate_device_stats_to_area_stats(per_hour_device_data):
     return area_data
 
 
-def _calculate_area_stats(area):
-    per_hour_device_data = {}
-    # Iterate first through all the available market slots of the area
-    for market in area.parent.past_markets:
-        current_slot = market.time_slot
-        hour_data = per_hour_device_data.get(current_slot.hour, {"devices": {}})
-        # Update hour data for the area, by accumulating slots in one hour
-        per_hour_device_data[current_slot.hour] = \
-            _calculate_hour_stats_for_area(hour_data, area, current_slot)
-    area_data = _accumulate_device_stats_to_area_stats(per_hour_device_data)
-    area_data["type"] = get_area_type_string(area)
-    return area_data
+def _copy_device_data(per_hour_device_data):
+    return {
+        hour: {"devices": {
+            slug: {"unmatched_load_count": device["unmatched_load_count"],
+                   "timepoints": list(device["timepoints"])}
+            for slug, device in hour_data["devices"].items()
+        }}
+        for hour, hour_data in per_hour_device_data.items()
+    }
 
 
 def _is_house_node(area):
@@ -104,23 +102,6 @@ def _is_cell_tower_node(area):
     return isinstance(area.strategy, CellTowerLoadHoursStrategy)
 
 
-def _recurse_area_tree(area, area_select_function):
-    unmatched_loads = {}
-    for child in area.children:
-        if area_select_function(child):
-            # Need to iterate, because the area has been marked as a house or cell tower
-            unmatched_loads[child.name] = _calculate_area_stats(child)
-        elif child.children is None:
-            # We are at a leaf node, no point in recursing further. This node's calculation
-            # should be done on the upper level
-            continue
-        else:
-            # Recurse even further. Merge new results with existing ones
-            unmatched_loads = {**unmatched_loads,
-                               **_recurse_area_tree(child, area_select_function)}
-    return unmatched_loads
-
-
 def select_house_or_cell_tower(area):
     return _is_house_node(area) or _is_cell_tower_node(area)
 
@@ -129,15 +110,74 @@ def select_house_or_load(area):
     return _is_house_node(area) or isinstance(area.strategy, LoadHoursStrategy)
 
 
+class UnmatchedLoads:
+    """
+    Running unmatched load statistics behind export_unmatched_loads, per house, load and
+    cell tower
+    """
+    def __init__(self):
+        # area name -> hour -> device data of the hour
+        self._per_hour_device_data = defaultdict(dict)
+        # area name -> area stats, until the next market of the area is folded
+        self._area_stats = {}
+
+    def fold(self, area, market, past_market_types):
+        if past_market_types != "past_markets":
+            return
+        current_slot = market.time_slot
+        for child in area.children:
+            if not (select_house_or_cell_tower(child) or select_house_or_load(child)):
+                continue
+            per_hour_device_data = self._per_hour_device_data[child.name]
+            hour_data = per_hour_device_data.get(current_slot.hour, {"devices": {}})
+            # Update hour data for the area, by accumulating slots in one hour
+            per_hour_device_data[current_slot.hour] = \
+                _calculate_hour_stats_for_area(hour_data, child, current_slot)
+            self._area_stats.pop(child.name, None)
+
+    def _calculate_area_stats(self, area):
+        # The stats are shared by all views of an update, and are only rebuilt once new
+        # markets were folded
+        if area.name not in self._area_stats:
+            area_data = _accumulate_device_stats_to_area_stats(
+                _copy_device_data(self._per_hour_device_data[area.name]))
+            area_data["type"] = get_area_type_string(area)
+            self._area_stats[area.name] = area_data
+        return self._area_stats[area.name]
+
+    def _recurse_area_tree(self, area, area_select_function):
+        unmatched_loads = {}
+        for child in area.children:
+            if area_select_function(child):
+                # Need to iterate, because the area has been marked as a house or cell tower
+                unmatched_loads[child.name] = self._calculate_area_stats(child)
+            elif child.children is None:
+                # We are at a leaf node, no point in recursing further. This node's calculation
+                # should be done on the upper level
+                continue
+            else:
+                # Recurse even further. Merge new results with existing ones
+                unmatched_loads = {**unmatched_loads,
+                                   **self._recurse_area_tree(child, area_select_function)}
+        return unmatched_loads
+
+    def export(self, area, all_devices=False):
+        unmatched_loads_result = {}
+
+        area_select_function = \
+            select_house_or_load if all_devices else select_house_or_cell_tower
+        area_tree = self._recurse_area_tree(area, area_select_function)
+        # Calculate overall metrics for the whole grid
+        unmatched_loads_result["unmatched_load_count"] = \
+            sum([v["unmatched_load_count"] for k, v in area_tree.items()])
+        unmatched_loads_result["all_loads_met"] = \
+            (unmatched_loads_result["unmatched_load_count"] == 0)
+        area_tree = OrderedDict(sorted(area_tree.items()))
+        unmatched_loads_result["areas"] = area_tree
+        return unmatched_loads_result
+
+
 def export_unmatched_loads(area, all_devices=False):
-    unmatched_loads_result = {}
-
-    area_select_function = select_house_or_load if all_devices else select_house_or_cell_tower
-    area_tree = _recurse_area_tree(area, area_select_function)
-    # Calculate overall metrics for the whole grid
-    unmatched_loads_result["unmatched_load_count"] = \
-        sum([v["unmatched_load_count"] for k, v in area_tree.items()])
-    unmatched_loads_result["all_loads_met"] = (unmatched_loads_result["unmatched_load_count"] == 0)
-    area_tree = OrderedDict(sorted(area_tree.items()))
-    unmatched_loads_result["areas"] = area_tree
-    return unmatched_loads_result
+    unmatched_loads = UnmatchedLoads()
+    fold_past_markets(area, [unmatched_loads])
+    return unmatched_loads.export(area, all_devices)
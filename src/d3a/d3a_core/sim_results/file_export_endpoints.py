@@ -15,7 +15,6 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
-from slugify import slugify
 from d3a.models.area import Area
 from d3a.models.strategy.load_hours import LoadHoursStrategy, CellTowerLoadHoursStrategy
 from d3a.models.strategy.predefined_load import DefinedLoadStrategy
@@ -46,10 +45,10 @@ class FileExportEndpoints:
         return ExportBalancingData(area) if is_balancing_market else ExportData.create(area)
 
     def update_sold_bought_energy(self, area: Area):
-        self.traded_energy[area.slug] = \
-            self._calculate_devices_sold_bought_energy(area, area.past_markets)
-        self.balancing_traded_energy[area.slug] = \
-            self._calculate_devices_sold_bought_energy(area, area.past_balancing_markets)
+        self.traded_energy[area.slug] = self._calculate_devices_sold_bought_energy(
+            area, area.past_markets, area.trade_log)
+        self.balancing_traded_energy[area.slug] = self._calculate_devices_sold_bought_energy(
+            area, area.past_balancing_markets, area.balancing_trade_log)
 
     def _get_stats_from_market_data(self, area, balancing):
         data = self.generate_market_export_data(area, balancing)
@@ -63,21 +62,22 @@ class FileExportEndpoints:
         self.plot_stats[area.slug] = self._get_stats_from_market_data(area, False)
         self.plot_balancing_stats[area.slug] = self._get_stats_from_market_data(area, True)
 
-    def _calculate_devices_sold_bought_energy(self, area, past_markets):
+    def _calculate_devices_sold_bought_energy(self, area, past_markets, trade_log):
         out_dict = {"sold_energy": {}, "bought_energy": {}}
-        for market in past_markets:
-            for trade in market.trades:
-                trade_seller = slugify(trade.seller, to_lower=True)
-                if trade_seller not in out_dict["sold_energy"]:
-                    out_dict["sold_energy"][trade_seller] = dict(
-                        (m.time_slot, 0) for m in area.past_markets)
-                out_dict["sold_energy"][trade_seller][market.time_slot] += trade.offer.energy
-
-                trade_buyer = slugify(trade.buyer, to_lower=True)
-                if trade_buyer not in out_dict["bought_energy"]:
-                    out_dict["bought_energy"][trade_buyer] = dict(
-                        (m.time_slot, 0) for m in area.past_markets)
-                out_dict["bought_energy"][trade_buyer][market.time_slot] += trade.offer.energy
+        slots = [m.time_slot for m in area.past_markets]
+        for row in trade_log.rows_of_slots([m.time_slot for m in past_markets]):
+            time_slot = trade_log.time_slots[trade_log.slot_index[row]]
+            energy = trade_log.energy[row]
+
+            trade_seller = trade_log.actor_slugs[trade_log.trade_seller_id[row]]
+            if trade_seller not in out_dict["sold_energy"]:
+                out_dict["sold_energy"][trade_seller] = dict.fromkeys(slots, 0)
+            out_dict["sold_energy"][trade_seller][time_slot] += energy
+
+            trade_buyer = trade_log.actor_slugs[trade_log.buyer_id[row]]
+            if trade_buyer not in out_dict["bought_energy"]:
+                out_dict["bought_energy"][trade_buyer] = dict.fromkeys(slots, 0)
+            out_dict["bought_energy"][trade_buyer][time_slot] += energy
 
         for ks in ("sold_energy", "bought_energy"):
             out_dict[ks + "_lists"] = dict((ki, {}) for ki in out_dict[ks].keys())
@@ -91,28 +91,37 @@ class FileExportEndpoints:
         Determines the buy and sell rate of each leaf node
         """
         labels = ("slot", "rate [ct./kWh]", "energy [kWh]", "seller")
-        for market in area.past_markets:
-            for trade in market.trades:
-                buyer_slug = slugify(trade.buyer, to_lower=True)
-                seller_slug = slugify(trade.seller, to_lower=True)
-                if buyer_slug not in self.buyer_trades:
-                    self.buyer_trades[buyer_slug] = dict((key, []) for key in labels)
-                if seller_slug not in self.seller_trades:
-                    self.seller_trades[seller_slug] = dict((key, []) for key in labels)
-                else:
-                    values = (market.time_slot,) + \
-                             (round(trade.offer.price / trade.offer.energy, 4),
-                              (trade.offer.energy * -1),) + \
-                             (slugify(trade.seller, to_lower=True),)
-                    for ii, ri in enumerate(labels):
-                        self.buyer_trades[buyer_slug][ri].append(values[ii])
-                        self.seller_trades[seller_slug][ri].append(values[ii])
+        trade_log = area.trade_log
+        for row in trade_log.rows_of_slots([m.time_slot for m in area.past_markets]):
+            buyer_slug = trade_log.actor_slugs[trade_log.buyer_id[row]]
+            seller_slug = trade_log.actor_slugs[trade_log.trade_seller_id[row]]
+            if buyer_slug not in self.buyer_trades:
+                self.buyer_trades[buyer_slug] = dict((key, []) for key in labels)
+            if seller_slug not in self.seller_trades:
+                self.seller_trades[seller_slug] = dict((key, []) for key in labels)
+            else:
+                values = (trade_log.time_slots[trade_log.slot_index[row]],
+                          round(trade_log.rate[row], 4),
+                          trade_log.energy[row] * -1,
+                          seller_slug)
+                for ii, ri in enumerate(labels):
+                    self.buyer_trades[buyer_slug][ri].append(values[ii])
+                    self.seller_trades[seller_slug][ri].append(values[ii])
 
 
 class ExportData:
     def __init__(self, area):
         self.area = area
 
+    def rows(self):
+        return self.rows_of(self.past_markets())
+
+    def rows_of(self, past_markets):
+        """
+        Rows of past_markets, a part of the markets returned by past_markets()
+        """
+        return (self._row(m.time_slot, m) for m in past_markets)
+
     @staticmethod
     def create(area):
         return ExportUpperLevelData(area) if len(area.children) > 0 else ExportLeafData(area)
@@ -131,30 +140,32 @@ class ExportUpperLevelData(ExportData):
                 'total energy traded [kWh]',
                 'total trade volume [EURO ct.]']
 
-    def rows(self):
-        return [self._row(m.time_slot, m) for m in self.area.past_markets]
+    def past_markets(self):
+        return self.area.past_markets
 
     def _row(self, slot, market):
+        trade_log = self.area.trade_log
+        rows = trade_log.rows_of_slot(market.time_slot)
         return [slot,
                 market.avg_trade_price,
                 market.min_trade_price,
                 market.max_trade_price,
-                len(market.trades),
-                sum(trade.offer.energy for trade in market.trades),
-                sum(trade.offer.price for trade in market.trades)]
+                len(rows),
+                sum(trade_log.energy[row] for row in rows),
+                sum(trade_log.price[row] for row in rows)]
 
 
-class ExportBalancingData:
+class ExportBalancingData(ExportData):
     def __init__(self, area):
-        self.area = area
+        super(ExportBalancingData, self).__init__(area)
 
     def labels(self):
         return ['slot',
                 'avg supply balancing trade rate [ct./kWh]',
                 'avg demand balancing trade rate [ct./kWh]']
 
-    def rows(self):
-        return [self._row(m.time_slot, m) for m in self.area.past_balancing_markets]
+    def past_markets(self):
+        return self.area.past_balancing_markets
 
     def _row(self, slot, market):
         return [slot,
@@ -180,8 +191,8 @@ class ExportLeafData(ExportData):
             return ['produced to trade [kWh]', 'not sold [kWh]', 'forecast / generation [kWh]']
         return []
 
-    def rows(self):
-        return [self._row(m.time_slot, m) for m in self.area.parent.past_markets]
+    def past_markets(self):
+        return self.area.parent.past_markets
 
     def _traded(self, market):
         return market.traded_energy[self.area.name]
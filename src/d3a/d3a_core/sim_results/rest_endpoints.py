@@ -15,21 +15,22 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
-from itertools import chain, repeat
-from operator import itemgetter
 from collections import OrderedDict
+from hashlib import sha1
 import pendulum
 
 # TODO: Potentially remove URLs from endpoints
 from flask.helpers import url_for as url_for_original
-from flask import abort
+from flask import Response, abort, request
+from werkzeug.http import quote_etag
 
 from d3a.constants import TIME_FORMAT
-from d3a.d3a_core.util import make_iaa_name, format_interval
-from d3a.d3a_core.sim_results.stats import energy_bills
+from d3a.d3a_core.sim_results.rest_snapshot import total_traded
+from d3a.d3a_core.util import format_interval
 
 
-def area_endpoint_stats(area):
+def area_endpoint_stats(area_snapshot):
+    area = area_snapshot.area
     return {
         'name': area.name,
         'slug': area.slug,
@@ -56,132 +57,89 @@ def area_endpoint_stats(area):
         'markets': [
             {
                 'type': type_,
-                'time_slot': market.time_slot.format(TIME_FORMAT),
-                'url': url_for('market', area_slug=area.slug,
-                               market_time=market.time_slot),
-                'trade_count': len(market.trades),
-                'offer_count': len(market.offers)
+                'time_slot': time_slot.format(TIME_FORMAT),
+                'url': url_for('market', area_slug=area.slug, market_time=time_slot),
+                'trade_count': trade_count,
+                'offer_count': offer_count
             }
-            for type_, market
-            in _market_progression(area)
+            for type_, time_slot, trade_count, offer_count
+            in _market_counts(area_snapshot)
         ],
     }
 
 
-def market_endpoint_stats(area, market_time):
-    market, type_ = _get_market(area, market_time)
-    return {
+def market_endpoint_stats(area_snapshot, market_time, offset=0, limit=None):
+    """
+    The market of area_snapshot at market_time. If offset or limit are given, only that page
+    of the trades and offers is returned.
+    """
+    type_, time_slot, stats = _get_market(area_snapshot, market_time)
+    details = stats.details if stats is not None \
+        else area_snapshot.closed.details(time_slot)
+    result = {
         'type': type_,
-        'time_slot': market.time_slot.format(TIME_FORMAT),
-        'url': url_for('market', area_slug=area.slug, market_time=market.time_slot),
-        'prices': {
-            'trade': {
-                'min': market.min_trade_price,
-                'avg': market.avg_trade_price,
-                'max': market.max_trade_price,
-            } if market.trades else _NO_VALUE,
-            'offer': {
-                'min': market.min_offer_price,
-                'avg': market.avg_offer_price,
-                'max': market.max_offer_price,
-            } if market.offers else _NO_VALUE
-        },
-        'energy_aggregate': _energy_aggregate(market),
-        'energy_accounting': [
-            {
-                'time': time.format("%H:%M:%S"),
-                'reports': [
-                    {
-                        'actor': actor,
-                        'value': value
-                    }
-                    for actor, value in acct_dict.items()
-                ]
-            }
-            for time, acct_dict in sorted(market.actual_energy.items(), key=itemgetter(0))
-        ],
-        'trades': [
-            {
-                'id': t.id,
-                'time': str(t.time),
-                'seller': t.seller,
-                'buyer': t.buyer,
-                'energy': t.offer.energy,
-                'price': t.offer.price / t.offer.energy
-            }
-            for t in market.trades
-        ],
-        'offers': [
-            {
-                'id': o.id,
-                'seller': o.seller,
-                'energy': o.energy,
-                'price': o.price / o.energy
-            }
-            for o in market.offers.values()
-        ],
-        'ious': _ious(market)
+        'time_slot': details['time_slot'],
+        'url': url_for('market', area_slug=area_snapshot.area.slug, market_time=time_slot),
+        **details
     }
+    if offset or limit is not None:
+        end = offset + limit if limit is not None else None
+        result['trades'] = details['trades'][offset:end]
+        result['offers'] = details['offers'][offset:end]
+        result['pagination'] = {
+            'offset': offset,
+            'limit': limit,
+            'trade_count': len(details['trades']),
+            'offer_count': len(details['offers'])
+        }
+    return result
+
+
+def market_etag(snapshot, area_snapshot, market_time):
+    type_, time_slot, stats = _get_market(area_snapshot, market_time)
+    if stats is None:
+        # Closed markets do not change until the simulation is reset or they are replaced
+        # by their MarketSummary
+        return snapshot.run_id, area_snapshot.area.slug, time_slot, \
+            area_snapshot.closed.market_type(time_slot)
+    return snapshot_etag(snapshot)
 
 
-def markets_endpoints_stats(area):
+def markets_endpoints_stats(area_snapshot):
     return [
         {
-            'prices': {
-                'trade': {
-                    'min': market.min_trade_price,
-                    'avg': market.avg_trade_price,
-                    'max': market.max_trade_price,
-                } if market.trades else _NO_VALUE,
-                'offer': {
-                    'min': market.min_offer_price,
-                    'avg': market.avg_offer_price,
-                    'max': market.max_offer_price,
-                } if market.offers else _NO_VALUE
-            },
-            'ious': _ious(market),
-            'energy_aggregate': _energy_aggregate(market),
-            'total_traded': _total_traded(market),
-            'trade_count': len(market.trades),
-            'offer_count': len(market.offers),
+            **overview,
             'type': type_,
-            'time_slot': market.time_slot.format(TIME_FORMAT),
-            'url': url_for('market', area_slug=area.slug, market_time=market.time_slot),
+            'url': url_for('market', area_slug=area_snapshot.area.slug, market_time=time_slot),
         }
-        for type_, (time, market)
-        in _market_progression(area)
+        for type_, time_slot, overview
+        in _market_progression(area_snapshot)
     ]
 
 
-def market_results_endpoint_stats(area, market):
-    if market is None:
+def market_results_endpoint_stats(area_snapshot):
+    if area_snapshot.current is None:
         return {'error': 'no results yet'}
+    closed = area_snapshot.closed
     return {
-        'summary': {
-            'avg_trade_price': market.avg_trade_price,
-            'max_trade_price': market.max_trade_price,
-            'min_trade_price': market.min_trade_price
-        },
-        'balance': {
-            child.slug: market.total_earned(child.slug) - market.total_spent(child.slug)
-            for child in area.children
-        },
-        'energy_balance': {
-            child.slug: _get_child_traded_energy(market, child)
-            for child in area.children
-        },
+        **area_snapshot.results,
         'slots': [
             {
-                'volume': sum(trade.offer.energy for trade in slot_market.trades),
+                'volume': total_traded(closed.market(time_slot)),
+            }
+            for time_slot in closed.time_slots
+        ] + [
+            {
+                'volume': area_snapshot.current.overview['total_traded'],
             }
-            for slot_market in area.past_markets.values()
         ]
     }
 
 
-def bills_endpoint_stats(area, past_market_types, from_slot, to_slot):
-    result = energy_bills(area, past_market_types, from_slot, to_slot)
-    result = OrderedDict(sorted(result.items()))
+def bills_endpoint_stats(snapshot, area, past_market_types, from_slot, to_slot):
+    result = snapshot.energy_bills.export(area, past_market_types, from_slot, to_slot,
+                                          snapshot.last_slot)
+    result = OrderedDict(sorted((result or {}).items()))
     if from_slot:
         result['from'] = str(from_slot)
     if to_slot:
@@ -206,92 +164,84 @@ def simulation_info(simulation):
     }
 
 
-_NO_VALUE = {
-    'min': None,
-    'avg': None,
-    'max': None
-}
-
-
-def _get_market(area, market_time):
-    if market_time == 'current':
-        market = list(area.past_markets)[-1]
-        type_ = 'current'
-    elif market_time.isdigit():
-        market = list(area.markets)[int(market_time)]
-        type_ = 'open'
-    elif market_time[0] == '-' and market_time[1:].isdigit():
-        market = list(area.past_markets)[int(market_time)]
-        type_ = 'closed'
-    else:
-        time = pendulum.parse(market_time)
-        try:
-            market = area._markets.markets[time]
-            type_ = 'open'
-        except KeyError:
-            try:
-                market = area._markets.past_markets[time]
-            except KeyError:
-                return abort(404)
-            type_ = 'closed'
-            if market.time_slot == list(area._markets.past_markets.keys())[-1]:
-                type_ = 'current'
-    return market, type_
+def snapshot_etag(snapshot):
+    return snapshot.run_id, snapshot.version
+
+
+def etag_response(etag, build_response):
+    """
+    Answers a request whose If-None-Match header contains the ETag of the response with
+    304 Not Modified, without building the response. etag identifies the data of the
+    response, it is combined with the URL of the request.
+    """
+    etag = sha1(repr((etag, request.full_path)).encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return build_response(), 200, {'ETag': quote_etag(etag)}
+
+
+def _get_market(area_snapshot, market_time):
+    """
+    (type, time slot, MarketStats) of a market of area_snapshot, the stats of closed markets
+    are None
+    """
+    closed, current = area_snapshot.closed, area_snapshot.current
+    past_count = len(closed) + (1 if current is not None else 0)
+    try:
+        if market_time == 'current':
+            if current is None:
+                abort(404)
+            return 'current', current.time_slot, current
+        elif market_time.isdigit():
+            stats = area_snapshot.open[int(market_time)]
+            return 'open', stats.time_slot, stats
+        elif market_time[0] == '-' and market_time[1:].isdigit():
+            index = range(past_count)[int(market_time)]
+            if index == len(closed):
+                return 'closed', current.time_slot, current
+            return 'closed', closed.time_slot(index), None
+    except IndexError:
+        abort(404)
+    time = pendulum.parse(market_time)
+    for stats in area_snapshot.open:
+        if stats.time_slot == time:
+            return 'open', time, stats
+    if current is not None and current.time_slot == time:
+        return 'current', time, current
+    if time not in closed:
+        abort(404)
+    return 'closed', time, None
 
 
 def url_for(target, **kwargs):
     return url_for_original(target, **{**kwargs, '_external': True})
 
 
-def _market_progression(area):
-    return chain(
-        zip(
-            chain(
-                repeat('closed', times=len(area.past_markets) - 1),
-                ('current',)
-            ),
-            list(area.past_markets)
-        ),
-        zip(
-            repeat('open'),
-            list(area.all_markets)
-        )
-    )
-
-
-def _energy_aggregate(market):
-    return {
-        'traded': {
-            actor: round(value, 4)
-            for actor, value
-            in list(market.traded_energy.items())
-            if abs(value) > 0.0000
-        },
-        'actual': {
-            actor: round(value, 4)
-            for actor, value
-            in list(market.actual_energy_agg.items())
-        }
-    }
-
-
-def _total_traded(market):
-    return sum(trade.offer.energy for trade in market.trades) if market.trades else 0
-
-
-def _ious(market):
-    return {
-        buyer: {
-            seller: round(total, 4)
-            for seller, total
-            in seller_total.items()
-            }
-        for buyer, seller_total in list(market.ious.items())
-        }
-
-
-def _get_child_traded_energy(market, child):
-    return market.traded_energy.get(
-        child.name,
-        market.traded_energy.get(make_iaa_name(child), '-')
-    )
+def _market_progression(area_snapshot):
+    """
+    (type, time slot, overview) of the markets of an area, oldest first
+    """
+    closed = area_snapshot.closed
+    for time_slot in closed.time_slots:
+        yield 'closed', time_slot, closed.overview(time_slot)
+    for type_, stats in _live_markets(area_snapshot):
+        yield type_, stats.time_slot, stats.overview
+
+
+def _market_counts(area_snapshot):
+    closed = area_snapshot.closed
+    for time_slot in closed.time_slots:
+        market = closed.market(time_slot)
+        yield 'closed', time_slot, len(market.trades), len(market.offers)
+    for type_, stats in _live_markets(area_snapshot):
+        yield type_, stats.time_slot, stats.overview['trade_count'], stats.overview['offer_count']
+
+
+def _live_markets(area_snapshot):
+    # The current and open markets, which are serialised when the snapshot is published
+    if area_snapshot.current is not None:
+        yield 'current', area_snapshot.current
+    for stats in area_snapshot.open:
+        yield 'open', stats
@@ -0,0 +1,322 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import uuid
+from bisect import bisect_left
+from collections import namedtuple
+from functools import lru_cache
+from operator import itemgetter
+
+from d3a.constants import TIME_FORMAT
+from d3a.d3a_core.util import make_iaa_name
+from d3a.models.const import ConstSettings
+
+
+_NO_VALUE = {
+    'min': None,
+    'avg': None,
+    'max': None
+}
+
+# Views of the endpoint buffer that are served by the REST-API as they are
+ENDPOINT_BUFFER_VIEWS = ('unmatched_loads', 'cumulative_loads', 'price_energy_day',
+                         'cumulative_grid_trades', 'cumulative_grid_balancing_trades')
+
+
+# Serialised current or open market, `overview` is its entry of the markets of an area and
+# `details` the full market. Neither contains the URLs, which depend on the request.
+MarketStats = namedtuple('MarketStats', ('time_slot', 'overview', 'details'))
+
+# `closed` are the markets that closed before `current`, `results` the results of `current`
+AreaSnapshot = namedtuple('AreaSnapshot', ('area', 'closed', 'current', 'open', 'results'))
+
+
+class RestSnapshot(namedtuple('RestSnapshot', (
+        'run_id', 'version', 'areas', 'views', 'tree_summary', 'energy_bills', 'last_slot'))):
+    """
+    State of the simulation as served by the REST-API, published at the end of every slot.
+
+    A snapshot is never changed after it was published, requests read it without holding the
+    page lock. `areas` maps the area slugs to their AreaSnapshot, `energy_bills` are the
+    cumulative bills of the endpoint buffer, which are read up to `last_slot`. `run_id` changes
+    when the simulation is reset, responses are identified by it and the version.
+    """
+    def area(self, area_slug):
+        return self.areas.get(area_slug)
+
+
+class ClosedMarketStats:
+    """
+    Serialised closed markets of a simulation, keyed by area slug, time slot and the type of
+    the stored market.
+
+    Closed markets do not change any more, so each one is serialised once. A market that is
+    older than the live past markets of its area is replaced by its MarketSummary, which is
+    serialised anew. Only the `max_size` most recently requested overviews and details are
+    kept.
+    """
+    def __init__(self, root_area, max_size):
+        self._root_area = root_area
+        self._overview = lru_cache(maxsize=max_size)(self._market_overview)
+        self._details = lru_cache(maxsize=max_size)(self._market_details)
+
+    def market(self, area_slug, time_slot):
+        return self._root_area.child_by_slug[area_slug]._markets.past_markets[time_slot]
+
+    def market_type(self, area_slug, time_slot):
+        return type(self.market(area_slug, time_slot)).__name__
+
+    def overview(self, area_slug, time_slot):
+        return self._overview(area_slug, time_slot, self.market_type(area_slug, time_slot))
+
+    def details(self, area_slug, time_slot):
+        return self._details(area_slug, time_slot, self.market_type(area_slug, time_slot))
+
+    def _market_overview(self, area_slug, time_slot, market_type):
+        return market_overview(self.market(area_slug, time_slot))
+
+    def _market_details(self, area_slug, time_slot, market_type):
+        return market_details(self.market(area_slug, time_slot))
+
+
+class ClosedMarkets:
+    """
+    Markets of an area that closed before the current market, as of a snapshot.
+
+    Only the current market of an area still changes, the markets before it are serialised
+    when they are requested. The time slots are shared by all snapshots of the area and only
+    appended to, a snapshot sees the first `count` of them.
+    """
+    def __init__(self, area_slug, time_slots, count, stats):
+        self._area_slug = area_slug
+        self._time_slots = time_slots
+        self._count = count
+        self._stats = stats  # type: ClosedMarketStats
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, time_slot):
+        index = bisect_left(self._time_slots, time_slot, 0, self._count)
+        return index < self._count and self._time_slots[index] == time_slot
+
+    def time_slot(self, index):
+        return self._time_slots[range(self._count)[index]]
+
+    @property
+    def time_slots(self):
+        return self._time_slots[:self._count]
+
+    def market(self, time_slot):
+        return self._stats.market(self._area_slug, time_slot)
+
+    def market_type(self, time_slot):
+        return self._stats.market_type(self._area_slug, time_slot)
+
+    def overview(self, time_slot):
+        return self._stats.overview(self._area_slug, time_slot)
+
+    def details(self, time_slot):
+        return self._stats.details(self._area_slug, time_slot)
+
+
+class RestSnapshots:
+    """
+    Publishes the RestSnapshot of a simulation, `current` is the latest one.
+
+    publish has to be called while the simulation does not tick, i.e. under the page lock.
+    Replacing `current` is atomic, a request keeps the snapshot it started with.
+    """
+    def __init__(self):
+        self.current = None  # type: RestSnapshot
+        self._reset(None)
+
+    def _reset(self, root_area):
+        self._root_area = root_area
+        self._run_id = uuid.uuid4().hex
+        # area slug -> time slots of the closed markets of the area
+        self._closed_time_slots = {}
+        self._closed_market_stats = ClosedMarketStats(
+            root_area, ConstSettings.GeneralSettings.REST_MARKET_CACHE_SIZE
+        )
+
+    def publish(self, root_area, endpoint_buffer):
+        if root_area is not self._root_area:
+            # The simulation has been reset
+            self._reset(root_area)
+        areas = {slug: self._area_snapshot(area)
+                 for slug, area in root_area.child_by_slug.items()}
+        current_market = root_area.current_market
+        self.current = RestSnapshot(
+            run_id=self._run_id,
+            version=self.current.version + 1 if self.current is not None else 1,
+            areas=areas,
+            views={name: getattr(endpoint_buffer, name) for name in ENDPOINT_BUFFER_VIEWS},
+            tree_summary=dict(endpoint_buffer.tree_summary),
+            energy_bills=endpoint_buffer.folded_energy_bills,
+            last_slot=current_market.time_slot if current_market is not None else None
+        )
+        return self.current
+
+    def _area_snapshot(self, area):
+        past_markets = area._markets.past_markets
+        current = past_markets[next(reversed(past_markets))] if past_markets else None
+        time_slots = self._closed_time_slots.setdefault(area.slug, [])
+        new_time_slots = []
+        for time_slot in reversed(past_markets):
+            if time_slots and time_slot <= time_slots[-1]:
+                break
+            if time_slot != current.time_slot:
+                new_time_slots.append(time_slot)
+        time_slots.extend(reversed(new_time_slots))
+        return AreaSnapshot(
+            area=area,
+            closed=ClosedMarkets(area.slug, time_slots, len(time_slots),
+                                 self._closed_market_stats),
+            current=market_stats(current) if current is not None else None,
+            open=tuple(market_stats(market) for market in area._markets.markets.values()),
+            results=_current_market_results(area, current) if current is not None else None
+        )
+
+
+def market_stats(market):
+    return MarketStats(market.time_slot, market_overview(market), market_details(market))
+
+
+def market_overview(market):
+    return {
+        'prices': _prices(market),
+        'ious': _ious(market),
+        'energy_aggregate': _energy_aggregate(market),
+        'total_traded': total_traded(market),
+        'trade_count': len(market.trades),
+        'offer_count': len(market.offers),
+        'time_slot': market.time_slot.format(TIME_FORMAT),
+    }
+
+
+def market_details(market):
+    return {
+        'time_slot': market.time_slot.format(TIME_FORMAT),
+        'prices': _prices(market),
+        'energy_aggregate': _energy_aggregate(market),
+        'energy_accounting': [
+            {
+                'time': time.format("%H:%M:%S"),
+                'reports': [
+                    {
+                        'actor': actor,
+                        'value': value
+                    }
+                    for actor, value in acct_dict.items()
+                ]
+            }
+            for time, acct_dict in sorted(market.actual_energy.items(), key=itemgetter(0))
+        ],
+        'trades': [
+            {
+                'id': t.id,
+                'time': str(t.time),
+                'seller': t.seller,
+                'buyer': t.buyer,
+                'energy': t.offer.energy,
+                'price': t.offer.price / t.offer.energy
+            }
+            for t in market.trades
+        ],
+        'offers': [
+            {
+                'id': o.id,
+                'seller': o.seller,
+                'energy': o.energy,
+                'price': o.price / o.energy
+            }
+            for o in market.offers.values()
+        ],
+        'ious': _ious(market)
+    }
+
+
+def total_traded(market):
+    return sum(trade.offer.energy for trade in market.trades) if market.trades else 0
+
+
+def _current_market_results(area, market):
+    return {
+        'summary': {
+            'avg_trade_price': market.avg_trade_price,
+            'max_trade_price': market.max_trade_price,
+            'min_trade_price': market.min_trade_price
+        },
+        'balance': {
+            child.slug: market.total_earned(child.slug) - market.total_spent(child.slug)
+            for child in area.children
+        },
+        'energy_balance': {
+            child.slug: _get_child_traded_energy(market, child)
+            for child in area.children
+        },
+    }
+
+
+def _prices(market):
+    return {
+        'trade': {
+            'min': market.min_trade_price,
+            'avg': market.avg_trade_price,
+            'max': market.max_trade_price,
+        } if market.trades else _NO_VALUE,
+        'offer': {
+            'min': market.min_offer_price,
+            'avg': market.avg_offer_price,
+            'max': market.max_offer_price,
+        } if market.offers else _NO_VALUE
+    }
+
+
+def _energy_aggregate(market):
+    return {
+        'traded': {
+            actor: round(value, 4)
+            for actor, value
+            in list(market.traded_energy.items())
+            if abs(value) > 0.0000
+        },
+        'actual': {
+            actor: round(value, 4)
+            for actor, value
+            in list(market.actual_energy_agg.items())
+        }
+    }
+
+
+def _ious(market):
+    return {
+        buyer: {
+            seller: round(total, 4)
+            for seller, total
+            in seller_total.items()
+            }
+        for buyer, seller_total in list(market.ious.items())
+        }
+
+
+def _get_child_traded_energy(market, child):
+    return market.traded_energy.get(
+        child.name,
+        market.traded_energy.get(make_iaa_name(child), '-')
+    )
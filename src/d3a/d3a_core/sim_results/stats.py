@@ -15,8 +15,10 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
+from bisect import bisect_left, bisect_right
+
 from d3a.d3a_core.util import area_name_from_area_or_iaa_name
-from d3a.d3a_core.sim_results.area_statistics import get_area_type_string
+from d3a.d3a_core.sim_results.area_statistics import get_area_type_string, trade_log_of
 
 
 def recursive_current_markets(area):
@@ -66,17 +68,114 @@ def energy_bills(area, past_market_types, from_slot=None, to_slot=None):
     for market in getattr(area, past_market_types):
         slot = market.time_slot
         if (from_slot is None or slot >= from_slot) and (to_slot is None or slot < to_slot):
-            for trade in market.trades:
-                buyer = area_name_from_area_or_iaa_name(trade.buyer)
-                seller = area_name_from_area_or_iaa_name(trade.offer.seller)
-                if buyer in result:
-                    result[buyer]['bought'] += trade.offer.energy
-                    result[buyer]['spent'] += trade.offer.price
-                if seller in result:
-                    result[seller]['sold'] += trade.offer.energy
-                    result[seller]['earned'] += trade.offer.price
+            _add_trades_to_bills(result, market.trades)
     for child in area.children:
         child_result = energy_bills(child, past_market_types, from_slot, to_slot)
         if child_result is not None:
             result[child.name]['children'] = child_result
     return result
+
+
+def _add_trades_to_bills(bills, trades):
+    for trade in trades:
+        buyer = area_name_from_area_or_iaa_name(trade.buyer)
+        seller = area_name_from_area_or_iaa_name(trade.offer.seller)
+        if buyer in bills:
+            bills[buyer]['bought'] += trade.offer.energy
+            bills[buyer]['spent'] += trade.offer.price
+        if seller in bills:
+            bills[seller]['sold'] += trade.offer.energy
+            bills[seller]['earned'] += trade.offer.price
+
+
+def _add_trade_log_rows_to_bills(bills, trade_log, rows):
+    area_names = trade_log.actor_area_names
+    for row in rows:
+        buyer = area_names[trade_log.buyer_id[row]]
+        seller = area_names[trade_log.seller_id[row]]
+        if buyer in bills:
+            bills[buyer]['bought'] += trade_log.energy[row]
+            bills[buyer]['spent'] += trade_log.price[row]
+        if seller in bills:
+            bills[seller]['sold'] += trade_log.energy[row]
+            bills[seller]['earned'] += trade_log.price[row]
+
+
+_BILL_FIELDS = ('bought', 'sold', 'spent', 'earned')
+
+
+class _AreaBills:
+    """
+    Bills of the children of an area, plus the cumulative bills after every folded market,
+    so that the bills of any range of slots are the difference of two cumulative bills
+    """
+    def __init__(self, area):
+        self.time_slots = []
+        self.totals = {child.name: dict(bought=0.0, sold=0.0, spent=0.0, earned=0.0)
+                       for child in area.children}
+        # child name -> (bought, sold, spent, earned) after each of time_slots
+        self.cumulative = {child_name: [] for child_name in self.totals}
+
+    def fold(self, trade_log, time_slot):
+        _add_trade_log_rows_to_bills(self.totals, trade_log, trade_log.rows_of_slot(time_slot))
+        self.time_slots.append(time_slot)
+        for child_name, bill in self.totals.items():
+            self.cumulative[child_name].append(tuple(bill[field] for field in _BILL_FIELDS))
+
+    def slot_range(self, from_slot, to_slot, last_slot=None):
+        # Only the markets up to last_slot are visible, the lists are appended to while
+        # another thread reads them
+        count = len(self.time_slots) if last_slot is None \
+            else bisect_right(self.time_slots, last_slot)
+        start = 0 if from_slot is None else bisect_left(self.time_slots, from_slot, 0, count)
+        end = count if to_slot is None else bisect_left(self.time_slots, to_slot, 0, count)
+        return start, max(start, end)
+
+    def bill(self, child_name, start, end):
+        cumulative = self.cumulative[child_name]
+        after = cumulative[end - 1] if end > 0 else (0.0, ) * len(_BILL_FIELDS)
+        before = cumulative[start - 1] if start > 0 else (0.0, ) * len(_BILL_FIELDS)
+        return {field: after[i] - before[i] for i, field in enumerate(_BILL_FIELDS)}
+
+
+class EnergyBills:
+    """
+    Running totals behind energy_bills, per area.
+
+    The cumulative bills are kept for every slot, therefore the bills of any range of slots
+    are answered without visiting the markets again.
+    """
+    def __init__(self):
+        # (area name, past market types) -> _AreaBills
+        self._bills = {}
+
+    def _area_bills(self, area, past_market_types):
+        key = (area.name, past_market_types)
+        if key not in self._bills:
+            self._bills[key] = _AreaBills(area)
+        return self._bills[key]
+
+    def fold(self, area, market, past_market_types):
+        if area.children:
+            self._area_bills(area, past_market_types).fold(
+                trade_log_of(area, past_market_types), market.time_slot)
+
+    def export(self, area, past_market_types, from_slot=None, to_slot=None, last_slot=None):
+        """
+        Bills of the past markets with from_slot <= time slot < to_slot, see energy_bills.
+        Markets after last_slot are left out, so that the bills do not change while newer
+        markets are folded.
+        """
+        if not area.children:
+            return None
+        bills = self._area_bills(area, past_market_types)
+        start, end = bills.slot_range(from_slot, to_slot, last_slot)
+        result = {child.name: dict(bills.bill(child.name, start, end),
+                                   type=get_area_type_string(child))
+                  for child in area.children}
+        for child in area.children:
+            child_result = self.export(child, past_market_types, from_slot, to_slot,
+                                       last_slot)
+            if child_result is not None:
+                result[child.name]['children'] = child_result
+        return result
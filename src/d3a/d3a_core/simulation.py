@@ -35,12 +35,14 @@ from ptpython.repl import embed
 from d3a.blockchain import BlockChainInterface
 from d3a.constants import TIME_ZONE
 from d3a.d3a_core.exceptions import SimulationException, D3AException
-from d3a.d3a_core.export import ExportAndPlot, mkdir_from_str
+from d3a.d3a_core.export import ExportAndPlot, ProgressiveCSVExport, export_directory, \
+    mkdir_from_str
 from d3a.models.config import SimulationConfig
 # noinspection PyUnresolvedReferences
 from d3a import setup as d3a_setup  # noqa
 from d3a.d3a_core.util import NonBlockingConsole, format_interval
 from d3a.d3a_core.sim_results.endpoint_buffer import SimulationEndpointBuffer
+from d3a.d3a_core.sim_results.rest_snapshot import RestSnapshots  # noqa
 from d3a.d3a_core.redis_communication import RedisSimulationCommunication
 from d3a.models.const import ConstSettings
 from d3a.d3a_core.area_serializer import are_all_areas_unique
@@ -60,6 +62,7 @@ class Simulation:
     def __init__(self, setup_module_name: str, simulation_config: SimulationConfig = None,
                  slowdown: int = 0, seed=None, paused: bool = False, pause_after: duration = None,
                  use_repl: bool = False, export: bool = False, export_path: str = None,
+                 progressive_export: bool = False,
                  reset_on_finish: bool = False,
                  reset_on_finish_wait: duration = duration(minutes=1),
                  exit_on_finish: bool = False,
@@ -75,8 +78,10 @@ class Simulation:
 
         self.simulation_config = simulation_config
         self.use_repl = use_repl
-        self.export_on_finish = export
+        self.export_on_finish = export or progressive_export
         self.export_path = export_path
+        # Write the csv files slot by slot while running, only the plots are left for the end
+        self.progressive_export = progressive_export
         self.reset_on_finish = reset_on_finish
         self.reset_on_finish_wait = reset_on_finish_wait
         self.exit_on_finish = exit_on_finish
@@ -87,6 +92,8 @@ class Simulation:
         self.is_stopped = False
         self.endpoint_buffer = SimulationEndpointBuffer(redis_job_id, self.initial_params)
         self.redis_connection = RedisSimulationCommunication(self, redis_job_id)
+        # Set when the REST-API is started, which serves the published snapshots
+        self.rest_snapshots = None  # type: RestSnapshots
         if sum([reset_on_finish, exit_on_finish, use_repl]) > 1:
             raise D3AException(
                 "Can only specify one of '--reset-on-finish', '--exit-on-finish' and '--use-repl' "
@@ -155,6 +162,9 @@ class Simulation:
         are_all_areas_unique(self.area, set())
 
         self.area.activate(self.bc)
+        self._progressive_csv_export = None  # type: ProgressiveCSVExport
+        self._export_subdir = None
+        self._publish_rest_snapshot()
 
     @property
     def finished(self):
@@ -255,6 +265,9 @@ class Simulation:
                             self.redis_connection.publish_intermediate_results(
                                 self.endpoint_buffer
                             )
+                            if self.progressive_export:
+                                self._export_new_past_markets()
+                            self._publish_rest_snapshot()
 
                     run_duration = (
                             DateTime.now(tz=TIME_ZONE) - self.run_start -
@@ -273,14 +286,7 @@ class Simulation:
                     if not self.exit_on_finish:
                         log.error("REST-API still running at %s", self.api_url)
                     if self.export_on_finish:
-                        export = ExportAndPlot(self.area, self.export_path,
-                                               DateTime.now(tz=TIME_ZONE).isoformat())
-                        json_dir = os.path.join(export.directory, "aggregated_results")
-                        mkdir_from_str(json_dir)
-                        for key, value in self.endpoint_buffer.generate_result_report().items():
-                            json_file = os.path.join(json_dir, key)
-                            with open(json_file, 'w') as outfile:
-                                json.dump(value, outfile)
+                        self._export_results()
                     if self.use_repl:
                         self._start_repl()
                     elif self.reset_on_finish:
@@ -310,6 +316,61 @@ class Simulation:
             except KeyboardInterrupt:
                 break
 
+    def run_batch(self) -> duration:
+        """
+        Run the simulation to the end without a console, REST-API or Redis.
+
+        Nothing is shared with other threads, so the ticks are not serialized through the
+        page lock, and the results are only collected once, after the last slot.
+        """
+        config = self.simulation_config
+        self.is_stopped = False
+        self.run_start = DateTime.now(tz=TIME_ZONE)
+        self.paused_time = 0
+        start = time.monotonic()
+        for tick_no in range(1, config.total_ticks + 1):
+            self.area.tick(is_root_area=True)
+            if self.progressive_export and tick_no % config.ticks_per_slot == 0:
+                self._export_new_past_markets()
+        self.endpoint_buffer.update_stats(self.area, self.status)
+        run_duration = duration(seconds=time.monotonic() - start)
+        log.error(
+            "Batch run finished in %s / %.2fx real time / %.1f ticks per second",
+            run_duration,
+            config.duration / run_duration,
+            config.total_ticks / run_duration.total_seconds()
+        )
+        if self.export_on_finish:
+            self._export_results()
+        return run_duration
+
+    def _publish_rest_snapshot(self):
+        if self.rest_snapshots is not None:
+            self.rest_snapshots.publish(self.area, self.endpoint_buffer)
+
+    def _export_new_past_markets(self):
+        if self._progressive_csv_export is None:
+            self._export_subdir = DateTime.now(tz=TIME_ZONE).isoformat()
+            directory = export_directory(self.export_path, self._export_subdir)
+            mkdir_from_str(directory)
+            self._progressive_csv_export = ProgressiveCSVExport(self.area, directory)
+        self._progressive_csv_export.export_new_past_markets()
+
+    def _export_results(self):
+        if self.progressive_export:
+            self._export_new_past_markets()
+            export = ExportAndPlot(self.area, self.export_path, self._export_subdir,
+                                   export_csv=False)
+        else:
+            export = ExportAndPlot(self.area, self.export_path,
+                                   DateTime.now(tz=TIME_ZONE).isoformat())
+        json_dir = os.path.join(export.directory, "aggregated_results")
+        mkdir_from_str(json_dir)
+        for key, value in self.endpoint_buffer.generate_result_report().items():
+            json_file = os.path.join(json_dir, key)
+            with open(json_file, 'w') as outfile:
+                json.dump(value, outfile)
+
     def toggle_pause(self):
         if self.finished:
             return False
@@ -378,8 +439,9 @@ class Simulation:
         if self.paused:
             start = time.monotonic()
             log.critical("Simulation paused. Press 'p' to resume or resume from API.")
-            self.endpoint_buffer.update(self.area, self.status)
+            self.endpoint_buffer.update_stats(self.area, self.status)
             self.redis_connection.publish_intermediate_results(self.endpoint_buffer)
+            self._publish_rest_snapshot()
             while self.paused and not self.interrupt.is_set():
                 self._handle_input(console, 0.1)
             log.critical("Simulation resumed")
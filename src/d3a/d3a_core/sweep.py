@@ -0,0 +1,144 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import csv
+import json
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from logging import getLogger
+
+from d3a.d3a_core.export import mkdir_from_str
+from d3a.d3a_core.simulation import Simulation
+from d3a.d3a_core.util import constsettings_to_dict, update_advanced_settings
+from d3a.models.config import SimulationConfig
+
+
+log = getLogger(__name__)
+
+
+TREE_SUMMARY_FIELDS = ('min_trade_price', 'avg_trade_price', 'max_trade_price')
+
+
+def parameter_grid(grid):
+    """
+    All combinations of the values in grid, a dict of parameter name -> list of values.
+
+    A parameter is either a SimulationConfig argument (e.g. 'iaa_fee'), 'seed', or a
+    ConstSettings variable given as '<SettingsClass>.<VARIABLE>' (e.g. 'IAASettings.MARKET_TYPE').
+    """
+    names = list(grid.keys())
+    return [dict(zip(names, values)) for values in product(*grid.values())]
+
+
+def _split_parameters(parameters):
+    seed = None
+    config_params = {}
+    advanced_settings = defaultdict(dict)
+    for name, value in parameters.items():
+        if name == 'seed':
+            seed = value
+        elif '.' in name:
+            settings_class_name, variable = name.split('.', 1)
+            advanced_settings[settings_class_name][variable] = value
+        else:
+            config_params[name] = value
+    return seed, config_params, dict(advanced_settings)
+
+
+def run_sweep_point(setup_module_name, config_params, const_settings, parameters):
+    """
+    Runs one simulation of a sweep and returns its result report.
+
+    Worker processes are reused for several simulations, and ConstSettings are global to the
+    process. Therefore the settings of the process that started the sweep are restored before
+    the settings of this point are applied, so that no run sees the settings of a previous one.
+    """
+    update_advanced_settings(const_settings)
+    seed, point_config_params, advanced_settings = _split_parameters(parameters)
+    update_advanced_settings(advanced_settings)
+    simulation_config = SimulationConfig(**{**config_params, **point_config_params})
+    simulation = Simulation(
+        setup_module_name=setup_module_name,
+        simulation_config=simulation_config,
+        seed=seed,
+        redis_job_id=None
+    )
+    simulation.run_batch()
+    return simulation.endpoint_buffer.generate_result_report()
+
+
+def run_sweep(setup_module_name, config_params, grid, max_workers=None):
+    """
+    Runs a simulation of setup_module_name for every point of the parameter grid, in
+    max_workers processes (default: one per CPU).
+
+    config_params are the SimulationConfig arguments shared by all points.
+    Returns a list of (parameters, result report) tuples in the order of the grid. The report of
+    a failed simulation is None.
+    """
+    const_settings = constsettings_to_dict()
+    points = parameter_grid(grid)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(run_sweep_point, setup_module_name, config_params,
+                            const_settings, parameters)
+            for parameters in points
+        ]
+        results = []
+        for parameters, future in zip(points, futures):
+            try:
+                report = future.result()
+            except Exception:
+                log.exception("Simulation with parameters %s failed", parameters)
+                report = None
+            results.append((parameters, report))
+    # The sweep has to leave the settings of this process untouched
+    update_advanced_settings(const_settings)
+    return results
+
+
+def _result_row(parameters, report):
+    row = dict(parameters)
+    if report is None:
+        row['status'] = 'failed'
+        return row
+    row['status'] = report['status']
+    for area_slug, summary in report['tree_summary'].items():
+        for field in TREE_SUMMARY_FIELDS:
+            row["{} {}".format(area_slug, field)] = summary[field]
+    return row
+
+
+def export_sweep_results(results, directory):
+    """
+    Writes the combined results table of a sweep (one row per simulation) to results.csv and
+    the full result reports to results.json in directory.
+    """
+    mkdir_from_str(directory)
+    rows = [_result_row(parameters, report) for parameters, report in results]
+    fieldnames = []
+    for row in rows:
+        fieldnames.extend(name for name in row.keys() if name not in fieldnames)
+    with open(os.path.join(directory, "results.csv"), 'w') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(os.path.join(directory, "results.json"), 'w') as json_file:
+        json.dump([{"parameters": parameters, "results": report}
+                   for parameters, report in results], json_file, default=str)
@@ -263,13 +263,7 @@ def generate_market_slot_list(area):
     """
     Returns a list of all slot times
     """
-    market_slots = []
-    for slot_time in [
-        area.now + (area.config.slot_length * i) for i in range(
-            (area.config.duration + (area.config.market_count * area.config.slot_length)) //
-            area.config.slot_length)]:
-        market_slots.append(slot_time)
-    return market_slots
+    return list(area.config.slot_calendar(area.now).time_slots)
 
 
 def constsettings_to_dict():
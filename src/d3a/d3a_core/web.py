@@ -27,13 +27,19 @@ from werkzeug.wsgi import DispatcherMiddleware
 
 from d3a.constants import VERSION
 from d3a.d3a_core.simulation import Simulation, page_lock
+from d3a.d3a_core.sim_results.rest_snapshot import RestSnapshots
 
 from d3a.d3a_core.sim_results.rest_endpoints import area_endpoint_stats, market_endpoint_stats, \
     markets_endpoints_stats, market_results_endpoint_stats, bills_endpoint_stats, simulation_info,\
-    url_for
+    url_for, etag_response, market_etag, snapshot_etag
 
 
 def start_web(interface, port, simulation: Simulation):
+    # Reads are served from the snapshot published at the end of each slot, so that they
+    # neither wait for nor hold up the ticks of the simulation
+    with page_lock:
+        simulation.rest_snapshots = RestSnapshots()
+        simulation.rest_snapshots.publish(simulation.area, simulation.endpoint_buffer)
     app = DispatcherMiddleware(
         _html_app(simulation.area), {
             '/api': _api_app(simulation)
@@ -83,8 +89,17 @@ def _api_app(simulation: Simulation):
         except KeyError:
             abort(404)
 
+    def _get_area_snapshot(snapshot, area_slug):
+        area_snapshot = snapshot.area(area_slug)
+        if area_snapshot is None:
+            abort(404)
+        return area_snapshot
+
+    def _snapshot_view(name):
+        snapshot = simulation.rest_snapshots.current
+        return etag_response(snapshot_etag(snapshot), lambda: snapshot.views[name])
+
     @app.route("/")
-    @lock_flask_endpoint
     def index():
         return {
             'simulation': simulation_info(simulation),
@@ -144,10 +159,14 @@ def _api_app(simulation: Simulation):
         return {'slowdown': simulation.slowdown, 'changed': changed}
 
     @app.route("/<area_slug>")
-    @lock_flask_endpoint
     def area(area_slug):
-        area = _get_area(area_slug)
-        return area_endpoint_stats(area)
+        snapshot = simulation.rest_snapshots.current
+        area_snapshot = _get_area_snapshot(snapshot, area_slug)
+        # The triggers of the area are read live
+        triggers = tuple((trigger.name, trigger.state)
+                         for trigger in area_snapshot.area.available_triggers.values())
+        return etag_response((snapshot_etag(snapshot), area_snapshot.area.active, triggers),
+                             lambda: area_endpoint_stats(area_snapshot))
 
     @app.route("/<area_slug>/trigger/<trigger_name>", methods=['POST'])
     @lock_flask_endpoint
@@ -170,56 +189,67 @@ def _api_app(simulation: Simulation):
             )
 
     @app.route("/<area_slug>/market/<market_time>")
-    @lock_flask_endpoint
     def market(area_slug, market_time):
-        area = _get_area(area_slug)
-        return market_endpoint_stats(area, market_time)
+        snapshot = simulation.rest_snapshots.current
+        area_snapshot = _get_area_snapshot(snapshot, area_slug)
+        try:
+            offset = int(request.args.get('offset', 0))
+            limit = int(request.args['limit']) if 'limit' in request.args else None
+        except ValueError:
+            return {'error': "'offset' and 'limit' parameters must be numeric"}, 400
+        if offset < 0 or (limit is not None and limit < 0):
+            return {'error': "'offset' and 'limit' must not be negative"}, 400
+        return etag_response(
+            market_etag(snapshot, area_snapshot, market_time),
+            lambda: market_endpoint_stats(area_snapshot, market_time, offset, limit)
+        )
 
     @app.route("/<area_slug>/markets")
-    @lock_flask_endpoint
     def markets(area_slug):
-        area = _get_area(area_slug)
-        return markets_endpoints_stats(area)
+        snapshot = simulation.rest_snapshots.current
+        area_snapshot = _get_area_snapshot(snapshot, area_slug)
+        return etag_response(snapshot_etag(snapshot),
+                             lambda: markets_endpoints_stats(area_snapshot))
 
     @app.route("/<area_slug>/results")
-    @lock_flask_endpoint
     def results(area_slug):
-        area = _get_area(area_slug)
-        market = area.current_market
-        return market_results_endpoint_stats(area, market)
+        snapshot = simulation.rest_snapshots.current
+        area_snapshot = _get_area_snapshot(snapshot, area_slug)
+        return etag_response(snapshot_etag(snapshot),
+                             lambda: market_results_endpoint_stats(area_snapshot))
 
     @app.route("/unmatched-loads", methods=['GET'])
-    @lock_flask_endpoint
     def unmatched_loads():
-        return simulation.endpoint_buffer.unmatched_loads
+        return _snapshot_view('unmatched_loads')
 
     @app.route("/cumulative-load-price", methods=['GET'])
-    @lock_flask_endpoint
     def cumulative_load():
-        return simulation.endpoint_buffer.cumulative_loads
+        return _snapshot_view('cumulative_loads')
 
     @app.route("/price-energy-day", methods=['GET'])
-    @lock_flask_endpoint
     def price_energy_day():
-        return simulation.endpoint_buffer.price_energy_day
+        return _snapshot_view('price_energy_day')
 
     @app.route("/cumulative-grid-trades", methods=['GET'])
-    @lock_flask_endpoint
     def cumulative_grid_trades():
-        return simulation.endpoint_buffer.cumulative_grid_trades
+        return _snapshot_view('cumulative_grid_trades')
 
     @app.route("/cumulative-grid-balancing-trades", methods=['GET'])
-    @lock_flask_endpoint
     def cumulative_grid_balancing_trades():
-        return simulation.endpoint_buffer.cumulative_grid_balancing_trades
+        return _snapshot_view('cumulative_grid_balancing_trades')
 
     @app.route("/<area_slug>/tree-summary")
     def tree_summary(area_slug):
-        return simulation.endpoint_buffer.tree_summary[area_slug]
+        snapshot = simulation.rest_snapshots.current
+        if area_slug not in snapshot.tree_summary:
+            abort(404)
+        return etag_response(snapshot_etag(snapshot),
+                             lambda: snapshot.tree_summary[area_slug])
 
     @app.route("/<area_slug>/<energy_bills>")
     def bills(area_slug, energy_bills):
-        area = _get_area(area_slug)
+        snapshot = simulation.rest_snapshots.current
+        area = _get_area_snapshot(snapshot, area_slug).area
 
         def slot_query_param(name):
             if name in request.args:
@@ -235,9 +265,15 @@ def _api_app(simulation: Simulation):
         to_slot = slot_query_param('to')
 
         if energy_bills == "bills":
-            return bills_endpoint_stats(area, "past_markets", from_slot, to_slot)
+            past_market_types = "past_markets"
         elif energy_bills == "balancing_energy_bills":
-            return bills_endpoint_stats(area, "past_balancing_markets", from_slot, to_slot)
+            past_market_types = "past_balancing_markets"
+        else:
+            abort(404)
+        return etag_response(
+            snapshot_etag(snapshot),
+            lambda: bills_endpoint_stats(snapshot, area, past_market_types, from_slot, to_slot)
+        )
 
     @app.after_request
     def modify_server_header(response):
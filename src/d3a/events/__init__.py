@@ -15,8 +15,27 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
+from random import shuffle
 from typing import Union, List  # noqa
 from d3a.events.event_structures import MarketEvent, AreaEvent
+from d3a.models.const import ConstSettings
+
+
+def fair_delivery_order(listeners, delivery_count):
+    """
+    Order in which `listeners` receive an event, to ensure fairness.
+
+    `delivery_count` is the number of events the listeners received before, the rotating
+    order starts with a different listener for every event.
+    """
+    if len(listeners) < 2:
+        return list(listeners)
+    listeners = list(listeners)
+    if ConstSettings.GeneralSettings.EVENT_DELIVERY_ORDER == 2:
+        first = delivery_count % len(listeners)
+        return listeners[first:] + listeners[:first]
+    shuffle(listeners)
+    return listeners
 
 
 class EventMixin:
@@ -52,9 +52,4 @@ class InterAreaAppliance(SimpleAppliance):
         )
 
     def slot_energy(self, market):
-        energy = sum(
-            t.offer.energy * (1 if t.seller == self.own_name else -1)
-            for t in market.trades
-            if self.own_name in (t.buyer, t.seller)
-        )
-        return energy
+        return market.sold_energy(self.own_name) - market.bought_energy(self.own_name)
@@ -34,9 +34,11 @@ class SimpleAppliance(BaseAppliance):
             # No current market yet
             return
         # Fetch traded energy for `market`
+        # Only the current market is cached, older ones are not reported any more
         energy = self._market_energy.get(market)
         if energy is None:
-            energy = self._market_energy[market] = self.owner.strategy.energy_balance(market)
+            energy = self.owner.strategy.energy_balance(market)
+            self._market_energy = {market: energy}
         self.report_energy(energy / self.area.config.ticks_per_slot)
 
     def report_energy(self, energy):
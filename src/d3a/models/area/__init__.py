@@ -25,7 +25,6 @@ from pendulum import DateTime
 from slugify import slugify
 
 from d3a.blockchain import BlockChainInterface
-from d3a.constants import TIME_ZONE
 from d3a.d3a_core.exceptions import AreaException
 from d3a.models.appliance.base import BaseAppliance
 from d3a.models.config import SimulationConfig
@@ -38,6 +37,7 @@ from d3a.constants import TIME_FORMAT
 from d3a.models.area.stats import AreaStats
 from d3a.models.area.event_dispatcher import AreaDispatcher
 from d3a.models.area.markets import AreaMarkets
+from d3a.models.area.context import AreaContext, SimulationClock
 
 log = getLogger(__name__)
 
@@ -77,6 +77,9 @@ class Area:
         self.strategy = strategy
         self.appliance = appliance
         self._config = config
+        self._context = None  # type: AreaContext
+        self._now_tick = None
+        self._now = None
 
         self.budget_keeper = budget_keeper
         if budget_keeper:
@@ -89,6 +92,7 @@ class Area:
     def activate(self, bc=None):
         if bc:
             self._bc = bc
+        self._resolve_context()
         for attr, kind in [(self.strategy, 'Strategy'), (self.appliance, 'Appliance')]:
             if attr:
                 if self.parent:
@@ -140,7 +144,13 @@ class Area:
             ((time_in_hour // self.config.slot_length) * self.config.slot_length)
 
         self.log.info("Cycling markets")
-        self._markets.rotate_markets(now, self.stats, self.dispatcher)
+        archived_markets = self._markets.rotate_markets(
+            now, self.stats, self.dispatcher, self.config.live_past_market_count
+        )
+        for market in archived_markets:
+            for child in self.children:
+                if child.strategy is not None:
+                    child.strategy.forget_market(market)
 
         # Clear `current_market` cache
         self.__dict__.pop('current_market', None)
@@ -183,22 +193,46 @@ class Area:
     def current_tick_in_slot(self):
         return self.current_tick % self.config.ticks_per_slot
 
+    def _resolve_context(self):
+        # Areas are activated from the root down, the parent's context is already resolved
+        self._context = None
+        config = self.config
+        clock = self.parent.clock if self.parent is not None else None
+        if clock is None or clock.tick_length != config.tick_length:
+            clock = SimulationClock(config.tick_length,
+                                    clock.start_date if clock is not None else None)
+        self._context = AreaContext(config=config, bc=self.bc, clock=clock)
+        self._now_tick = None
+
     @property
     def config(self):
+        if self._context is not None:
+            return self._context.config
         if self._config:
             return self._config
         if self.parent:
             return self.parent.config
         return DEFAULT_CONFIG
 
+    @config.setter
+    def config(self, config):
+        self._config = config
+        self._context = None
+
     @property
     def bc(self) -> Optional[BlockChainInterface]:
+        if self._context is not None:
+            return self._context.bc
         if self._bc is not None:
             return self._bc
         if self.parent:
             return self.parent.bc
         return None
 
+    @property
+    def clock(self) -> Optional[SimulationClock]:
+        return self._context.clock if self._context is not None else None
+
     @cached_property
     def child_by_slug(self):
         slug_map = {}
@@ -223,11 +257,15 @@ class Area:
         Can be overridden in subclasses to change the meaning of 'now'.
 
         In this default implementation 'current time' is defined by the number of ticks that
-        have passed.
+        have passed since the start of the simulation clock. Until the area is activated, the
+        clock starts at midnight of the current day.
         """
-        return DateTime.now(tz=TIME_ZONE).start_of('day').add(
-            seconds=self.config.tick_length.seconds * self.current_tick
-        )
+        if self._context is None:
+            return SimulationClock(self.config.tick_length).time_at(self.current_tick)
+        if self._now_tick != self.current_tick:
+            self._now = self._context.clock.time_at(self.current_tick)
+            self._now_tick = self.current_tick
+        return self._now
 
     @property
     def all_markets(self):
@@ -254,6 +292,14 @@ class Area:
     def past_balancing_markets(self):
         return list(self._markets.past_balancing_markets.values())
 
+    @property
+    def trade_log(self):
+        return self._markets.trade_log
+
+    @property
+    def balancing_trade_log(self):
+        return self._markets.balancing_trade_log
+
     @property
     def market_with_most_expensive_offer(self):
         # In case of a tie, max returns the first market occurrence in order to
@@ -0,0 +1,53 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from collections import namedtuple
+
+from pendulum import DateTime
+
+from d3a.constants import TIME_ZONE
+
+
+# Configuration, blockchain and clock of an area, resolved once when the area is activated
+AreaContext = namedtuple('AreaContext', ('config', 'bc', 'clock'))
+
+
+class SimulationClock:
+    """
+    Current time of a simulation, shared by its areas.
+
+    The simulation starts at midnight of the day on which the clock is created, so a run does
+    not jump to the next day when it crosses midnight. As all areas tick in lockstep, the time
+    of a tick is only computed once.
+    """
+    def __init__(self, tick_length, start_date=None):
+        self.start_date = start_date if start_date is not None \
+            else DateTime.now(tz=TIME_ZONE).start_of('day')
+        self.tick_length = tick_length
+        # tick -> time, for the few most recent ticks. The areas of a tree are at two
+        # different ticks while a tick is broadcast, as each one counts its ticks itself.
+        self._times = {}
+
+    def time_at(self, tick):
+        time = self._times.get(tick)
+        if time is None:
+            if len(self._times) >= 4:
+                self._times.clear()
+            time = self._times[tick] = self.start_date.add(
+                seconds=self.tick_length.seconds * tick
+            )
+        return time
@@ -15,9 +15,9 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
-from random import random
 from typing import Union
 from collections import defaultdict
+from d3a.events import fair_delivery_order
 from d3a.events.event_structures import MarketEvent, AreaEvent
 from d3a.models.strategy.area_agents.one_sided_agent import OneSidedAgent
 from d3a.models.strategy.area_agents.two_sided_pay_as_bid_agent import TwoSidedPayAsBidAgent
@@ -35,6 +35,7 @@ class AreaDispatcher:
         self._balancing_agents = \
             defaultdict(list)  # type: Dict[DateTime, List[BalancingAgent]]
         self.area = area
+        self._broadcast_count = 0
 
     @property
     def interarea_agents(self):
@@ -61,28 +62,28 @@ class AreaDispatcher:
         return self._broadcast_notification
 
     def _broadcast_notification(self, event_type: Union[MarketEvent, AreaEvent], **kwargs):
-        # Broadcast to children in random order to ensure fairness
-        for child in sorted(self.area.children, key=lambda _: random()):
+        self._broadcast_count += 1
+        broadcast_count = self._broadcast_count
+        # Broadcast to children in a fair order
+        for child in fair_delivery_order(self.area.children, broadcast_count):
             child.dispatcher.event_listener(event_type, **kwargs)
-        # Also broadcast to IAAs. Again in random order
-        for time_slot, agents in self._inter_area_agents.items():
-            if time_slot not in self.area._markets.markets:
-                # exclude past IAAs
-                continue
-
-            for agent in sorted(agents, key=lambda _: random()):
-                agent.event_listener(event_type, **kwargs)
-        # Also broadcast to BAs. Again in random order
-        for time_slot, agents in self._balancing_agents.items():
-            if time_slot not in self.area._markets.balancing_markets:
-                # exclude past BAs
-                continue
-
-            for agent in sorted(agents, key=lambda _: random()):
+        # Also broadcast to IAAs and BAs, again in a fair order. Agents of past markets are
+        # pruned on market rotation, idle agents are skipped on ticks.
+        for agents in (self._inter_area_agents, self._balancing_agents):
+            for agent in self._agents_in_delivery_order(agents, event_type, broadcast_count):
                 agent.event_listener(event_type, **kwargs)
         for listener in self.listeners:
             listener.event_listener(event_type, **kwargs)
 
+    @staticmethod
+    def _agents_in_delivery_order(agents_per_time_slot, event_type, broadcast_count):
+        agents = []
+        for time_slot_agents in agents_per_time_slot.values():
+            agents.extend(time_slot_agents)
+        if event_type is AreaEvent.TICK:
+            agents = [agent for agent in agents if not agent.idle]
+        return fair_delivery_order(agents, broadcast_count)
+
     def add_listener(self, listener):
         self.listeners.append(listener)
 
@@ -23,6 +23,9 @@ from d3a.models.market.two_sided_pay_as_clear import TwoSidedPayAsClear
 from d3a.models.market.one_sided import OneSidedMarket
 from d3a.models.market.balancing import BalancingMarket
 from d3a.models.market import Market # noqa
+from d3a.models.market.market_structures import BalancingOffer, BalancingTrade
+from d3a.models.market.market_summary import MarketSummary
+from d3a.models.market.trade_log import TradeLog
 from d3a.models.const import ConstSettings
 from collections import OrderedDict
 
@@ -36,38 +39,63 @@ class AreaMarkets:
         # Past markets
         self.past_markets = OrderedDict()  # type: Dict[DateTime, Market]
         self.past_balancing_markets = OrderedDict()  # type: Dict[DateTime, BalancingMarket]
+        # Trades of all markets, in columns
+        self.trade_log = TradeLog()
+        self.balancing_trade_log = TradeLog(BalancingTrade, BalancingOffer)
 
     @property
     def all_spot_markets(self):
         return list(self.markets.values()) + list(self.past_markets.values())
 
-    def rotate_markets(self, current_time, stats, dispatcher):
-        # Move old and current markets & balancing_markets to
-        # `past_markets` & past_balancing_markets. We use `list()` here to get a copy since we
-        # modify the market list in-place
-        self._market_rotation(current_time=current_time, markets=self.markets,
-                              past_markets=self.past_markets,
-                              area_agent=dispatcher.interarea_agents)
+    def rotate_markets(self, current_time, stats, dispatcher, live_past_market_count=None):
+        """
+        Move old and current markets & balancing_markets to `past_markets` &
+        `past_balancing_markets`. If `live_past_market_count` is set, only that many of the
+        most recent past markets are kept as they are, older ones are replaced by their
+        `MarketSummary`. Returns the markets that were replaced.
+        """
+        archived = self._market_rotation(current_time=current_time, markets=self.markets,
+                                         past_markets=self.past_markets,
+                                         area_agent=dispatcher.interarea_agents,
+                                         live_past_market_count=live_past_market_count)
         if self.balancing_markets is not None:
-            self._market_rotation(current_time=current_time, markets=self.balancing_markets,
-                                  past_markets=self.past_balancing_markets,
-                                  area_agent=dispatcher.balancing_agents)
+            archived += self._market_rotation(current_time=current_time,
+                                              markets=self.balancing_markets,
+                                              past_markets=self.past_balancing_markets,
+                                              area_agent=dispatcher.balancing_agents,
+                                              live_past_market_count=live_past_market_count)
         stats.update_accumulated()
+        return archived
 
-    def _market_rotation(self, current_time, markets, past_markets, area_agent):
-        first = True
+    def _market_rotation(self, current_time, markets, past_markets, area_agent,
+                         live_past_market_count):
+        # We use `list()` here to get a copy since we modify the market list in-place
         for timeframe in list(markets.keys()):
             if timeframe < current_time:
                 market = markets.pop(timeframe)
                 market.readonly = True
                 past_markets[timeframe] = market
-                if not first:
-                    # Remove inter area agent
-                    area_agent.pop(market, None)
-                else:
-                    first = False
+                # Remove inter area agent, agents of past markets do not receive events
+                area_agent.pop(timeframe, None)
                 self.log.debug("Moving {t:%H:%M} {m} to past"
                                .format(t=timeframe, m=past_markets[timeframe].area.name))
+        if live_past_market_count is None:
+            return []
+        return self._archive_past_markets(past_markets, live_past_market_count)
+
+    def _archive_past_markets(self, past_markets, live_past_market_count):
+        archived = []
+        # Past markets are ordered by time slot and the live ones are the last ones. Walk back
+        # from the newest market that is not live any more, until reaching the archived ones
+        timeframes = list(past_markets.keys())[:-live_past_market_count]
+        for timeframe in reversed(timeframes):
+            market = past_markets[timeframe]
+            if isinstance(market, MarketSummary):
+                break
+            past_markets[timeframe] = MarketSummary.from_market(market)
+            archived.append(market)
+            self.log.debug("Archiving {t:%H:%M} {m}".format(t=timeframe, m=market.area.name))
+        return archived
 
     @staticmethod
     def select_market_class(is_spot_market):
@@ -83,6 +111,7 @@ class AreaMarkets:
 
     def create_future_markets(self, current_time, is_spot_market, area):
         markets = self.markets if is_spot_market else self.balancing_markets
+        trade_log = self.trade_log if is_spot_market else self.balancing_trade_log
         market_class = self.select_market_class(is_spot_market)
 
         changed = False
@@ -93,7 +122,8 @@ class AreaMarkets:
                 # Create markets for missing slots
                 market = market_class(
                     timeframe, area,
-                    notification_listener=area.dispatcher.broadcast_callback
+                    notification_listener=area.dispatcher.broadcast_callback,
+                    trade_log=trade_log
                 )
 
                 area.dispatcher.create_area_agents(is_spot_market, market)
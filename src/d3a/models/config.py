@@ -23,12 +23,13 @@ from d3a.d3a_core.util import format_interval
 from d3a.models.const import ConstSettings
 from d3a.models.read_user_profile import read_arbitrary_profile
 from d3a.models.read_user_profile import InputProfileTypes
+from d3a.models.slot_calendar import SlotCalendar
 
 
 class SimulationConfig:
     def __init__(self, duration: duration, slot_length: duration, tick_length: duration,
                  market_count: int, cloud_coverage: int, market_maker_rate, iaa_fee: int,
-                 pv_user_profile=None):
+                 pv_user_profile=None, live_past_market_count=None):
         self.duration = duration
         self.slot_length = slot_length
         self.tick_length = tick_length
@@ -58,10 +59,17 @@ class SimulationConfig:
                                         self.slot_length)
         self.read_market_maker_rate(market_maker_rate)
 
+        if live_past_market_count is not None and live_past_market_count < 1:
+            raise D3AException("Invalid live past market count ({}), at least the current "
+                               "market has to be kept.".format(live_past_market_count))
+        # Number of past markets that are kept in full, None keeps all of them
+        self.live_past_market_count = live_past_market_count
+
         if iaa_fee is None:
             self.iaa_fee = ConstSettings.IAASettings.FEE_PERCENTAGE
         else:
             self.iaa_fee = iaa_fee
+        self._slot_calendar = None  # type: SlotCalendar
 
     def __repr__(self):
         return (
@@ -74,23 +82,37 @@ class SimulationConfig:
             "cloud_coverage='{s.cloud_coverage}', "
             "pv_user_profile='{s.pv_user_profile}'. "
             "market_maker_rate='{s.market_maker_rate}', "
+            "live_past_market_count='{s.live_past_market_count}', "
             ")>"
         ).format(s=self)
 
     def as_dict(self):
         fields = {'duration', 'slot_length', 'tick_length', 'market_count', 'ticks_per_slot',
-                  'total_ticks', 'cloud_coverage'}
+                  'total_ticks', 'cloud_coverage', 'live_past_market_count'}
         return {
             k: format_interval(v) if isinstance(v, Duration) else v
             for k, v in self.__dict__.items()
             if k in fields
         }
 
+    def slot_calendar(self, start_date):
+        """
+        Calendar of the market slots of a simulation starting at start_date, shared by all
+        strategies of the simulation
+        """
+        slot_count = \
+            (self.duration + self.market_count * self.slot_length) // self.slot_length
+        calendar = self._slot_calendar
+        if calendar is None or calendar.start_date != start_date or \
+                calendar.slot_length != self.slot_length or len(calendar) != slot_count:
+            calendar = self._slot_calendar = \
+                SlotCalendar(start_date, self.slot_length, slot_count)
+        return calendar
+
     def read_market_maker_rate(self, market_maker_rate):
         """
         Reads market_maker_rate from arbitrary input types
         """
         market_maker_rate_parsed = ast.literal_eval(str(market_maker_rate))
         self.market_maker_rate = read_arbitrary_profile(InputProfileTypes.IDENTITY,
-                                                        market_maker_rate_parsed)
-        self.market_maker_rate = {k: float(v) for k, v in self.market_maker_rate.items()}
+                                                        market_maker_rate_parsed).map(float)
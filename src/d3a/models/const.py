@@ -31,6 +31,24 @@ class ConstSettings:
         # Number of times Market clearing rate has to be calculated per slot
         MARKET_CLEARING_FREQUENCY_PER_SLOT = 3
         ENERGY_RATE_DECREASE_PER_UPDATE = 1  # rate decrease in cents_per_update
+        # Order in which events are delivered to listeners, so that no listener is always first
+        # Default value 1 stands for a random order, shuffled for every event
+        # Option 2 stands for a rotating order, every listener is the first one in turn
+        EVENT_DELIVERY_ORDER = 1
+        # Format of the intermediate results that are published to Redis
+        # Default value 1 stands for the full result report in every message
+        # Option 2 stands for only the changes since the previous message, see
+        # d3a.d3a_core.redis_communication.ResultPublisher
+        REDIS_PUBLISH_MODE = 1
+        # Compress the published results with zlib
+        REDIS_PUBLISH_COMPRESSION = False
+        # Minimum time between two messages with intermediate results, in seconds of wall-clock
+        # time. Intermediate results are skipped until it has passed, the final results are
+        # always published.
+        REDIS_PUBLISH_MIN_INTERVAL = 0
+        # Number of serialised closed markets that the REST-API keeps in memory, the least
+        # recently requested ones are evicted first
+        REST_MARKET_CACHE_SIZE = 1024
 
     class StorageSettings:
         # Max battery capacity in kWh.
@@ -101,6 +119,10 @@ class ConstSettings:
         # Option 2 stands for double sided pay as bid market
         # Option 3 stands for double sided pay as clear market
         MARKET_TYPE = 1
+        # Clearing algorithm of the double sided pay as clear market
+        # Default value 1 stands for supply/demand curves on integer energy rates
+        # Option 2 stands for curves on the exact energy rates of the offers and bids (NumPy)
+        PAY_AS_CLEAR_ALGORITHM = 1
 
     class BlockchainSettings:
         # Blockchain URL, default is localhost.
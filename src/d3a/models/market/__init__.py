@@ -15,7 +15,6 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
-import random
 import uuid
 from collections import defaultdict
 from logging import getLogger
@@ -27,6 +26,10 @@ from terminaltables.other_tables import SingleTable
 
 from d3a.constants import TIME_ZONE, TIME_FORMAT
 from d3a.d3a_core.device_registry import DeviceRegistry
+from d3a.events import fair_delivery_order
+from d3a.models.market.market_structures import ActorTrades, index_trade
+from d3a.models.market.offer_book import OfferBook
+from d3a.models.market.trade_log import TradeLog  # noqa
 
 
 log = getLogger(__name__)
@@ -34,9 +37,12 @@ log = getLogger(__name__)
 
 OFFER_PRICE_THRESHOLD = 0.00001
 
+_NO_TRADES = ActorTrades()
+
 
 class Market:
-    def __init__(self, time_slot=None, area=None, notification_listener=None, readonly=False):
+    def __init__(self, time_slot=None, area=None, notification_listener=None, readonly=False,
+                 trade_log=None):
         self.area = area
         self.id = str(uuid.uuid4())
         self.time_slot = time_slot
@@ -48,9 +54,12 @@ class Market:
         self.offers = {}  # type: Dict[str, Offer]
         self.offer_history = []  # type: List[Offer]
         self.notification_listeners = []
+        self._notification_count = 0
         self.bids = {}  # type: Dict[str, Bid]
         self.bid_history = []  # type: List[Bid]
         self.trades = []  # type: List[Trade]
+        # actor -> trades in which the actor is either buyer or seller
+        self._trades_by_actor = defaultdict(ActorTrades)  # type: Dict[str, ActorTrades]
         # Store trades temporarily until bc event has fired
         self.ious = defaultdict(lambda: defaultdict(int))
         self.traded_energy = defaultdict(int)
@@ -63,9 +72,10 @@ class Market:
         self._avg_trade_price = None
         self.max_trade_price = 0
         self.min_offer_price = sys.maxsize
-        self._avg_offer_price = None
         self.max_offer_price = 0
-        self._sorted_offers = []
+        self._offer_book = OfferBook()
+        # Trade log of the area, shared by its markets
+        self.trade_log = trade_log  # type: TradeLog
         self.accumulated_trade_price = 0
         self.accumulated_trade_energy = 0
         if notification_listener:
@@ -76,9 +86,19 @@ class Market:
     def add_listener(self, listener):
         self.notification_listeners.append(listener)
 
+    def _add_offer(self, offer):
+        self.offers[offer.id] = offer
+        self._offer_book.add(offer)
+
+    def _pop_offer(self, offer_id):
+        self._offer_book.remove(offer_id)
+        return self.offers.pop(offer_id, None)
+
     def _notify_listeners(self, event, **kwargs):
-        # Deliver notifications in random order to ensure fairness
-        for listener in sorted(self.notification_listeners, key=lambda l: random.random()):
+        # Deliver notifications in a fair order
+        self._notification_count += 1
+        for listener in fair_delivery_order(self.notification_listeners,
+                                            self._notification_count):
             listener(event, market_id=self.id, **kwargs)
 
     def _update_stats_after_trade(self, trade, offer, buyer, already_tracked=False):
@@ -86,7 +106,7 @@ class Market:
         # TODO: For now event driven blockchain updates have been disabled in favor of a
         # sequential approach, but once event handling is enabled this needs to be handled
         if not already_tracked:
-            self.trades.append(trade)
+            self._record_trade(trade)
         self._update_accumulated_trade_price_energy(trade)
         self.traded_energy[offer.seller] += offer.energy
         self.traded_energy[buyer] -= offer.energy
@@ -95,22 +115,25 @@ class Market:
         # Recalculate offer min/max price since offer was removed
         self._update_min_max_avg_offer_prices()
 
+    def _record_trade(self, trade):
+        self.trades.append(trade)
+        index_trade(self._trades_by_actor, trade)
+        if self.trade_log is not None:
+            self.trade_log.append(self.time_slot, trade)
+
     def _update_accumulated_trade_price_energy(self, trade):
         self.accumulated_trade_price += trade.offer.price
         self.accumulated_trade_energy += trade.offer.energy
 
     def _update_min_max_avg_offer_prices(self):
-        self._avg_offer_price = None
-        offer_prices = [o.price / o.energy for o in self.offers.values()]
-        if offer_prices:
-            self.min_offer_price = round(min(offer_prices), 4)
-            self.max_offer_price = round(max(offer_prices), 4)
+        if self._offer_book:
+            self.min_offer_price = round(self._offer_book.min_rate, 4)
+            self.max_offer_price = round(self._offer_book.max_rate, 4)
 
     def _update_min_max_avg_trade_prices(self, price):
         self.max_trade_price = round(max(self.max_trade_price, price), 4)
         self.min_trade_price = round(min(self.min_trade_price, price), 4)
         self._avg_trade_price = None
-        self._avg_offer_price = None
 
     def __repr__(self):  # pragma: no cover
         return "<Market{} offers: {} (E: {} kWh V: {}) trades: {} (E: {} kWh, V: {})>".format(
@@ -125,11 +148,7 @@ class Market:
 
     @property
     def avg_offer_price(self):
-        if self._avg_offer_price is None:
-            price = sum(o.price for o in self.offers.values())
-            energy = sum(o.energy for o in self.offers.values())
-            self._avg_offer_price = round(price / energy, 4) if energy else 0
-        return self._avg_offer_price
+        return round(self._offer_book.avg_rate, 4)
 
     @property
     def avg_trade_price(self):
@@ -141,14 +160,11 @@ class Market:
 
     @property
     def sorted_offers(self):
-        return self._sorted_offers
+        return self._offer_book.sorted_offers
 
     @property
     def most_affordable_offers(self):
-        cheapest_offer = self.sorted_offers[0]
-        rate = cheapest_offer.price / cheapest_offer.energy
-        return [o for o in self.sorted_offers if
-                abs(o.price / o.energy - rate) < OFFER_PRICE_THRESHOLD]
+        return self._offer_book.most_affordable_offers(OFFER_PRICE_THRESHOLD)
 
     @property
     def _now(self):
@@ -205,14 +221,17 @@ class Market:
                 pass
         return "\n".join(out)
 
+    def trades_of(self, actor):
+        return self._trades_by_actor.get(actor, _NO_TRADES).trades
+
     def bought_energy(self, buyer):
-        return sum(trade.offer.energy for trade in self.trades if trade.buyer == buyer)
+        return self._trades_by_actor.get(buyer, _NO_TRADES).bought_energy
 
     def sold_energy(self, seller):
-        return sum(trade.offer.energy for trade in self.trades if trade.offer.seller == seller)
+        return self._trades_by_actor.get(seller, _NO_TRADES).sold_energy
 
     def total_spent(self, buyer):
-        return sum(trade.offer.price for trade in self.trades if trade.buyer == buyer)
+        return self._trades_by_actor.get(buyer, _NO_TRADES).spent
 
     def total_earned(self, seller):
-        return sum(trade.offer.price for trade in self.trades if trade.seller == seller)
+        return self._trades_by_actor.get(seller, _NO_TRADES).earned
@@ -32,7 +32,8 @@ log = getLogger(__name__)
 
 
 class BalancingMarket(OneSidedMarket):
-    def __init__(self, time_slot=None, area=None, notification_listener=None, readonly=False):
+    def __init__(self, time_slot=None, area=None, notification_listener=None, readonly=False,
+                 trade_log=None):
         self.unmatched_energy_upward = 0
         self.unmatched_energy_downward = 0
         self.accumulated_supply_balancing_trade_price = 0
@@ -40,7 +41,7 @@ class BalancingMarket(OneSidedMarket):
         self.accumulated_demand_balancing_trade_price = 0
         self.accumulated_demand_balancing_trade_energy = 0
 
-        super().__init__(time_slot, area, notification_listener, readonly)
+        super().__init__(time_slot, area, notification_listener, readonly, trade_log)
 
     def offer(self, price: float, energy: float, seller: str):
         assert False
@@ -55,9 +56,8 @@ class BalancingMarket(OneSidedMarket):
         if energy == 0:
             raise InvalidOffer()
         offer = BalancingOffer(str(uuid.uuid4()), price, energy, seller, self)
-        self.offers[offer.id] = offer
-        self._sorted_offers = \
-            sorted(self.offers.values(), key=lambda o: o.price / o.energy)
+        self._add_offer(offer)
+        self._update_min_max_avg_offer_prices()
         log.info(f"[BALANCING_OFFER][NEW][{self.time_slot_str}] {offer}")
         self._notify_listeners(MarketEvent.BALANCING_OFFER, offer=offer)
         return offer
@@ -70,9 +70,7 @@ class BalancingMarket(OneSidedMarket):
         if isinstance(offer_or_id, Offer):
             offer_or_id = offer_or_id.id
         residual_offer = None
-        offer = self.offers.pop(offer_or_id, None)
-        self._sorted_offers = sorted(self.offers.values(),
-                                     key=lambda o: o.price / o.energy)
+        offer = self._pop_offer(offer_or_id)
         if offer is None:
             raise OfferNotFoundException()
         if (offer.energy > 0 and energy < 0) or (offer.energy < 0 and energy > 0):
@@ -102,12 +100,10 @@ class BalancingMarket(OneSidedMarket):
                         offer.seller,
                         offer.market
                     )
-                    self.offers[residual_offer.id] = residual_offer
+                    self._add_offer(residual_offer)
                     log.info(f"[BALANCING_OFFER][CHANGED][{self.time_slot_str}] "
                              f"{original_offer} -> {residual_offer}")
                     offer = accepted_offer
-                    self._sorted_offers = sorted(self.offers.values(),
-                                                 key=lambda o: o.price / o.energy)
                     self._notify_listeners(
                         MarketEvent.BALANCING_OFFER_CHANGED,
                         existing_offer=original_offer,
@@ -122,14 +118,12 @@ class BalancingMarket(OneSidedMarket):
                     pass
         except Exception:
             # Exception happened - restore offer
-            self.offers[offer.id] = offer
-            self._sorted_offers = sorted(self.offers.values(),
-                                         key=lambda o: o.price / o.energy)
+            self._add_offer(offer)
             raise
         trade = BalancingTrade(id=str(uuid.uuid4()), time=time, offer=offer,
                                seller=offer.seller, buyer=buyer,
                                residual=residual_offer, price_drop=price_drop)
-        self.trades.append(trade)
+        self._record_trade(trade)
         self._update_accumulated_trade_price_energy(trade)
         log.warning(f"[BALANCING_TRADE][{self.time_slot_str}] {trade}")
         self.traded_energy[offer.seller] += offer.energy
@@ -147,8 +141,7 @@ class BalancingMarket(OneSidedMarket):
             raise MarketReadOnlyException()
         if isinstance(offer_or_id, Offer):
             offer_or_id = offer_or_id.id
-        offer = self.offers.pop(offer_or_id, None)
-        self._sorted_offers = sorted(self.offers.values(), key=lambda o: o.price / o.energy)
+        offer = self._pop_offer(offer_or_id)
         self._update_min_max_avg_offer_prices()
         if not offer:
             raise OfferNotFoundException()
@@ -15,10 +15,9 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
-import random
-
 from collections import defaultdict, namedtuple
 from typing import Dict, List, Set, Union  # noqa
+from d3a.events import fair_delivery_order
 from d3a.events.event_structures import OfferEvent
 
 
@@ -30,7 +29,9 @@ class Offer:
         self.energy = energy
         self.seller = seller
         self.market = market
-        self._listeners = defaultdict(set)  # type: Dict[OfferEvent, Set[callable]]
+        # Listeners are kept in the order they were added, to deliver events reproducibly
+        self._listeners = defaultdict(dict)  # type: Dict[OfferEvent, Dict[callable, None]]
+        self._listener_call_count = 0
 
     def __repr__(self):
         return "<Offer('{s.id!s:.6s}', '{s.energy} kWh@{s.price}', '{s.seller} {rate}'>"\
@@ -45,11 +46,12 @@ class Offer:
             for ev in event:
                 self.add_listener(ev, listener)
         else:
-            self._listeners[event].add(listener)
+            self._listeners[event][listener] = None
 
     def _call_listeners(self, event: OfferEvent, **kwargs):
-        # Call listeners in random order to ensure fairness
-        for listener in sorted(self._listeners[event], key=lambda l: random.random()):
+        # Call listeners in a fair order
+        self._listener_call_count += 1
+        for listener in fair_delivery_order(self._listeners[event], self._listener_call_count):
             listener(**kwargs, offer=self)
 
     # XXX: This might be unreliable - decide after testing
@@ -124,6 +126,31 @@ class Trade(namedtuple('Trade', ('id', 'time', 'offer', 'seller',
         return self[:2] + (rate, self.offer.energy) + self[3:5]
 
 
+class ActorTrades:
+    """
+    Trades of one actor in a market, aggregated as they happen.
+    """
+
+    def __init__(self):
+        self.trades = []  # type: List[Trade]
+        self.bought_energy = 0
+        self.sold_energy = 0
+        self.spent = 0
+        self.earned = 0
+
+
+def index_trade(trades_by_actor: Dict[str, ActorTrades], trade):
+    seller_trades = trades_by_actor[trade.seller]
+    seller_trades.trades.append(trade)
+    seller_trades.sold_energy += trade.offer.energy
+    seller_trades.earned += trade.offer.price
+    buyer_trades = trades_by_actor[trade.buyer]
+    if buyer_trades is not seller_trades:
+        buyer_trades.trades.append(trade)
+    buyer_trades.bought_energy += trade.offer.energy
+    buyer_trades.spent += trade.offer.price
+
+
 class BalancingOffer(Offer):
 
     def __repr__(self):
@@ -0,0 +1,121 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from collections import defaultdict, namedtuple
+
+from d3a.models.market.market_structures import Bid, Offer
+
+
+# Trade totals of an actor in a market
+ActorTotals = namedtuple('ActorTotals', ('bought_energy', 'sold_energy', 'spent', 'earned'))
+
+_NO_TRADES = ActorTotals(0, 0, 0, 0)
+
+
+def _detach(offer_or_bid):
+    """
+    Copy of an offer or bid without the reference to its market and its listeners
+    """
+    if isinstance(offer_or_bid, Bid):
+        return offer_or_bid._replace(market=None)
+    if isinstance(offer_or_bid, Offer):
+        return type(offer_or_bid)(offer_or_bid.real_id, offer_or_bid.price,
+                                  offer_or_bid.energy, offer_or_bid.seller)
+    return offer_or_bid
+
+
+class MarketSummary(namedtuple('MarketSummary', (
+        'id', 'time_slot', 'time_slot_str', 'trade_log', 'trade_rows', 'offers', 'bids',
+        'traded_energy', 'ious', 'actual_energy_agg',
+        'accumulated_trade_price', 'accumulated_trade_energy',
+        'min_trade_price', 'avg_trade_price', 'max_trade_price',
+        'min_offer_price', 'avg_offer_price', 'max_offer_price',
+        'avg_supply_balancing_trade_rate', 'avg_demand_balancing_trade_rate',
+        'totals_by_actor'))):
+    """
+    Read-only record of a past market, which replaces the market once it is older than
+    the live past markets of an area.
+
+    Its trades are only kept as the rows of the trade log of the area, and are rebuilt from
+    the log when they are read. It keeps the offers and bids that were left open, detached
+    from the market, plus the aggregates that are read from past markets. The offer and bid
+    histories and the actual energy reports per tick are dropped.
+    """
+    readonly = True
+
+    @classmethod
+    def from_market(cls, market):
+        return cls(
+            id=market.id,
+            time_slot=market.time_slot,
+            time_slot_str=market.time_slot_str,
+            trade_log=market.trade_log,
+            trade_rows=market.trade_log.rows_of_slot(market.time_slot),
+            offers={offer.id: _detach(offer) for offer in market.offers.values()},
+            bids={bid.id: _detach(bid) for bid in market.bids.values()},
+            traded_energy=defaultdict(int, market.traded_energy),
+            ious={buyer: dict(sellers) for buyer, sellers in market.ious.items()},
+            actual_energy_agg=dict(market.actual_energy_agg),
+            accumulated_trade_price=market.accumulated_trade_price,
+            accumulated_trade_energy=market.accumulated_trade_energy,
+            min_trade_price=market.min_trade_price,
+            avg_trade_price=market.avg_trade_price,
+            max_trade_price=market.max_trade_price,
+            min_offer_price=market.min_offer_price,
+            avg_offer_price=market.avg_offer_price,
+            max_offer_price=market.max_offer_price,
+            avg_supply_balancing_trade_rate=getattr(
+                market, 'avg_supply_balancing_trade_rate', None),
+            avg_demand_balancing_trade_rate=getattr(
+                market, 'avg_demand_balancing_trade_rate', None),
+            totals_by_actor={
+                actor: ActorTotals(trades.bought_energy, trades.sold_energy,
+                                   trades.spent, trades.earned)
+                for actor, trades in market._trades_by_actor.items()
+            }
+        )
+
+    def __repr__(self):  # pragma: no cover
+        return "<MarketSummary {} trades: {} (E: {} kWh, V: {})>".format(
+            self.time_slot_str,
+            len(self.trades),
+            self.accumulated_trade_energy,
+            self.accumulated_trade_price
+        )
+
+    @property
+    def trades(self):
+        return self.trade_log.trades(self.trade_rows)
+
+    @property
+    def actual_energy(self):
+        return {}
+
+    def trades_of(self, actor):
+        return self.trade_log.trades_of(self.trade_rows, actor)
+
+    def bought_energy(self, buyer):
+        return self.totals_by_actor.get(buyer, _NO_TRADES).bought_energy
+
+    def sold_energy(self, seller):
+        return self.totals_by_actor.get(seller, _NO_TRADES).sold_energy
+
+    def total_spent(self, buyer):
+        return self.totals_by_actor.get(buyer, _NO_TRADES).spent
+
+    def total_earned(self, seller):
+        return self.totals_by_actor.get(seller, _NO_TRADES).earned
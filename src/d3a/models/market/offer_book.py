@@ -0,0 +1,101 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from itertools import count
+from typing import Dict, List, Optional, Tuple  # noqa
+
+from sortedcontainers import SortedList
+
+from d3a.models.market.market_structures import Offer  # noqa
+
+
+class OfferBook:
+    """
+    Open offers of a market, ordered by energy rate.
+
+    Every offer is keyed by the rate, price and energy it had when it was added, so that it
+    can be removed in O(log n) even if its price was modified in place afterwards. Offers with
+    the same rate keep the order in which they were added. Running sums of price and energy
+    are kept alongside, so that the rate statistics never need to iterate over the offers.
+    """
+
+    def __init__(self):
+        # (rate, sequence number, offer, price, energy)
+        self._entries = SortedList()
+        # offer-id -> entry
+        self._entries_by_id = {}  # type: Dict[str, Tuple[float, int, Offer, float, float]]
+        self._sequence = count()
+        self._snapshot = None  # type: Optional[List[Offer]]
+        self._price_sum = 0
+        self._energy_sum = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, offer_id):
+        return offer_id in self._entries_by_id
+
+    def add(self, offer: Offer):
+        if offer.id in self._entries_by_id:
+            self.remove(offer.id)
+        entry = (offer.price / offer.energy, next(self._sequence), offer,
+                 offer.price, offer.energy)
+        self._entries_by_id[offer.id] = entry
+        self._entries.add(entry)
+        self._price_sum += offer.price
+        self._energy_sum += offer.energy
+        self._snapshot = None
+
+    def remove(self, offer_id: str) -> Optional[Offer]:
+        entry = self._entries_by_id.pop(offer_id, None)
+        if entry is None:
+            return None
+        self._entries.remove(entry)
+        if self._entries:
+            self._price_sum -= entry[3]
+            self._energy_sum -= entry[4]
+        else:
+            # Start over from exact zeros, to not carry rounding errors of the running sums
+            self._price_sum = 0
+            self._energy_sum = 0
+        self._snapshot = None
+        return entry[2]
+
+    @property
+    def min_rate(self) -> float:
+        return self._entries[0][0]
+
+    @property
+    def max_rate(self) -> float:
+        return self._entries[-1][0]
+
+    @property
+    def avg_rate(self) -> float:
+        return self._price_sum / self._energy_sum if self._energy_sum else 0
+
+    @property
+    def sorted_offers(self) -> List[Offer]:
+        # The list is rebuilt lazily after a mutation, without re-sorting. Callers can keep
+        # iterating over a list they already hold while the market is modified.
+        if self._snapshot is None:
+            self._snapshot = [entry[2] for entry in self._entries]
+        return self._snapshot
+
+    def most_affordable_offers(self, threshold: float) -> List[Offer]:
+        cheapest_rate = self._entries[0][0]
+        end = self._entries.bisect_left((cheapest_rate + threshold, ))
+        return [entry[2] for entry in self._entries.islice(0, end)]
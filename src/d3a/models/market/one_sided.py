@@ -32,9 +32,10 @@ log = getLogger(__name__)
 
 class OneSidedMarket(Market):
 
-    def __init__(self, time_slot=None, area=None, notification_listener=None, readonly=False):
+    def __init__(self, time_slot=None, area=None, notification_listener=None, readonly=False,
+                 trade_log=None):
         self.area = area
-        super().__init__(time_slot, area, notification_listener, readonly)
+        super().__init__(time_slot, area, notification_listener, readonly, trade_log)
         self.bc_interface = MarketBlockchainInterface(area)
 
     def __repr__(self):  # pragma: no cover
@@ -59,8 +60,7 @@ class OneSidedMarket(Market):
 
         offer_id = self.bc_interface.create_new_offer(energy, price, seller)
         offer = Offer(offer_id, price, energy, seller, self)
-        self.offers[offer.id] = offer
-        self._sorted_offers = sorted(self.offers.values(), key=lambda o: o.price / o.energy)
+        self._add_offer(offer)
         self.offer_history.append(offer)
         log.info(f"[OFFER][NEW][{self.time_slot_str}] {offer}")
         self._update_min_max_avg_offer_prices()
@@ -73,11 +73,10 @@ class OneSidedMarket(Market):
         if isinstance(offer_or_id, Offer):
             offer_or_id = offer_or_id.id
 
-        offer = self.offers.pop(offer_or_id, None)
+        offer = self._pop_offer(offer_or_id)
 
         self.bc_interface.cancel_offer(offer)
 
-        self._sorted_offers = sorted(self.offers.values(), key=lambda o: o.price / o.energy)
         self._update_min_max_avg_offer_prices()
         if not offer:
             raise OfferNotFoundException()
@@ -92,11 +91,9 @@ class OneSidedMarket(Market):
             raise MarketReadOnlyException()
         if isinstance(offer_or_id, Offer):
             offer_or_id = offer_or_id.id
-        offer = self.offers.pop(offer_or_id, None)
+        offer = self._pop_offer(offer_or_id)
         original_offer = offer
         residual_offer = None
-        self._sorted_offers = sorted(self.offers.values(),
-                                     key=lambda o: o.price / o.energy)
         if offer is None:
             raise OfferNotFoundException()
         try:
@@ -126,14 +123,12 @@ class OneSidedMarket(Market):
                         offer.seller,
                         offer.market
                     )
-                    self.offers[residual_offer.id] = residual_offer
+                    self._add_offer(residual_offer)
                     log.info(f"[OFFER][CHANGED][{self.time_slot_str}] "
                              f"{original_offer} -> {residual_offer}")
                     offer = accepted_offer
 
                     self.bc_interface.change_offer(offer, original_offer, residual_offer)
-                    self._sorted_offers = sorted(self.offers.values(),
-                                                 key=lambda o: o.price / o.energy)
                     self._notify_listeners(
                         MarketEvent.OFFER_CHANGED,
                         existing_offer=original_offer,
@@ -146,9 +141,7 @@ class OneSidedMarket(Market):
                     pass
         except Exception:
             # Exception happened - restore offer
-            self.offers[offer.id] = offer
-            self._sorted_offers = sorted(self.offers.values(),
-                                         key=lambda o: o.price / o.energy)
+            self._add_offer(offer)
             raise
 
         trade_id, residual_offer = \
@@ -0,0 +1,232 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from array import array
+from collections.abc import Sequence
+from typing import Dict, List  # noqa
+from uuid import UUID
+
+from pendulum import DateTime  # noqa
+from slugify import slugify
+
+from d3a.d3a_core.util import area_name_from_area_or_iaa_name
+from d3a.models.market.market_structures import Bid, Offer, Trade
+
+
+# Bits of the flags column
+RESIDUAL = 1
+PRICE_DROP = 2
+# The trade was made from a bid instead of an offer
+FROM_BID = 4
+
+_NO_ROWS = array('l')
+_UUID_SIZE = 16
+
+
+class _Ids:
+    """
+    Column of the ids of the trades or offers of a trade log.
+
+    Ids are canonical uuid strings for all but blockchain markets, those are packed into 16
+    bytes. Any other id is kept as it is.
+    """
+
+    def __init__(self):
+        self._packed = bytearray()
+        self._unpacked = {}  # type: Dict[int, str]
+
+    def __len__(self):
+        return len(self._packed) // _UUID_SIZE
+
+    def append(self, id):
+        try:
+            packed = UUID(id).bytes
+        except (AttributeError, TypeError, ValueError):
+            packed = None
+        if packed is None or str(UUID(bytes=packed)) != id:
+            self._unpacked[len(self)] = id
+            packed = bytes(_UUID_SIZE)
+        self._packed += packed
+
+    def __getitem__(self, row):
+        id = self._unpacked.get(row)
+        if id is None:
+            start = row * _UUID_SIZE
+            id = str(UUID(bytes=bytes(self._packed[start:start + _UUID_SIZE])))
+        return id
+
+
+class TradeLog:
+    """
+    Append-only, columnar record of the trades in the markets of an area.
+
+    Every trade is a row of the column arrays. Time slots, trade times and actors are stored
+    as indices into `time_slots`, `times` and `actors`, the slug and the area name of each
+    actor are computed once when the actor is seen for the first time. Exporters and
+    statistics aggregate over the columns instead of walking the trade and offer objects of
+    every market, and archived markets keep the rows of their trades instead of the trades.
+    """
+
+    def __init__(self, trade_class=Trade, offer_class=Offer):
+        self.trade_class = trade_class
+        self.offer_class = offer_class
+        self.time_slots = []  # type: List[DateTime]
+        self._slot_indices = {}  # type: Dict[DateTime, int]
+        self.times = []  # type: List[DateTime]
+        self._time_indices = {}  # type: Dict[DateTime, int]
+        self.actors = []  # type: List[str]
+        self.actor_slugs = []  # type: List[str]
+        self.actor_area_names = []  # type: List[str]
+        self._actor_ids = {}  # type: Dict[str, int]
+        self.slot_index = array('i')
+        self.trade_ids = _Ids()
+        self.time_index = array('i')
+        self.offer_ids = _Ids()
+        # Seller of the offer the trade was made from. In two-sided markets that is the area
+        # of the bid for trades matched from bids, the bills account trades by it.
+        self.seller_id = array('i')
+        # Actual seller of the trade, as exported per device
+        self.trade_seller_id = array('i')
+        self.buyer_id = array('i')
+        self.energy = array('d')
+        self.price = array('d')
+        self.rate = array('d')
+        self.flags = array('B')
+        # slot index -> rows of the trades of that slot, in trade order
+        self._rows_of_slot = []  # type: List[array]
+
+    def __len__(self):
+        return len(self.energy)
+
+    def actor_id(self, actor):
+        actor_id = self._actor_ids.get(actor)
+        if actor_id is None:
+            actor_id = self._actor_ids[actor] = len(self.actors)
+            self.actors.append(actor)
+            self.actor_slugs.append(slugify(actor, to_lower=True))
+            self.actor_area_names.append(area_name_from_area_or_iaa_name(actor))
+        return actor_id
+
+    def _slot_index_of(self, time_slot):
+        slot_index = self._slot_indices.get(time_slot)
+        if slot_index is None:
+            slot_index = self._slot_indices[time_slot] = len(self.time_slots)
+            self.time_slots.append(time_slot)
+            self._rows_of_slot.append(array('l'))
+        return slot_index
+
+    def _time_index_of(self, time):
+        # Trades happen at ticks, many of them share their time
+        time_index = self._time_indices.get(time)
+        if time_index is None:
+            time_index = self._time_indices[time] = len(self.times)
+            self.times.append(time)
+        return time_index
+
+    def append(self, time_slot, trade):
+        slot_index = self._slot_index_of(time_slot)
+        energy = trade.offer.energy
+        price = trade.offer.price
+        self._rows_of_slot[slot_index].append(len(self.energy))
+        self.slot_index.append(slot_index)
+        self.trade_ids.append(trade.id)
+        self.time_index.append(self._time_index_of(trade.time))
+        self.offer_ids.append(trade.offer.id)
+        self.seller_id.append(self.actor_id(trade.offer.seller))
+        self.trade_seller_id.append(self.actor_id(trade.seller))
+        self.buyer_id.append(self.actor_id(trade.buyer))
+        self.energy.append(energy)
+        self.price.append(price)
+        self.rate.append(price / energy)
+        self.flags.append((RESIDUAL if trade.residual else 0) |
+                          (PRICE_DROP if trade.price_drop else 0) |
+                          (FROM_BID if isinstance(trade.offer, Bid) else 0))
+
+    def rows_of_slot(self, time_slot):
+        """
+        Rows of the trades of the market of time_slot, in the order they happened
+        """
+        slot_index = self._slot_indices.get(time_slot)
+        return self._rows_of_slot[slot_index] if slot_index is not None else _NO_ROWS
+
+    def rows_of_slots(self, time_slots):
+        """
+        Rows of the trades of the markets of time_slots, ordered like time_slots and then
+        by the order of the trades in each market
+        """
+        rows = []
+        for time_slot in time_slots:
+            rows.extend(self.rows_of_slot(time_slot))
+        return rows
+
+    def time(self, row):
+        return self.times[self.time_index[row]]
+
+    def trade(self, row):
+        """
+        Trade of row, rebuilt from the columns with an offer or bid that is detached from its
+        market. Residual offers are not logged, the residual of the trade only tells whether
+        there was one.
+        """
+        flags = self.flags[row]
+        seller = self.actors[self.seller_id[row]]
+        buyer = self.actors[self.buyer_id[row]]
+        if flags & FROM_BID:
+            offer = Bid(self.offer_ids[row], self.price[row], self.energy[row], buyer, seller)
+            residual = bool(flags & RESIDUAL)
+        else:
+            offer = self.offer_class(self.offer_ids[row], self.price[row], self.energy[row],
+                                     seller)
+            residual = True if flags & RESIDUAL else None
+        return self.trade_class(self.trade_ids[row], self.time(row), offer,
+                                self.actors[self.trade_seller_id[row]], buyer, residual,
+                                bool(flags & PRICE_DROP))
+
+    def trades_of(self, rows, actor):
+        """
+        Trades of rows that actor sold or bought
+        """
+        actor_id = self._actor_ids.get(actor)
+        return [self.trade(row) for row in rows
+                if actor_id == self.trade_seller_id[row] or actor_id == self.buyer_id[row]]
+
+    def trades(self, rows):
+        return LoggedTrades(self, rows)
+
+
+class LoggedTrades(Sequence):
+    """
+    Read-only sequence of the trades of rows of a trade log, each trade is rebuilt when it
+    is read
+    """
+
+    def __init__(self, trade_log, rows):
+        self.trade_log = trade_log
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return LoggedTrades(self.trade_log, self.rows[index])
+        return self.trade_log.trade(self.rows[index])
+
+    def __iter__(self):
+        trade = self.trade_log.trade
+        for row in self.rows:
+            yield trade(row)
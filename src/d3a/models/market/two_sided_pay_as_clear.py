@@ -24,8 +24,8 @@ log = getLogger(__name__)
 class TwoSidedPayAsClear(TwoSidedPayAsBid):
 
     def __init__(self, time_slot=None, area=None,
-                 notification_listener=None, readonly=False):
-        super().__init__(time_slot, area, notification_listener, readonly)
+                 notification_listener=None, readonly=False, trade_log=None):
+        super().__init__(time_slot, area, notification_listener, readonly, trade_log)
 
     def __repr__(self):  # pragma: no cover
         return "<TwoSidedPayAsClear{} offers: {} (E: {} kWh V: {}) trades: {} (E: {} kWh, V: {})>"\
@@ -18,12 +18,15 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import csv
 import os
 import ast
+from collections import OrderedDict
+from collections.abc import Mapping
 from enum import Enum
 from datetime import datetime
+import numpy as np
 from pendulum import duration
-from statistics import mean
-from typing import Dict
+from typing import Dict, Union  # noqa
 from itertools import product
+from operator import itemgetter
 from d3a.constants import TIME_FORMAT
 
 """
@@ -31,14 +34,78 @@ Exposes mixins that can be used from strategy classes.
 """
 
 
+WHOLE_DAY_SEC = 24 * 60 * 60
+
+# Number of profiles that are kept by the profile store
+PROFILE_STORE_SIZE = 256
+
+
 class InputProfileTypes(Enum):
     IDENTITY = 1
     POWER = 2
 
 
+# Every minute of the day in TIME_FORMAT, the keys of a rate profile
+TIME_OF_DAY_KEYS = tuple("{:02d}:{:02d}".format(hour, minute)
+                         for hour, minute in product(range(24), range(60)))
+_MINUTE_OF_DAY = {time_str: minute for minute, time_str in enumerate(TIME_OF_DAY_KEYS)}
+
+
 def default_profile_dict():
-    return dict((datetime(year=2000, month=1, day=1, hour=hour, minute=minute).
-                 strftime(TIME_FORMAT), 0) for hour, minute in product(range(24), range(60)))
+    return dict.fromkeys(TIME_OF_DAY_KEYS, 0)
+
+
+class TimeOfDayProfile(Mapping):
+    """
+    Read-only rate profile with a value for every minute of the day.
+
+    Keyed by the time of day in TIME_FORMAT like the profile dicts, the values are kept in a
+    tuple indexed by the minute of the day. Profiles of constant rates hold the same value
+    1440 times.
+    """
+    __slots__ = ('_values',)
+
+    def __init__(self, values):
+        self._values = tuple(values)
+        if len(self._values) != len(TIME_OF_DAY_KEYS):
+            raise ValueError("A time of day profile needs a value for every minute of the day, "
+                             "got {} values.".format(len(self._values)))
+
+    @classmethod
+    def from_dict(cls, rate_profile):
+        return cls(rate_profile[time_str] for time_str in TIME_OF_DAY_KEYS)
+
+    def __getitem__(self, time_str):
+        return self._values[_MINUTE_OF_DAY[time_str]]
+
+    def at_minute(self, minute_of_day):
+        return self._values[minute_of_day]
+
+    def __contains__(self, time_str):
+        return time_str in _MINUTE_OF_DAY
+
+    def __iter__(self):
+        return iter(TIME_OF_DAY_KEYS)
+
+    def __len__(self):
+        return len(TIME_OF_DAY_KEYS)
+
+    def __eq__(self, other):
+        if isinstance(other, TimeOfDayProfile):
+            return self._values == other._values
+        return super().__eq__(other)
+
+    def map(self, function):
+        """
+        Profile of function applied to every value of this profile
+        """
+        return TimeOfDayProfile(map(function, self._values))
+
+    def __reduce__(self):
+        return self.__class__, (self._values,)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
 
 
 def _readCSV(path: str) -> Dict[str, float]:
@@ -58,45 +125,47 @@ def _readCSV(path: str) -> Dict[str, float]:
     return profile_data
 
 
+def _power_profile_steps(profile_data_W: Dict[str, float]):
+    """
+    Times (in seconds of the day, ascending) at which the power of the profile changes and the
+    power from each of them on. Before the first time of the profile the power is 0.
+    """
+    steps = []
+    for time_str, power_W in profile_data_W.items():
+        hours, minutes = time_str.split(":")
+        steps.append((int(hours) * 3600 + int(minutes) * 60, float(power_W)))
+    steps.sort(key=itemgetter(0))
+    if not steps or steps[0][0] > 0:
+        steps.insert(0, (0, 0.0))
+    times_sec, power_W = zip(*steps)
+    return np.array(times_sec), np.array(power_W)
+
+
 def _calculate_energy_from_power_profile(profile_data_W: Dict[str, float],
                                          slot_length: duration) -> Dict[str, float]:
     """
-    Calculates energy from power profile. Does not use numpy, calculates avg power for each
-    market slot and based on that calculates energy.
+    Calculates energy from power profile. The power of the profile stays constant until its
+    next time, the average power of a market slot is calculated from the cumulative energy at
+    the slot boundaries. The average power of the last slot of the day is taken until midnight.
     :param profile_data_W: Power profile in W, in the same format as the result of _readCSV
     :param slot_length: slot length duration
     :return: a mapping from time to energy values in kWh
     """
+    times_sec, power_W = _power_profile_steps(profile_data_W)
+    # Energy from midnight until each time of the profile, in Ws
+    step_energy_Ws = np.concatenate(([0.0], np.cumsum(power_W[:-1] * np.diff(times_sec))))
+
+    slot_start_sec = np.arange(0, WHOLE_DAY_SEC, slot_length.seconds)
+    boundary_sec = np.append(slot_start_sec, WHOLE_DAY_SEC)
+    step = np.searchsorted(times_sec, boundary_sec, side='right') - 1
+    boundary_energy_Ws = \
+        step_energy_Ws[step] + power_W[step] * (boundary_sec - times_sec[step])
 
-    timestr_solar_array = list(profile_data_W.keys())
-    solar_power_input_W = list(profile_data_W.values())
-    # Ensures that the power values are going to be floats, not strings.
-    solar_power_input_W = [float(dp) for dp in solar_power_input_W]
-    time0 = datetime.utcfromtimestamp(0)
-    time_solar_array = [
-        (datetime.strptime(ti, TIME_FORMAT) - time0).seconds
-        for ti in timestr_solar_array
-    ]
-    whole_day_sec = 24 * 60 * 60
-    time_solar_array.append(whole_day_sec)
-    solar_power_array_W = [
-        solar_power_input_W[index - 1]
-        for index, seconds in enumerate(time_solar_array)
-        for _ in range(seconds - time_solar_array[index - 1])
-    ]
-    slot_time_list = [i for i in range(0, whole_day_sec, slot_length.seconds)]
-    avg_power_kW = [
-        mean(solar_power_array_W[
-                index * slot_length.seconds:index * slot_length.seconds + slot_length.seconds
-             ]) / 1000.0
-        for index, slot in enumerate(slot_time_list)
-    ]
-    slot_energy_kWh = list(map(lambda x: x / (duration(hours=1) / slot_length), avg_power_kW))
-
-    return {datetime.utcfromtimestamp(slot_time_list[ii]).strftime(TIME_FORMAT):
-            slot_energy_kWh[ii]
-            for ii in range(len(slot_energy_kWh))
-            }
+    avg_power_kW = np.diff(boundary_energy_Ws) / np.diff(boundary_sec) / 1000.0
+    slot_energy_kWh = avg_power_kW / (duration(hours=1) / slot_length)
+
+    return {"{:02d}:{:02d}".format(*divmod(slot_start // 60, 60)): energy_kWh
+            for slot_start, energy_kWh in zip(slot_start_sec.tolist(), slot_energy_kWh.tolist())}
 
 
 def read_profile_csv_to_dict(profile_type: InputProfileTypes,
@@ -129,19 +198,78 @@ def _fill_gaps_in_rate_profile(rate_profile_input: Dict) -> Dict:
     :return: continuous rate profile (dict)
     """
 
-    rate_profile = default_profile_dict()
+    rate_profile = {}
     current_rate = 0
-    for hour, minute in product(range(24), range(60)):
-        time_str = datetime(year=2000, month=1, day=1, hour=hour, minute=minute).\
-            strftime(TIME_FORMAT)
-
-        if time_str in rate_profile_input.keys():
+    for time_str in TIME_OF_DAY_KEYS:
+        if time_str in rate_profile_input:
             current_rate = rate_profile_input[time_str]
         rate_profile[time_str] = current_rate
 
     return rate_profile
 
 
+class ReadOnlyProfile(dict):
+    """
+    Profile that is shared by all devices that read the same input, it must not be changed.
+    """
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Profiles are shared between devices and read-only, "
+                        "change a copy of the profile instead.")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return self.__class__, (dict(self),)
+
+
+class ProfileStore:
+    """
+    Profiles read in this process, keyed by their input, profile type and slot length.
+
+    Every csv file or profile is read once and the devices reading it share the resulting
+    profile, a TimeOfDayProfile for rates and a ReadOnlyProfile of the slot energies for power.
+    A csv file is identified by its path, modification time and size, other inputs by their
+    representation. The `max_size` most recently read profiles are kept.
+    """
+    def __init__(self, max_size):
+        self._max_size = max_size
+        self._profiles = OrderedDict()  # type: Dict[tuple, Union[TimeOfDayProfile, dict]]
+
+    def read(self, profile_type, daily_profile, slot_length):
+        key = (
+            profile_type,
+            slot_length if profile_type == InputProfileTypes.POWER else None,
+            _profile_source(daily_profile)
+        )
+        profile = self._profiles.get(key)
+        if profile is None:
+            profile = _read_arbitrary_profile(profile_type, daily_profile, slot_length)
+            if profile_type == InputProfileTypes.IDENTITY:
+                profile = TimeOfDayProfile.from_dict(profile)
+            else:
+                profile = ReadOnlyProfile(profile)
+            self._profiles[key] = profile
+            if len(self._profiles) > self._max_size:
+                self._profiles.popitem(last=False)
+        else:
+            self._profiles.move_to_end(key)
+        return profile
+
+    def clear(self):
+        self._profiles.clear()
+
+
+def _profile_source(daily_profile):
+    if os.path.isfile(str(daily_profile)):
+        stat = os.stat(str(daily_profile))
+        return os.path.realpath(str(daily_profile)), stat.st_mtime_ns, stat.st_size
+    return type(daily_profile).__name__, repr(daily_profile)
+
+
+profile_store = ProfileStore(max_size=PROFILE_STORE_SIZE)
+
+
 def read_arbitrary_profile(profile_type: InputProfileTypes,
                            daily_profile,
                            slot_length=duration()) -> Dict[str, float]:
@@ -154,16 +282,21 @@ def read_arbitrary_profile(profile_type: InputProfileTypes,
     or a dict with arbitrary time data (Dict[str, float])
     or a string containing a serialized dict of the aforementioned structure
     :param slot_length: slot length duration
-    :return: a mapping from time to energy values in kWh
+    :return: a read-only mapping from time to energy values in kWh, shared with all readers
+    of the same profile
     """
+    return profile_store.read(profile_type, daily_profile, slot_length)
+
 
+def _read_arbitrary_profile(profile_type: InputProfileTypes, daily_profile,
+                            slot_length: duration) -> Dict[str, float]:
     if os.path.isfile(str(daily_profile)):
         return read_profile_csv_to_dict(
             profile_type,
             daily_profile,
             slot_length
         )
-    elif isinstance(daily_profile, dict) or isinstance(daily_profile, str):
+    elif isinstance(daily_profile, Mapping) or isinstance(daily_profile, str):
 
         if isinstance(daily_profile, str):
             # JSON
@@ -0,0 +1,150 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from array import array
+from collections import namedtuple
+from collections.abc import MutableMapping
+from itertools import compress
+
+from d3a.constants import TIME_FORMAT
+
+
+# `key` is the time of day of the slot in TIME_FORMAT, as used by the profiles, `day` the
+# number of full days since the start of the calendar
+Slot = namedtuple('Slot', ('index', 'time_slot', 'key', 'hour', 'day'))
+
+
+class SlotCalendar:
+    """
+    Market slots of a simulation, from its start up to the last slot a market is opened for.
+
+    Time slot, profile key, hour and day of every slot are computed once and are shared by all
+    strategies, a slot is addressed by its index.
+    """
+    def __init__(self, start_date, slot_length, slot_count):
+        self.start_date = start_date
+        self.slot_length = slot_length
+        self.slots = tuple(
+            Slot(index, time_slot, time_slot.strftime(TIME_FORMAT), time_slot.hour,
+                 (time_slot - start_date).days)
+            for index, time_slot in enumerate(start_date + slot_length * i
+                                              for i in range(slot_count))
+        )
+        self.time_slots = tuple(slot.time_slot for slot in self.slots)
+        self._indices = {slot.time_slot: slot.index for slot in self.slots}
+
+    def __len__(self):
+        return len(self.slots)
+
+    def index(self, time_slot):
+        """
+        Index of time_slot, None if it is not a slot of the calendar
+        """
+        return self._indices.get(time_slot)
+
+    def key(self, time_slot):
+        index = self._indices.get(time_slot)
+        if index is None:
+            return time_slot.strftime(TIME_FORMAT)
+        return self.slots[index].key
+
+    def day(self, time_slot):
+        index = self._indices.get(time_slot)
+        if index is None:
+            return (time_slot - self.start_date).days
+        return self.slots[index].day
+
+
+class SlotValues(MutableMapping):
+    """
+    Energy values of a device per market slot, keyed by time slot like a dict.
+
+    Once a calendar is set, the values of its slots are kept in an array addressed by the slot
+    index, values of other time slots in a dict. Missing time slots read as `default` without
+    being added, a KeyError is raised for them if there is no default.
+    """
+    def __init__(self, default=None):
+        self._default = default
+        self._calendar = None  # type: SlotCalendar
+        self._indices = {}
+        self._values = array('d')
+        self._is_set = bytearray()
+        self._count = 0
+        self._other = {}
+
+    def set_calendar(self, calendar):
+        items = list(self.items())
+        self._calendar = calendar
+        self._indices = calendar._indices
+        self._values = array('d', bytes(8 * len(calendar)))
+        self._is_set = bytearray(len(calendar))
+        self._count = 0
+        self._other = {}
+        for time_slot, value in items:
+            self[time_slot] = value
+
+    def __getitem__(self, time_slot):
+        index = self._indices.get(time_slot)
+        if index is not None:
+            if self._is_set[index]:
+                return self._values[index]
+        elif time_slot in self._other:
+            return self._other[time_slot]
+        if self._default is None:
+            raise KeyError(time_slot)
+        return self._default
+
+    def __setitem__(self, time_slot, value):
+        index = self._indices.get(time_slot)
+        if index is None:
+            self._other[time_slot] = value
+            return
+        self._values[index] = value
+        if not self._is_set[index]:
+            self._is_set[index] = 1
+            self._count += 1
+
+    def __delitem__(self, time_slot):
+        index = self._indices.get(time_slot)
+        if index is None:
+            del self._other[time_slot]
+            return
+        if not self._is_set[index]:
+            raise KeyError(time_slot)
+        self._is_set[index] = 0
+        self._values[index] = 0
+        self._count -= 1
+
+    def __contains__(self, time_slot):
+        index = self._indices.get(time_slot)
+        if index is None:
+            return time_slot in self._other
+        return self._is_set[index] == 1
+
+    def __iter__(self):
+        if self._calendar is not None:
+            yield from compress(self._calendar.time_slots, self._is_set)
+        yield from self._other
+
+    def __len__(self):
+        return self._count + len(self._other)
+
+    def get(self, time_slot, default=None):
+        return self[time_slot] if time_slot in self else default
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, dict(self.items()))
@@ -21,6 +21,7 @@ from pendulum import duration
 from math import isclose
 from d3a.models.const import ConstSettings
 from d3a import limit_float_precision
+from d3a.models.slot_calendar import SlotValues
 
 StorageSettings = ConstSettings.StorageSettings
 
@@ -41,12 +42,18 @@ StorageSettings = ConstSettings.StorageSettings
 
 class PVState:
     def __init__(self):
-        self.available_energy_kWh = defaultdict(lambda: 0)  # type: Dict[DateTime, float]
+        self.available_energy_kWh = SlotValues(default=0)  # type: Dict[DateTime, float]
+
+    def set_slot_calendar(self, calendar):
+        self.available_energy_kWh.set_calendar(calendar)
 
 
 class LoadState:
     def __init__(self):
-        self.desired_energy_Wh = defaultdict(lambda: 0)  # type: Dict[DateTime, float]
+        self.desired_energy_Wh = SlotValues(default=0)  # type: Dict[DateTime, float]
+
+    def set_slot_calendar(self, calendar):
+        self.desired_energy_Wh.set_calendar(calendar)
 
 
 class FridgeState:
@@ -97,13 +104,13 @@ class StorageState:
         self.max_abs_battery_power_kW = max_abs_battery_power_kW
 
         # storage capacity, that is already sold:
-        self.pledged_sell_kWh = defaultdict(lambda: 0)  # type: Dict[DateTime, float]
+        self.pledged_sell_kWh = SlotValues(default=0)  # type: Dict[DateTime, float]
         # storage capacity, that has been offered (but not traded yet):
-        self.offered_sell_kWh = defaultdict(lambda: 0)  # type: Dict[DateTime, float]
+        self.offered_sell_kWh = SlotValues(default=0)  # type: Dict[DateTime, float]
         # energy, that has been bought:
-        self.pledged_buy_kWh = defaultdict(lambda: 0)  # type: Dict[DateTime, float]
+        self.pledged_buy_kWh = SlotValues(default=0)  # type: Dict[DateTime, float]
         # energy, that the storage wants to buy (but not traded yet):
-        self.offered_buy_kWh = defaultdict(lambda: 0)  # type: Dict[DateTime, float]
+        self.offered_buy_kWh = SlotValues(default=0)  # type: Dict[DateTime, float]
 
         self.charge_history = defaultdict(lambda: '-')  # type: Dict[DateTime, float]
         self.charge_history_kWh = defaultdict(lambda: '-')  # type: Dict[DateTime, float]
@@ -114,6 +121,11 @@ class StorageState:
         self._used_storage = initial_capacity_kWh
         self._battery_energy_per_slot = 0.0
 
+    def set_slot_calendar(self, calendar):
+        for slot_values in (self.pledged_sell_kWh, self.offered_sell_kWh,
+                            self.pledged_buy_kWh, self.offered_buy_kWh):
+            slot_values.set_calendar(calendar)
+
     @property
     def used_storage(self):
         """
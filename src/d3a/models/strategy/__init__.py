@@ -45,10 +45,7 @@ class _TradeLookerUpper:
         self.owner_name = owner_name
 
     def __getitem__(self, market):
-        for trade in market.trades:
-            owner_name = self.owner_name
-            if trade.seller == owner_name or trade.buyer == owner_name:
-                yield trade
+        yield from market.trades_of(self.owner_name)
 
 
 class Offers:
@@ -131,6 +128,13 @@ class Offers:
         except AttributeError:
             raise SimulationException("Trade event before strategy was initialized.")
 
+    def forget_market(self, market):
+        self.bought = {offer: _market for offer, _market in self.bought.items()
+                       if _market != market}
+        self.posted = {offer: _market for offer, _market in self.posted.items()
+                       if _market != market}
+        self.sold.pop(market, None)
+
     def on_offer_changed(self, existing_offer, new_offer):
         if existing_offer.seller == self.strategy.owner.name:
             assert existing_offer.id not in self.changed, \
@@ -169,12 +173,7 @@ class BaseStrategy(TriggerMixin, EventMixin, AreaBehaviorBase):
         if not allow_open_market and not market.readonly:
             raise ValueError(
                 'Energy balance for open market requested and `allow_open_market` no passed')
-        return sum(
-            t.offer.energy * -1
-            if t.buyer == self.owner.name
-            else t.offer.energy
-            for t in self.trades[market]
-        )
+        return market.sold_energy(self.owner.name) - market.bought_energy(self.owner.name)
 
     @property
     def is_eligible_for_balancing_market(self):
@@ -230,6 +229,14 @@ class BaseStrategy(TriggerMixin, EventMixin, AreaBehaviorBase):
             return {}
         return self._bids[market]
 
+    def forget_market(self, market):
+        """
+        Drop the bookkeeping for `market`, once the area only keeps a summary of it.
+        """
+        self.offers.forget_market(market)
+        self._bids.pop(market, None)
+        self._traded_bids.pop(market, None)
+
     def post(self, **data):
         self.event_data_received(data)
 
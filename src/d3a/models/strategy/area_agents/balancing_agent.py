@@ -21,6 +21,9 @@ from d3a.models.strategy.area_agents.one_sided_engine import BalancingEngine
 
 
 class BalancingAgent(OneSidedAgent):
+    # Unmatched balancing energy is traded on ticks
+    idle_between_events = False
+
     def __init__(self, owner, higher_market, lower_market,
                  transfer_fee_pct=1, min_offer_age=1):
         self.balancing_spot_trade_ratio = owner.balancing_spot_trade_ratio
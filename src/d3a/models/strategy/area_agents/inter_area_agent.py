@@ -52,6 +52,9 @@ class InterAreaAgent(BaseStrategy):
         self.transfer_fee_pct = transfer_fee_pct
         self.min_offer_age = min_offer_age
 
+        # Idle agents are skipped on ticks, until the next event arrives
+        self.idle = False
+
     @property
     def trades(self):
         return _TradeLookerUpper(self.name)
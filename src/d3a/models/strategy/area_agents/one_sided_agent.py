@@ -15,18 +15,29 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
+from d3a.events.event_structures import AreaEvent
 from d3a.models.strategy.area_agents.inter_area_agent import InterAreaAgent
 from d3a.models.strategy.area_agents.one_sided_engine import IAAEngine
 from d3a.d3a_core.util import make_iaa_name
 
 
 class OneSidedAgent(InterAreaAgent):
+    # Offers only change with market events, so the agent can skip the ticks in between
+    idle_between_events = True
+
     def __init__(self, *, owner, higher_market, lower_market,
                  transfer_fee_pct=1, min_offer_age=1, engine_type=IAAEngine):
         super().__init__(engine_type=engine_type, owner=owner, higher_market=higher_market,
                          lower_market=lower_market, transfer_fee_pct=transfer_fee_pct,
                          min_offer_age=min_offer_age)
         self.name = make_iaa_name(owner)
+        self._received_event = False
+
+    def event_listener(self, event_type, **kwargs):
+        if event_type is not AreaEvent.TICK:
+            self.idle = False
+            self._received_event = True
+        super().event_listener(event_type, **kwargs)
 
     def usable_offer(self, offer):
         """Prevent IAAEngines from trading their counterpart's offers"""
@@ -49,8 +60,13 @@ class OneSidedAgent(InterAreaAgent):
             # We're connected to both areas but only want tick events from our owner
             return
 
+        self._received_event = False
         for engine in self.engines:
             engine.tick(area=area)
+        # Unless an event arrived in the meantime, the next ticks only have work to do for
+        # offers that are too young to be forwarded
+        self.idle = self.idle_between_events and not self._received_event and \
+            not any(engine.has_young_offers for engine in self.engines)
 
     def event_trade(self, *, market_id, trade):
         for engine in self.engines:
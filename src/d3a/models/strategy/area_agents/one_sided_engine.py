@@ -40,6 +40,8 @@ class IAAEngine:
         self.forwarded_offers = {}  # type: Dict[str, OfferInfo]
         self.trade_residual = {}  # type Dict[str, Offer]
         self.ignored_offers = set()  # type: Set[str]
+        # Whether the last tick left offers that were too young to be forwarded
+        self.has_young_offers = False
 
     def __repr__(self):
         return "<IAAEngine [{s.owner.name}] {s.name} {s.markets.source.time_slot:%H:%M}>".format(
@@ -71,11 +73,13 @@ class IAAEngine:
             if offer.id not in self.offer_age:
                 self.offer_age[offer.id] = area.current_tick
 
+        self.has_young_offers = False
         # Use `list()` to avoid in place modification errors
         for offer_id, age in list(self.offer_age.items()):
             if offer_id in self.forwarded_offers:
                 continue
             if area.current_tick - age < self.min_offer_age:
+                self.has_young_offers = True
                 continue
             offer = self.markets.source.offers.get(offer_id)
             if not offer:
@@ -20,6 +20,8 @@ from d3a.models.strategy.area_agents.two_sided_pay_as_bid_engine import TwoSided
 
 
 class TwoSidedPayAsBidAgent(OneSidedAgent):
+    # Bids are posted without a market event and matched on ticks
+    idle_between_events = False
 
     def __init__(self, *, owner, higher_market, lower_market,
                  transfer_fee_pct=1, min_offer_age=1, engine_type=TwoSidedPayAsBidEngine):
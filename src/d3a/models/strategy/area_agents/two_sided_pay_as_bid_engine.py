@@ -15,7 +15,9 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
-from collections import namedtuple
+from collections import namedtuple, defaultdict, deque
+from typing import Deque, Dict  # noqa
+from sortedcontainers import SortedList
 from d3a.models.strategy.area_agents.one_sided_engine import IAAEngine
 from d3a.d3a_core.exceptions import BidNotFound, MarketException
 from d3a.models.market.market_structures import Bid
@@ -70,15 +72,40 @@ class TwoSidedPayAsBidEngine(IAAEngine):
             key=lambda o: o.price / o.energy))
         )
 
-        already_selected_bids = set()
+        # Every offer is matched with the most expensive bid that is left and can pay for it,
+        # unless the bid belongs to the seller of the offer. Offers are matched from the most
+        # expensive one on, so a bid that can pay for an offer can also pay for all following
+        # ones, and the bids only need to be walked once. Bids that are skipped because of their
+        # buyer are set aside, only the first set aside bid of each buyer is a candidate for the
+        # next offers and it always comes before the bids that were not visited yet.
+        bid_rates = [bid.price / bid.energy for bid in sorted_bids]
+        set_aside_bids = defaultdict(deque)  # type: Dict[str, Deque[int]]
+        # (bid index, buyer) of the first set aside bid of each buyer
+        first_set_aside_bids = SortedList()
+        next_bid = 0
         for offer in sorted_offers:
-            for bid in sorted_bids:
-                if bid.id not in already_selected_bids and \
-                   offer.price / offer.energy <= bid.price / bid.energy and \
-                   offer.seller != bid.buyer:
-                    already_selected_bids.add(bid.id)
-                    yield bid, offer
+            offer_rate = offer.price / offer.energy
+            selected_bid = None
+            for index, buyer in first_set_aside_bids[:2]:
+                if buyer != offer.seller:
+                    selected_bid = index
+                    first_set_aside_bids.remove((index, buyer))
+                    set_aside_bids[buyer].popleft()
+                    if set_aside_bids[buyer]:
+                        first_set_aside_bids.add((set_aside_bids[buyer][0], buyer))
                     break
+            while selected_bid is None and next_bid < len(sorted_bids) and \
+                    offer_rate <= bid_rates[next_bid]:
+                buyer = sorted_bids[next_bid].buyer
+                if buyer != offer.seller:
+                    selected_bid = next_bid
+                else:
+                    if not set_aside_bids[buyer]:
+                        first_set_aside_bids.add((next_bid, buyer))
+                    set_aside_bids[buyer].append(next_bid)
+                next_bid += 1
+            if selected_bid is not None:
+                yield sorted_bids[selected_bid], offer
 
     def _delete_forwarded_bid_entries(self, bid):
         bid_info = self.forwarded_bids.pop(bid.id, None)
@@ -18,6 +18,7 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from collections import namedtuple, defaultdict
 from d3a.models.strategy.area_agents.two_sided_pay_as_bid_engine import TwoSidedPayAsBidEngine
 import math
+import numpy as np
 from logging import getLogger
 from d3a.models.const import ConstSettings
 
@@ -25,6 +26,9 @@ BidInfo = namedtuple('BidInfo', ('source_bid', 'target_bid'))
 
 log = getLogger(__name__)
 
+# Cleared energy below this is rounding left over from the cumulative sums, not a trade
+_MIN_CLEARED_ENERGY = 1e-9
+
 
 class TwoSidedPayAsClearEngine(TwoSidedPayAsBidEngine):
     def __init__(self, name: str, market_1, market_2, min_offer_age: int, transfer_fee_pct: int,
@@ -34,6 +38,9 @@ class TwoSidedPayAsClearEngine(TwoSidedPayAsBidEngine):
         self.sorted_bids = []
         self.sorted_offers = []
         self.clearing_rate = []  # type: List[int]
+        # Energy cleared of each of sorted_bids and sorted_offers by the last matching
+        self.cleared_bid_energy = np.empty(0)
+        self.cleared_offer_energy = np.empty(0)
 
     def __repr__(self):
         return "<TwoSidedPayAsClearEngine [{s.owner.name}] {s.name} " \
@@ -73,6 +80,8 @@ class TwoSidedPayAsClearEngine(TwoSidedPayAsBidEngine):
         return obj
 
     def _perform_pay_as_clear_matching(self):
+        if ConstSettings.IAASettings.PAY_AS_CLEAR_ALGORITHM == 2:
+            return self._perform_vectorized_pay_as_clear_matching()
         self.sorted_bids = self._sorting(self.markets.source.bids, True)
         self.sorted_offers = self._sorting(self.markets.source.offers)
 
@@ -91,10 +100,79 @@ class TwoSidedPayAsClearEngine(TwoSidedPayAsBidEngine):
 
         for i in range(1, max_rate+1):
             if cumulative_offers[i] >= cumulative_bids[i]:
+                # The integer curves place every order at its floored rate
+                self._allocate(i, cumulative_bids[i],
+                               *self._floored_rates_and_energy(self.sorted_bids),
+                               *self._floored_rates_and_energy(self.sorted_offers))
                 return i, cumulative_bids[i]
             else:
                 continue
 
+    @staticmethod
+    def _floored_rates_and_energy(orders):
+        energy = np.array([o.energy for o in orders], dtype=float)
+        return np.floor(np.array([o.price for o in orders], dtype=float) / energy), energy
+
+    @staticmethod
+    def _cleared_energy(energy, eligible, clearing_energy):
+        # The eligible orders are filled in merit order until clearing_energy is reached, the
+        # last one only with the remainder
+        energy = np.where(eligible, energy, 0.)
+        filled_before = np.cumsum(energy) - energy
+        return np.clip(clearing_energy - filled_before, 0., energy)
+
+    def _allocate(self, clearing_rate, clearing_energy, bid_rates, bid_energy, offer_rates,
+                  offer_energy):
+        """
+        Energy cleared of each of sorted_bids and sorted_offers, from the rates and energy of
+        the orders in the same order
+        """
+        self.cleared_bid_energy = \
+            self._cleared_energy(bid_energy, bid_rates >= clearing_rate, clearing_energy)
+        self.cleared_offer_energy = \
+            self._cleared_energy(offer_energy, offer_rates <= clearing_rate, clearing_energy)
+
+    @staticmethod
+    def _sorted_rates(obj, reverse_order=False):
+        orders = list(obj.values())
+        energy = np.array([o.energy for o in orders], dtype=float)
+        rates = np.array([o.price for o in orders], dtype=float) / energy \
+            if orders else np.empty(0)
+        # Stable sort, so that orders of the same rate keep the order of `_sorting`
+        index = np.argsort(rates, kind='stable')
+        if reverse_order:
+            index = index[::-1]
+        return [orders[i] for i in index], rates[index], energy[index]
+
+    def _perform_vectorized_pay_as_clear_matching(self):
+        """
+        Clearing on the exact energy rates of offers and bids. The supply curve is the energy
+        offered at or below a rate, the demand curve the energy bid at or above a rate. The
+        clearing rate is the lowest offer or bid rate where supply meets demand.
+        """
+        self.sorted_bids, bid_rates, bid_energy = \
+            self._sorted_rates(self.markets.source.bids, True)
+        self.sorted_offers, offer_rates, offer_energy = \
+            self._sorted_rates(self.markets.source.offers)
+        if len(self.sorted_bids) == 0 or len(self.sorted_offers) == 0:
+            return
+
+        rates = np.unique(np.concatenate((offer_rates, bid_rates)))
+        cumulative_offers = np.concatenate(([0.], np.cumsum(offer_energy)))
+        supply = cumulative_offers[np.searchsorted(offer_rates, rates, side='right')]
+        # Bids in ascending order, the demand at a rate is what is left above the cheaper bids
+        cumulative_bids = np.concatenate(([0.], np.cumsum(bid_energy[::-1])))
+        demand = cumulative_bids[-1] - \
+            cumulative_bids[np.searchsorted(bid_rates[::-1], rates, side='left')]
+
+        cleared = np.flatnonzero(supply >= demand)
+        if len(cleared) == 0:
+            return
+        clearing_rate, clearing_energy = float(rates[cleared[0]]), float(demand[cleared[0]])
+        self._allocate(clearing_rate, clearing_energy, bid_rates, bid_energy, offer_rates,
+                       offer_energy)
+        return clearing_rate, clearing_energy
+
     def _match_offers_bids(self):
         clearing = self._perform_pay_as_clear_matching()
         if clearing is None:
@@ -102,51 +180,25 @@ class TwoSidedPayAsClearEngine(TwoSidedPayAsBidEngine):
         clearing_rate, clearing_energy = clearing
         log.info(f"Market Clearing Rate: {clearing_rate} & Clearing Energy: {clearing_energy} ")
         self.clearing_rate.append(clearing_rate)
-        cumulative_traded_bids = 0
-        for bid in self.sorted_bids:
-            if cumulative_traded_bids >= clearing_energy:
-                break
-            elif (bid.price/bid.energy) >= clearing_rate and \
-                    (clearing_energy - cumulative_traded_bids) >= bid.energy:
-                cumulative_traded_bids += bid.energy
-                self.markets.source.accept_bid(
-                    bid._replace(price=(bid.energy * clearing_rate), energy=bid.energy),
-                    energy=bid.energy,
-                    seller=self.owner.name,
-                    already_tracked=True,
-                    price_drop=True
-                )
-            elif (bid.price/bid.energy) >= clearing_rate and \
-                    (clearing_energy - cumulative_traded_bids) <= bid.energy:
-                cumulative_traded_bids += (clearing_energy - cumulative_traded_bids)
-                self.markets.source.accept_bid(
-                    bid._replace(price=(bid.energy * clearing_rate), energy=bid.energy),
-                    energy=(clearing_energy - cumulative_traded_bids),
-                    seller=self.owner.name,
-                    already_tracked=True,
-                    price_drop=True
-                )
-
-        cumulative_traded_offers = 0
-        for offer in self.sorted_offers:
-            if cumulative_traded_offers >= clearing_energy:
-                break
-            elif (math.floor(offer.price/offer.energy)) <= clearing_rate and \
-                    (clearing_energy - cumulative_traded_offers) >= offer.energy:
-                offer.price = offer.energy * clearing_rate
-                self.markets.source.accept_offer(offer_or_id=offer,
-                                                 buyer=self.owner.name,
-                                                 energy=offer.energy,
-                                                 price_drop=True)
-                cumulative_traded_offers += offer.energy
-            elif (math.floor(offer.price/offer.energy)) <= clearing_rate and \
-                    (clearing_energy - cumulative_traded_offers) <= offer.energy:
-                offer.price = offer.energy * clearing_rate
-                self.markets.source.accept_offer(offer_or_id=offer,
-                                                 buyer=self.owner.name,
-                                                 energy=offer.energy,
-                                                 price_drop=True)
-                cumulative_traded_offers += (clearing_energy - cumulative_traded_offers)
+        for bid, energy in zip(self.sorted_bids, self.cleared_bid_energy):
+            if energy < _MIN_CLEARED_ENERGY:
+                continue
+            self.markets.source.accept_bid(
+                bid._replace(price=(bid.energy * clearing_rate), energy=bid.energy),
+                energy=float(energy),
+                seller=self.owner.name,
+                already_tracked=True,
+                price_drop=True
+            )
+
+        for offer, energy in zip(self.sorted_offers, self.cleared_offer_energy):
+            if energy < _MIN_CLEARED_ENERGY:
+                continue
+            offer.price = offer.energy * clearing_rate
+            self.markets.source.accept_offer(offer_or_id=offer,
+                                             buyer=self.owner.name,
+                                             energy=float(energy),
+                                             price_drop=True)
 
     def tick(self, *, area):
         super().tick(area=area)
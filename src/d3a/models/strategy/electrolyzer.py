@@ -18,7 +18,6 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from d3a.models.strategy.storage import StorageStrategy
 from d3a.models.read_user_profile import read_arbitrary_profile
 from d3a.models.read_user_profile import InputProfileTypes
-from d3a.constants import TIME_FORMAT
 
 
 class ElectrolyzerStrategy(StorageStrategy):
@@ -55,7 +54,7 @@ class ElectrolyzerStrategy(StorageStrategy):
             self.load_profile_kWh[key] = value * self.conversion_factor_kWh_kg
 
     def event_market_cycle(self):
-        self.update_market_cycle_offers(self.break_even[self.area.now.strftime(TIME_FORMAT)][1])
+        self.update_market_cycle_offers(self._break_even_now[1])
         current_market = self.area.next_market
         if self.area.past_markets:
             past_market = self.area.last_past_market
@@ -20,9 +20,9 @@ from pendulum import duration
 from typing import Union
 from collections import namedtuple
 
-from d3a.d3a_core.util import generate_market_slot_list
 from d3a.d3a_core.exceptions import MarketException
 from d3a.models.state import LoadState
+from d3a.models.slot_calendar import SlotValues
 from d3a.models.strategy import BaseStrategy
 from d3a.models.const import ConstSettings
 from d3a.models.strategy.update_frequency import BidUpdateFrequencyMixin
@@ -62,7 +62,8 @@ class LoadHoursStrategy(BaseStrategy, BidUpdateFrequencyMixin):
         self.daily_budget = daily_budget * 100 if daily_budget is not None else None
         # Energy consumed during the day ideally should not exceed daily_energy_required
         self.energy_per_slot_Wh = None
-        self.energy_requirement_Wh = {}  # type: Dict[Time, float]
+        self.energy_requirement_Wh = SlotValues()  # type: Dict[Time, float]
+        self._slot_calendar = None
         self.hrs_per_day = {}  # type: Dict[int, int]
 
         if hrs_of_day is None:
@@ -96,14 +97,20 @@ class LoadHoursStrategy(BaseStrategy, BidUpdateFrequencyMixin):
         self.energy_per_slot_Wh = (self.avg_power_W /
                                    (duration(hours=1) / self.area.config.slot_length))
 
-        self._simulation_start_timestamp = self.area.now
+        self._set_slot_calendar()
         self.hrs_per_day = {day: self._initial_hrs_per_day
                             for day in range(self.area.config.duration.days + 1)}
 
-        for slot_time in generate_market_slot_list(self.area):
-            if self._allowed_operating_hours(slot_time):
-                self.energy_requirement_Wh[slot_time] = self.energy_per_slot_Wh
-                self.state.desired_energy_Wh[slot_time] = self.energy_per_slot_Wh
+        for slot in self._slot_calendar.slots:
+            if self._allowed_operating_hours(slot.time_slot):
+                self.energy_requirement_Wh[slot.time_slot] = self.energy_per_slot_Wh
+                self.state.desired_energy_Wh[slot.time_slot] = self.energy_per_slot_Wh
+
+    def _set_slot_calendar(self):
+        self._simulation_start_timestamp = self.area.now
+        self._slot_calendar = self.area.config.slot_calendar(self.area.now)
+        self.energy_requirement_Wh.set_calendar(self._slot_calendar)
+        self.state.set_slot_calendar(self._slot_calendar)
 
     def _find_acceptable_offer(self, market):
         offers = market.most_affordable_offers
@@ -134,7 +141,9 @@ class LoadHoursStrategy(BaseStrategy, BidUpdateFrequencyMixin):
             self.log.exception("An Error occurred while buying an offer")
 
     def _get_day_of_timestamp(self, time_slot):
-        return (time_slot - self._simulation_start_timestamp).days
+        if self._slot_calendar is None:
+            return (time_slot - self._simulation_start_timestamp).days
+        return self._slot_calendar.day(time_slot)
 
     def _double_sided_market_event_tick(self, market):
         if self.are_bids_posted(market):
@@ -18,9 +18,7 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from typing import Union
 
 from d3a.models.const import ConstSettings
-from d3a.d3a_core.util import generate_market_slot_list
 from d3a.models.strategy.load_hours import LoadHoursStrategy
-from d3a.constants import TIME_FORMAT
 from d3a.models.read_user_profile import read_arbitrary_profile
 from d3a.models.read_user_profile import InputProfileTypes
 
@@ -76,16 +74,16 @@ class DefinedLoadStrategy(LoadHoursStrategy):
         Update required energy values for each market slot.
         :return: None
         """
-        self._simulation_start_timestamp = self.area.now
+        self._set_slot_calendar()
         self.hrs_per_day = {day: self._initial_hrs_per_day
                             for day in range(self.area.config.duration.days + 1)}
 
-        for slot_time in generate_market_slot_list(self.area):
-            if self._allowed_operating_hours(slot_time.hour):
-                self.energy_requirement_Wh[slot_time] = \
-                    self.load_profile[slot_time.strftime(TIME_FORMAT)] * 1000
-                self.state.desired_energy_Wh[slot_time] = \
-                    self.load_profile[slot_time.strftime(TIME_FORMAT)] * 1000
+        for slot in self._slot_calendar.slots:
+            if self._allowed_operating_hours(slot.hour):
+                self.energy_requirement_Wh[slot.time_slot] = \
+                    self.load_profile[slot.key] * 1000
+                self.state.desired_energy_Wh[slot.time_slot] = \
+                    self.load_profile[slot.key] * 1000
 
     def _operating_hours(self, energy):
         """
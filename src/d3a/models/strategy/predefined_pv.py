@@ -17,11 +17,10 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 import pathlib
 
-from d3a.constants import TIME_FORMAT, PENDULUM_TIME_FORMAT
-from d3a.d3a_core.util import generate_market_slot_list
+from d3a.constants import TIME_FORMAT
 from d3a.models.strategy.pv import PVStrategy
 from d3a.models.const import ConstSettings
-from d3a.models.read_user_profile import read_profile_csv_to_dict, read_arbitrary_profile, \
+from d3a.models.read_user_profile import read_arbitrary_profile, \
     create_energy_from_power_profile
 from d3a.models.read_user_profile import InputProfileTypes
 from d3a.d3a_core.util import d3a_path
@@ -75,12 +74,13 @@ class PVPredefinedStrategy(PVStrategy):
         # created when the constructor is executed if we inherit from a mixin class,
         # therefore config cannot be read at that point
         data = self._read_predefined_profile_for_pv()
+        self._set_slot_calendar()
 
-        for slot_time in generate_market_slot_list(self.area):
-            self.energy_production_forecast_kWh[slot_time] = \
-                data[slot_time.format(PENDULUM_TIME_FORMAT)] * self.panel_count
-            self.state.available_energy_kWh[slot_time] = \
-                self.energy_production_forecast_kWh[slot_time]
+        for slot in self._slot_calendar.slots:
+            self.energy_production_forecast_kWh[slot.time_slot] = \
+                data[slot.key] * self.panel_count
+            self.state.available_energy_kWh[slot.time_slot] = \
+                self.energy_production_forecast_kWh[slot.time_slot]
 
         # TODO: A bit clumsy, but this decrease price calculation needs to be added here as well
         # Need to refactor once we convert the config object to a singleton that is shared globally
@@ -111,7 +111,7 @@ class PVPredefinedStrategy(PVStrategy):
             raise ValueError("Energy_profile has to be in [0,1,2]")
 
         # Populate energy production forecast data
-        return read_profile_csv_to_dict(
+        return read_arbitrary_profile(
             InputProfileTypes.POWER, str(profile_path),
             self.area.config.slot_length)
 
@@ -20,12 +20,12 @@ from pendulum import Time # noqa
 import math
 from pendulum import duration
 
-from d3a.d3a_core.util import generate_market_slot_list
 from d3a.events.event_structures import Trigger
 from d3a.models.strategy import BaseStrategy
 from d3a.models.const import ConstSettings
 from d3a.models.strategy.update_frequency import OfferUpdateFrequencyMixin
 from d3a.models.state import PVState
+from d3a.models.slot_calendar import SlotValues
 
 
 class PVStrategy(BaseStrategy, OfferUpdateFrequencyMixin):
@@ -55,8 +55,9 @@ class PVStrategy(BaseStrategy, OfferUpdateFrequencyMixin):
         self.max_panel_power_W = max_panel_power_W
         self.midnight = None
         self.min_selling_rate = min_selling_rate
-        self.energy_production_forecast_kWh = {}  # type: Dict[Time, float]
+        self.energy_production_forecast_kWh = SlotValues()  # type: Dict[Time, float]
         self.state = PVState()
+        self._slot_calendar = None
 
     @staticmethod
     def _validate_constructor_arguments(panel_count, risk, max_panel_output_W):
@@ -69,10 +70,16 @@ class PVStrategy(BaseStrategy, OfferUpdateFrequencyMixin):
     def event_activate(self):
         # This gives us a pendulum object with today 0 o'clock
         self.midnight = self.area.now.start_of("day")
+        self._set_slot_calendar()
         # Calculating the produced energy
         self.update_on_activate()
         self.produced_energy_forecast_kWh()
 
+    def _set_slot_calendar(self):
+        self._slot_calendar = self.area.config.slot_calendar(self.area.now)
+        self.energy_production_forecast_kWh.set_calendar(self._slot_calendar)
+        self.state.set_slot_calendar(self._slot_calendar)
+
     def _incorporate_rate_restrictions(self, initial_sell_rate, current_time):
         energy_rate = max(initial_sell_rate, self.min_selling_rate)
         rounded_energy_rate = round(energy_rate, 2)
@@ -92,12 +99,17 @@ class PVStrategy(BaseStrategy, OfferUpdateFrequencyMixin):
         # This forecast ist based on the real PV system data provided by enphase
         # They can be found in the tools folder
         # A fit of a gaussian function to those data results in a formula Energy(time)
-        for slot_time in generate_market_slot_list(self.area):
-            difference_to_midnight_in_minutes = \
-                slot_time.diff(self.midnight).in_minutes() % (60 * 24)
-            self.energy_production_forecast_kWh[slot_time] = \
-                self.gaussian_energy_forecast_kWh(
+        # The forecast only depends on the time of day
+        forecast_per_time_of_day = {}
+        for slot in self._slot_calendar.slots:
+            if slot.key not in forecast_per_time_of_day:
+                difference_to_midnight_in_minutes = \
+                    slot.time_slot.hour * 60 + slot.time_slot.minute
+                forecast_per_time_of_day[slot.key] = self.gaussian_energy_forecast_kWh(
                     difference_to_midnight_in_minutes) * self.panel_count
+            slot_time = slot.time_slot
+            self.energy_production_forecast_kWh[slot_time] = \
+                forecast_per_time_of_day[slot.key]
             self.state.available_energy_kWh[slot_time] = \
                 self.energy_production_forecast_kWh[slot_time]
             assert self.energy_production_forecast_kWh[slot_time] >= 0.0
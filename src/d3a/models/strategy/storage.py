@@ -17,6 +17,7 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 from typing import Union
 from collections import namedtuple
+from operator import itemgetter
 
 from d3a.d3a_core.exceptions import MarketException
 from d3a.models.state import StorageState
@@ -25,7 +26,6 @@ from d3a.models.const import ConstSettings
 from d3a.models.strategy.update_frequency import OfferUpdateFrequencyMixin, BidUpdateFrequencyMixin
 from d3a.models.read_user_profile import read_arbitrary_profile
 from d3a.models.read_user_profile import InputProfileTypes
-from d3a.constants import TIME_FORMAT
 from d3a.d3a_core.device_registry import DeviceRegistry
 
 BalancingRatio = namedtuple('BalancingRatio', ('demand', 'supply'))
@@ -76,7 +76,7 @@ class StorageStrategy(BaseStrategy, OfferUpdateFrequencyMixin, BidUpdateFrequenc
             InputProfileTypes.IDENTITY,
             StorageSettings.MIN_BUYING_RATE
         )
-        self.max_buying_rate_profile = {k: v[1] for k, v in break_even.items()}
+        self.max_buying_rate_profile = break_even.map(itemgetter(1))
         BidUpdateFrequencyMixin.__init__(self,
                                          initial_rate_profile=self.min_buying_rate_profile,
                                          final_rate_profile=self.max_buying_rate_profile)
@@ -90,10 +90,13 @@ class StorageStrategy(BaseStrategy, OfferUpdateFrequencyMixin, BidUpdateFrequenc
                                   strategy=self,
                                   min_allowed_soc=min_allowed_soc)
         self.cap_price_strategy = cap_price_strategy
+        self._slot_calendar = None
         self.balancing_energy_ratio = BalancingRatio(*balancing_energy_ratio)
 
     def event_activate(self):
-        self.update_market_cycle_offers(self.break_even[self.area.now.strftime(TIME_FORMAT)][1])
+        self._slot_calendar = self.area.config.slot_calendar(self.area.now)
+        self.state.set_slot_calendar(self._slot_calendar)
+        self.update_market_cycle_offers(self._break_even_now[1])
         self.state.set_battery_energy_per_slot(self.area.config.slot_length)
         self.update_on_activate()
 
@@ -176,8 +179,12 @@ class StorageStrategy(BaseStrategy, OfferUpdateFrequencyMixin, BidUpdateFrequenc
             self.state.pledged_buy_kWh[market.time_slot] += bid_trade.offer.energy
             self.state.offered_buy_kWh[market.time_slot] -= bid_trade.offer.energy
 
+    @property
+    def _break_even_now(self):
+        return self.break_even[self._slot_calendar.key(self.area.now)]
+
     def event_market_cycle(self):
-        self.update_market_cycle_offers(self.break_even[self.area.now.strftime(TIME_FORMAT)][1])
+        self.update_market_cycle_offers(self._break_even_now[1])
         current_market = self.area.next_market
         past_market = self.area.last_past_market
 
@@ -191,8 +198,7 @@ class StorageStrategy(BaseStrategy, OfferUpdateFrequencyMixin, BidUpdateFrequenc
 
         if ConstSettings.IAASettings.MARKET_TYPE == 2:
             self.state.clamp_energy_to_buy_kWh([current_market.time_slot])
-            self.update_market_cycle_bids(final_rate=self.break_even[
-                self.area.now.strftime(TIME_FORMAT)][0])
+            self.update_market_cycle_bids(final_rate=self._break_even_now[0])
             energy_kWh = self.state.energy_to_buy_dict[current_market.time_slot]
             if energy_kWh > 0:
                 self.post_first_bid(current_market, energy_kWh * 1000.0)
@@ -154,14 +154,16 @@ class OfferUpdateFrequencyMixin:
                 continue
             try:
                 iterated_market.delete_offer(offer.id)
+                # Clamp the price before posting, the market orders offers by the rate they
+                # were posted with
+                new_price = round(offer.price - (offer.energy * decrease_rate_per_tick), 10)
+                if (new_price / offer.energy) < self.min_selling_rate:
+                    new_price = self.min_selling_rate * offer.energy
                 new_offer = iterated_market.offer(
-                    round(offer.price - (offer.energy *
-                          decrease_rate_per_tick), 10),
+                    new_price,
                     offer.energy,
                     self.owner.name
                 )
-                if (new_offer.price/new_offer.energy) < self.min_selling_rate:
-                    new_offer.price = self.min_selling_rate * new_offer.energy
                 self.offers.replace(offer, new_offer, iterated_market)
             except MarketException:
                 continue
@@ -31,17 +31,17 @@ def get_setup(config):
         [*[Area('House ' + str(i), [
             Area('H1 General Load', strategy=LoadHoursStrategy(avg_power_W=100,
                                                                hrs_per_day=4,
-                                                               hrs_of_day=list(range(12, 15))),
+                                                               hrs_of_day=list(range(12, 16))),
                  appliance=SwitchableAppliance()),
             Area('H2 PV',
                  strategy=PVStrategy(6, 80),
                  appliance=PVAppliance()),
             Area('H2 Storage',
-                 strategy=StorageStrategy(initial_capacity_kWh=60),
+                 strategy=StorageStrategy(initial_capacity_kWh=0.6),
                  appliance=SimpleAppliance())
         ]) for i in range(1, 1000)],
          Area('Commercial Energy Producer',
-              strategy=CommercialStrategy(energy_range_wh=(40, 120), energy_price=30),
+              strategy=CommercialStrategy(energy_rate=30),
               appliance=SimpleAppliance()
               ),
         ],
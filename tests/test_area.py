@@ -26,6 +26,7 @@ from d3a.models.strategy.storage import StorageStrategy
 from d3a.models.config import SimulationConfig
 from d3a.models.market import Market
 from d3a.models.market.market_structures import Offer
+from d3a.models.market.market_summary import MarketSummary
 from d3a.models.const import ConstSettings
 from d3a.d3a_core.device_registry import DeviceRegistry
 
@@ -46,6 +47,7 @@ class TestAreaClass(unittest.TestCase):
         self.config = MagicMock(spec=SimulationConfig)
         self.config.slot_length = duration(minutes=15)
         self.config.tick_length = duration(seconds=15)
+        self.config.live_past_market_count = None
         self.area = Area("test_area", None, self.strategy, self.appliance, self.config, None)
         self.area.parent = self.area
         self.area.children = [self.area]
@@ -106,3 +108,68 @@ class TestAreaClass(unittest.TestCase):
         assert len(self.area.past_balancing_markets) == 1
         assert len(self.area.all_markets) == 5
         assert len(self.area.balancing_markets) == 5
+
+    def test_cycle_markets_prunes_area_agents_of_past_markets(self):
+        self.area = Area(name="Street", children=[Area(name="House", children=[Area("PV")])])
+        self.area.activate()
+        house = self.area.children[0]
+        assert list(house.dispatcher.interarea_agents.keys()) == \
+            [m.time_slot for m in house.all_markets]
+
+        self.area.current_tick = house.current_tick = self.area.config.ticks_per_slot
+        self.area.tick(is_root_area=True)
+        assert len(house.past_markets) == 1
+        for dispatcher in (self.area.dispatcher, house.dispatcher):
+            assert list(dispatcher.interarea_agents.keys()) == \
+                [m.time_slot for m in house.all_markets]
+
+    def test_cycle_markets_archives_old_past_markets(self):
+        config = SimulationConfig(
+            duration=duration(hours=24),
+            market_count=1,
+            slot_length=duration(minutes=15),
+            tick_length=duration(seconds=1),
+            cloud_coverage=ConstSettings.PVSettings.DEFAULT_POWER_PROFILE,
+            market_maker_rate=str(ConstSettings.GeneralSettings.DEFAULT_MARKET_MAKER_RATE),
+            iaa_fee=ConstSettings.IAASettings.FEE_PERCENTAGE,
+            live_past_market_count=2
+        )
+        self.area = Area(name="Street", children=[Area(name="House")], config=config)
+        self.area.activate()
+        market = self.area.next_market
+        offer = market.offer(10, 1, 'A')
+        market.accept_offer(offer, 'B', energy=0.5)
+
+        for slot in range(1, 5):
+            self.area.current_tick = slot * config.ticks_per_slot
+            self.area.tick(is_root_area=True)
+
+        past_markets = self.area.past_markets
+        assert len(past_markets) == 4
+        assert all(isinstance(m, MarketSummary) for m in past_markets[:2])
+        assert all(isinstance(m, Market) for m in past_markets[2:])
+        summary = past_markets[0]
+        assert summary.id == market.id
+        assert 'trades' not in summary._fields
+        logged_trade = summary.trades[0]
+        assert logged_trade == market.trades[0]._replace(offer=logged_trade.offer, residual=True)
+        assert logged_trade.offer.market is None
+        assert [trade.id for trade in summary.trades_of('B')] == [logged_trade.id]
+        assert summary.bought_energy('B') == 0.5
+        assert summary.total_earned('A') == 5
+        assert summary.traded_energy == market.traded_energy
+        assert summary.offers.keys() == market.offers.keys()
+
+    def test_areas_share_the_clock_and_config_resolved_on_activation(self):
+        self.area = Area(name="Street", children=[Area(name="House", children=[Area("PV")])])
+        self.area.activate()
+        house = self.area.children[0]
+        pv = house.children[0]
+        assert house.clock is self.area.clock
+        assert pv.config is house.config is self.area.config
+        start_date = self.area.clock.start_date
+        assert self.area.now == start_date
+
+        self.area.current_tick = house.current_tick = 10
+        assert house.now == start_date.add(seconds=10 * self.area.config.tick_length.seconds)
+        assert house.now is self.area.now
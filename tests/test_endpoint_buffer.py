@@ -0,0 +1,363 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from collections import OrderedDict, defaultdict
+from statistics import mean
+
+import pytest
+from pendulum import duration
+
+from d3a.d3a_core.sim_results.area_statistics import _generate_intraarea_consumption_entries, \
+    _generate_produced_energy_entries, _generate_self_consumption_entries, \
+    _is_cell_tower_node, _is_house_node, _is_load_node, get_area_type_string
+from d3a.d3a_core.sim_results.endpoint_buffer import SimulationEndpointBuffer
+from d3a.d3a_core.sim_results.export_unmatched_loads import \
+    _accumulate_device_stats_to_area_stats, _calculate_hour_stats_for_area, \
+    select_house_or_cell_tower, select_house_or_load
+from d3a.d3a_core.sim_results.stats import energy_bills
+from d3a.d3a_core.util import area_name_from_area_or_iaa_name, make_iaa_name
+from d3a.models.market.market_summary import MarketSummary
+from d3a.models.strategy.area_agents.one_sided_agent import InterAreaAgent
+from d3a.models.strategy.pv import PVStrategy
+from d3a.models.strategy.storage import StorageStrategy
+from d3a.d3a_core.simulation import Simulation
+from d3a.models.config import SimulationConfig
+from d3a.models.const import ConstSettings
+
+
+def _buffer_contents(endpoint_buffer):
+    return {
+        **endpoint_buffer.generate_result_report(),
+        "unmatched_loads_all_devices": endpoint_buffer.unmatched_loads,
+        "cumulative_grid_trades_all_devices": endpoint_buffer.cumulative_grid_trades,
+        "cumulative_grid_balancing_trades": endpoint_buffer.cumulative_grid_balancing_trades,
+        "balancing_energy_bills": endpoint_buffer.balancing_energy_bills,
+    }
+
+
+# Reference implementation of the endpoint buffer views, which recomputes every view from all
+# past markets on each update, as the endpoint buffer did before it folded the markets.
+
+def _reference_unmatched_loads(area, all_devices=False):
+    def area_stats(child):
+        per_hour_device_data = {}
+        for market in child.parent.past_markets:
+            hour_data = per_hour_device_data.get(market.time_slot.hour, {"devices": {}})
+            per_hour_device_data[market.time_slot.hour] = \
+                _calculate_hour_stats_for_area(hour_data, child, market.time_slot)
+        area_data = _accumulate_device_stats_to_area_stats(per_hour_device_data)
+        area_data["type"] = get_area_type_string(child)
+        return area_data
+
+    def recurse_area_tree(parent, area_select_function):
+        unmatched_loads = {}
+        for child in parent.children:
+            if area_select_function(child):
+                unmatched_loads[child.name] = area_stats(child)
+            elif child.children is not None:
+                unmatched_loads.update(recurse_area_tree(child, area_select_function))
+        return unmatched_loads
+
+    area_tree = recurse_area_tree(
+        area, select_house_or_load if all_devices else select_house_or_cell_tower)
+    unmatched_load_count = sum(v["unmatched_load_count"] for v in area_tree.values())
+    return {"unmatched_load_count": unmatched_load_count,
+            "all_loads_met": unmatched_load_count == 0,
+            "areas": OrderedDict(sorted(area_tree.items()))}
+
+
+def _buyer_trade_prices(market, buyer):
+    # Converted from cents to euro
+    return [t.offer.price / 100.0 / t.offer.energy for t in market.trades if t.buyer == buyer]
+
+
+def _reference_cumulative_loads(area):
+    def gather(parent, load_price_lists):
+        for child in parent.children:
+            if child.children == [] and not isinstance(
+                    child.strategy, (StorageStrategy, PVStrategy, InterAreaAgent)):
+                for market in parent.past_markets:
+                    hour = market.time_slot.hour
+                    loads, prices = load_price_lists.setdefault(hour, ([], []))
+                    loads.append(abs(market.traded_energy[child.name]))
+                    prices.extend(_buyer_trade_prices(market, child.name))
+            else:
+                gather(child, load_price_lists)
+        return load_price_lists
+
+    return [
+        {
+            "time": hour,
+            "load": round(sum(loads), 3) if loads else 0,
+            "price": round(mean(prices), 2) if prices else 0
+        } for hour, (loads, prices) in gather(area, {}).items()
+    ]
+
+
+def _reference_price_energy_day(area):
+    def gather(parent, price_energy_lists):
+        for child in parent.children:
+            for market in parent.past_markets:
+                prices, pv_energy, storage_energy = price_energy_lists.setdefault(
+                    "%02d:00" % market.time_slot.hour, ([], [], []))
+                prices.extend(_buyer_trade_prices(market, child.name))
+                if child.children == [] and isinstance(child.strategy, PVStrategy):
+                    pv_energy.extend(t.offer.energy for t in market.trades
+                                     if t.seller == child.name)
+                if child.children == [] and isinstance(child.strategy, StorageStrategy):
+                    for t in market.trades:
+                        if t.seller == child.name:
+                            storage_energy.append(-t.offer.energy)
+                        elif t.buyer == child.name:
+                            storage_energy.append(t.offer.energy)
+            if child.children != []:
+                gather(child, price_energy_lists)
+        return price_energy_lists
+
+    return [
+        {
+            "timeslot": ii,
+            "time": hour,
+            "av_price": round(mean(prices) if prices else 0, 2),
+            "min_price": round(min(prices) if prices else 0, 2),
+            "max_price": round(max(prices) if prices else 0, 2),
+            "cum_pv_gen": round(-1 * sum(pv_energy), 2),
+            "cum_stor_prof": round(sum(storage_energy), 2)
+        } for ii, (hour, (prices, pv_energy, storage_energy))
+        in enumerate(gather(area, OrderedDict()).items())
+    ]
+
+
+def _new_area_trades(area_type, area_id):
+    return {"type": area_type, "id": area_id, "produced": 0.0, "earned": 0.0,
+            "consumedFrom": defaultdict(int), "spentTo": defaultdict(int)}
+
+
+def _reference_load_trades(load, grid, accumulated_trades, is_cell_tower):
+    trades = accumulated_trades[load.name] = \
+        _new_area_trades("cell_tower" if is_cell_tower else "load", load.area_id)
+    for market in grid.past_markets:
+        for trade in market.trades:
+            if trade.buyer == load.name:
+                seller_id = area_name_from_area_or_iaa_name(trade.seller)
+                trades["consumedFrom"][seller_id] += trade.offer.energy
+                trades["spentTo"][seller_id] += trade.offer.price
+
+
+def _reference_house_trades(house, grid, accumulated_trades, past_market_types):
+    if house.name not in accumulated_trades:
+        accumulated_trades[house.name] = _new_area_trades("house", house.area_id)
+    trades = accumulated_trades[house.name]
+    house_iaa_name = make_iaa_name(house)
+    child_names = [c.name for c in house.children]
+    for market in getattr(house, past_market_types):
+        for trade in market.trades:
+            if area_name_from_area_or_iaa_name(trade.seller) in child_names and \
+                    area_name_from_area_or_iaa_name(trade.buyer) in child_names:
+                # House self-consumption trade
+                trades["produced"] -= trade.offer.energy
+                trades["earned"] += trade.offer.price
+                trades["consumedFrom"][house.name] += trade.offer.energy
+                trades["spentTo"][house.name] += trade.offer.price
+            elif trade.buyer == house_iaa_name:
+                trades["earned"] += trade.offer.price
+                trades["produced"] -= trade.offer.energy
+    for market in getattr(grid, past_market_types):
+        for trade in market.trades:
+            if trade.buyer == house_iaa_name and trade.buyer != trade.offer.seller:
+                seller_id = area_name_from_area_or_iaa_name(trade.seller)
+                trades["consumedFrom"][seller_id] += trade.offer.energy
+                trades["spentTo"][seller_id] += trade.offer.price
+
+
+def _reference_grid_trades(area, accumulated_trades, past_market_types):
+    for child in area.children:
+        if _is_cell_tower_node(child):
+            _reference_load_trades(child, area, accumulated_trades, is_cell_tower=True)
+        elif _is_house_node(child):
+            _reference_house_trades(child, area, accumulated_trades, past_market_types)
+        elif child.children != []:
+            _reference_grid_trades(child, accumulated_trades, past_market_types)
+    return accumulated_trades
+
+
+def _reference_grid_trades_all_devices(area, accumulated_trades, past_market_types):
+    for child in area.children:
+        if _is_cell_tower_node(child):
+            _reference_load_trades(child, area, accumulated_trades, is_cell_tower=True)
+        if _is_load_node(child):
+            _reference_load_trades(child, area, accumulated_trades, is_cell_tower=False)
+        elif child.children != []:
+            _reference_house_trades(child, area, accumulated_trades, past_market_types)
+            _reference_grid_trades_all_devices(child, accumulated_trades, past_market_types)
+    return accumulated_trades
+
+
+def _reference_cumulative_grid_trades(area, past_market_types, all_devices=False):
+    accumulated_trades = \
+        _reference_grid_trades_all_devices(area, {}, past_market_types) if all_devices \
+        else _reference_grid_trades(area, {}, past_market_types)
+    return {
+        "unit": "kWh",
+        "areas": sorted(accumulated_trades.keys()),
+        "cumulative-grid-trades": [
+            _generate_produced_energy_entries(accumulated_trades),
+            _generate_self_consumption_entries(accumulated_trades),
+            *_generate_intraarea_consumption_entries(accumulated_trades)]
+    }
+
+
+def _reference_tree_summary(area, tree_summary):
+    price_energy_list = _reference_price_energy_day(area)
+
+    def calculate_prices(key, functor):
+        energy_prices = [price_energy[key] for price_energy in price_energy_list]
+        return round(100 * functor(energy_prices), 2) if len(energy_prices) > 0 else 0.0
+
+    tree_summary[area.slug] = {
+        "min_trade_price": calculate_prices("min_price", min),
+        "max_trade_price": calculate_prices("max_price", max),
+        "avg_trade_price": calculate_prices("av_price", mean),
+    }
+    for child in area.children:
+        if child.children != []:
+            _reference_tree_summary(child, tree_summary)
+    return tree_summary
+
+
+def _reference_buffer_contents(area, endpoint_buffer):
+    return {
+        "job_id": endpoint_buffer.job_id,
+        "random_seed": endpoint_buffer.random_seed,
+        "unmatched_loads": _reference_unmatched_loads(area),
+        "cumulative_loads": {"price-currency": "Euros", "load-unit": "kWh",
+                             "cumulative-load-price": _reference_cumulative_loads(area)},
+        "price_energy_day": {"price-currency": "Euros", "load-unit": "kWh",
+                             "price-energy-day": _reference_price_energy_day(area)},
+        "cumulative_grid_trades": _reference_cumulative_grid_trades(area, "past_markets"),
+        "bills": OrderedDict(sorted(energy_bills(area, "past_markets").items())),
+        "tree_summary": _reference_tree_summary(area, {}),
+        "status": endpoint_buffer.status,
+        "unmatched_loads_all_devices": {
+            "unmatched_loads": _reference_unmatched_loads(area, all_devices=True)},
+        "cumulative_grid_trades_all_devices":
+            _reference_cumulative_grid_trades(area, "past_markets", all_devices=True),
+        "cumulative_grid_balancing_trades":
+            _reference_cumulative_grid_trades(area, "past_balancing_markets"),
+        "balancing_energy_bills":
+            OrderedDict(sorted((energy_bills(area, "past_balancing_markets") or {}).items())),
+    }
+
+
+def _approx(value):
+    if isinstance(value, dict):
+        return {key: _approx(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_approx(item) for item in value]
+    if isinstance(value, float):
+        return pytest.approx(value)
+    return value
+
+
+@pytest.fixture
+def enable_balancing_market():
+    ConstSettings.BalancingSettings.ENABLE_BALANCING_MARKET = True
+    yield
+    ConstSettings.BalancingSettings.ENABLE_BALANCING_MARKET = False
+
+
+def _run_simulation(setup_module_name, hours, update_every_slot, live_past_market_count=None):
+    config = SimulationConfig(duration(hours=hours), duration(minutes=15), duration(minutes=1),
+                              market_count=1, cloud_coverage=0, market_maker_rate=30, iaa_fee=1,
+                              live_past_market_count=live_past_market_count)
+    simulation = Simulation(setup_module_name, config, seed=1)
+    for slot_no in range(config.total_ticks // config.ticks_per_slot):
+        for _ in range(config.ticks_per_slot):
+            simulation.area.tick(is_root_area=True)
+        if update_every_slot:
+            # Folds one more past market per update
+            simulation.endpoint_buffer.update_stats(simulation.area, "running")
+    return simulation
+
+
+@pytest.mark.parametrize('setup_module_name', [
+    'default_2a', 'default_3a', 'balancing_market.default_2a', 'tobalaba.one_producer_load'
+])
+def test_incremental_stats_are_identical_to_full_stats(enable_balancing_market,
+                                                       setup_module_name):
+    simulation = _run_simulation(setup_module_name, 24, update_every_slot=True)
+
+    full_endpoint_buffer = SimulationEndpointBuffer(None, simulation.initial_params)
+    full_endpoint_buffer.update_stats(simulation.area, "running")
+
+    assert any(market.trades for market in simulation.area.past_markets)
+    assert _buffer_contents(simulation.endpoint_buffer) == _buffer_contents(full_endpoint_buffer)
+    assert _buffer_contents(simulation.endpoint_buffer) == \
+        _approx(_reference_buffer_contents(simulation.area, simulation.endpoint_buffer))
+
+
+def test_stats_of_archived_markets_are_identical_to_stats_of_live_markets(
+        enable_balancing_market):
+    live = _run_simulation('balancing_market.default_2a', 6, update_every_slot=True)
+    archived = _run_simulation('balancing_market.default_2a', 6, update_every_slot=True,
+                               live_past_market_count=1)
+
+    assert isinstance(archived.area.past_markets[0], MarketSummary)
+    assert isinstance(archived.area.past_balancing_markets[0], MarketSummary)
+    assert _buffer_contents(archived.endpoint_buffer) == _buffer_contents(live.endpoint_buffer)
+    assert _buffer_contents(archived.endpoint_buffer) == \
+        _approx(_reference_buffer_contents(archived.area, archived.endpoint_buffer))
+
+
+def test_cumulative_grid_trades_report_loads_directly_under_the_grid():
+    simulation = _run_simulation('tobalaba.one_producer_load', 2, update_every_slot=False)
+    simulation.endpoint_buffer.update_stats(simulation.area, "running")
+
+    grid_trades = simulation.endpoint_buffer.cumulative_grid_trades["cumulative-grid-trades"]
+    # Produced energy, self consumption, and then consumption from other areas
+    assert any(entry["x"] == "Cell Tower" and entry["y"] > 0
+               for consumption_row in grid_trades[2:] for entry in consumption_row)
+
+
+def _approx_bills(bills):
+    return {
+        name: {key: _approx_bills(value) if key == 'children' else
+               value if key == 'type' else pytest.approx(value)
+               for key, value in bill.items()}
+        for name, bill in bills.items()
+    }
+
+
+@pytest.mark.parametrize('from_hour, to_hour', [
+    (None, None), (None, 2), (1, None), (1, 3), (1.25, 1.5), (2, 1), (5, 6)
+])
+def test_energy_bills_of_a_range_equal_the_bills_of_its_markets(from_hour, to_hour):
+    simulation = _run_simulation('default_2a', 4, update_every_slot=False)
+    simulation.endpoint_buffer.update_stats(simulation.area, "running")
+    folded_energy_bills = simulation.endpoint_buffer.folded_energy_bills
+    area = simulation.area
+    start = area.past_markets[0].time_slot
+
+    def slot(hour):
+        return None if hour is None else start + duration(minutes=hour * 60)
+
+    bills = folded_energy_bills.export(area, "past_markets", slot(from_hour), slot(to_hour))
+    assert bills == _approx_bills(energy_bills(area, "past_markets",
+                                               slot(from_hour), slot(to_hour)))
+    house = area.children[0]
+    assert folded_energy_bills.export(house, "past_markets", slot(from_hour), slot(to_hour)) == \
+        _approx_bills(energy_bills(house, "past_markets", slot(from_hour), slot(to_hour)))
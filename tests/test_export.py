@@ -0,0 +1,200 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+import re
+from threading import Event, Thread
+
+import pytest
+from pendulum import duration
+from slugify import slugify
+
+from d3a.d3a_core.export import ExportAndPlot
+from d3a.d3a_core.sim_results.file_export_endpoints import FileExportEndpoints
+from d3a.d3a_core.simulation import Simulation
+from d3a.models.config import SimulationConfig
+from d3a.models.const import ConstSettings
+
+
+_UUID = re.compile("[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+
+def _csv_files(directory):
+    files = {}
+    for root, _, file_names in os.walk(directory):
+        for file_name in file_names:
+            if file_name.endswith(".csv"):
+                path = os.path.join(root, file_name)
+                with open(path) as csv_file:
+                    files[os.path.relpath(path, directory)] = csv_file.read()
+    return files
+
+
+def test_parallel_export_writes_the_same_files_as_sequential_export(tmpdir):
+    config = SimulationConfig(duration(hours=4), duration(minutes=15), duration(minutes=1),
+                              market_count=1, cloud_coverage=0, market_maker_rate=30, iaa_fee=1)
+    simulation = Simulation('default_2a', config, seed=1)
+    for _ in range(config.total_ticks):
+        simulation.area.tick(is_root_area=True)
+
+    sequential = ExportAndPlot(simulation.area, str(tmpdir), "sequential", max_workers=1)
+    parallel = ExportAndPlot(simulation.area, str(tmpdir), "parallel", max_workers=3)
+
+    sequential_files = _csv_files(sequential.directory)
+    assert "grid/house-1-trades.csv" in sequential_files
+    assert "grid/house-1/h1-general-load.csv" in sequential_files
+    assert _csv_files(parallel.directory) == sequential_files
+
+    plot_dir = os.path.join(str(parallel.directory), "plot")
+    with open(os.path.join(plot_dir, "house-1", "energy_profile_house-1.html")) as plot_file:
+        plot = plot_file.read()
+    assert '<script src="../plotly.min.js"></script>' in plot
+    assert len(plot) < 100000
+    assert os.path.isfile(os.path.join(plot_dir, "plotly.min.js"))
+    assert os.path.isfile(os.path.join(plot_dir, "dashboard.html"))
+    assert sorted(os.listdir(os.path.join(plot_dir, "dashboard-data"))) == \
+        ["cell-tower.js", "grid.js", "house-1.js", "house-2.js"]
+
+
+def test_export_of_archived_markets_writes_the_same_files_as_export_of_live_markets(tmpdir):
+    exports = []
+    for live_past_market_count in (None, 1):
+        config = SimulationConfig(duration(hours=4), duration(minutes=15), duration(minutes=1),
+                                  market_count=1, cloud_coverage=0, market_maker_rate=30,
+                                  iaa_fee=1, live_past_market_count=live_past_market_count)
+        simulation = Simulation('default_2a', config, seed=1)
+        for _ in range(config.total_ticks):
+            simulation.area.tick(is_root_area=True)
+        exports.append(ExportAndPlot(simulation.area, str(tmpdir), str(live_past_market_count),
+                                     max_workers=1))
+
+    # The ids of trades and offers are random
+    live_files, archived_files = (
+        {path: _UUID.sub("<id>", content)
+         for path, content in _csv_files(export.directory).items()}
+        for export in exports
+    )
+    assert "grid/house-1-trades.csv" in live_files
+    assert archived_files == live_files
+
+
+def test_csv_export_is_not_forked_while_other_threads_run(tmpdir, monkeypatch):
+    config = SimulationConfig(duration(hours=2), duration(minutes=15), duration(minutes=1),
+                              market_count=1, cloud_coverage=0, market_maker_rate=30, iaa_fee=1)
+    simulation = Simulation('default_2a', config, seed=1)
+    for _ in range(config.total_ticks):
+        simulation.area.tick(is_root_area=True)
+    sequential = ExportAndPlot(simulation.area, str(tmpdir), "sequential", max_workers=1)
+
+    def fork_workers(self):
+        raise AssertionError("csv workers forked from a multi-threaded process")
+
+    monkeypatch.setattr(ExportAndPlot, "_export_csv_jobs_in_parallel", fork_workers)
+    stop = Event()
+    web_server = Thread(target=stop.wait)
+    web_server.start()
+    try:
+        threaded = ExportAndPlot(simulation.area, str(tmpdir), "threaded", max_workers=3)
+    finally:
+        stop.set()
+        web_server.join()
+    assert _csv_files(threaded.directory) == _csv_files(sequential.directory)
+
+
+@pytest.mark.parametrize('setup_module_name', ['default_3a', 'balancing_market.default_2a'])
+def test_progressive_export_writes_the_same_files_as_final_export(tmpdir, setup_module_name):
+    ConstSettings.BalancingSettings.ENABLE_BALANCING_MARKET = True
+    config = SimulationConfig(duration(hours=4), duration(minutes=15), duration(minutes=1),
+                              market_count=1, cloud_coverage=0, market_maker_rate=30, iaa_fee=1)
+    simulation = Simulation(setup_module_name, config, seed=1, progressive_export=True,
+                            export_path=str(tmpdir))
+    try:
+        simulation.run_batch()
+    finally:
+        ConstSettings.BalancingSettings.ENABLE_BALANCING_MARKET = False
+
+    final = ExportAndPlot(simulation.area, str(tmpdir), "final", max_workers=1)
+
+    progressive_files = _csv_files(os.path.join(str(tmpdir), simulation._export_subdir))
+    assert "grid/house-1-trades.csv" in progressive_files
+    assert progressive_files == _csv_files(final.directory)
+
+
+@pytest.fixture
+def market_type(request):
+    previous_market_type = ConstSettings.IAASettings.MARKET_TYPE
+    ConstSettings.IAASettings.MARKET_TYPE = request.param
+    yield request.param
+    ConstSettings.IAASettings.MARKET_TYPE = previous_market_type
+
+
+def _traded_energy_per_trade(area, past_markets):
+    out_dict = {"sold_energy": {}, "bought_energy": {}}
+    for market in past_markets:
+        for trade in market.trades:
+            for key, actor in (("sold_energy", trade.seller), ("bought_energy", trade.buyer)):
+                actor_slug = slugify(actor, to_lower=True)
+                if actor_slug not in out_dict[key]:
+                    out_dict[key][actor_slug] = dict((m.time_slot, 0) for m in area.past_markets)
+                out_dict[key][actor_slug][market.time_slot] += trade.offer.energy
+    return out_dict
+
+
+def _buyer_seller_trades_per_trade(area, buyer_trades, seller_trades):
+    labels = ("slot", "rate [ct./kWh]", "energy [kWh]", "seller")
+    for child in area.children:
+        _buyer_seller_trades_per_trade(child, buyer_trades, seller_trades)
+    for market in area.past_markets:
+        for trade in market.trades:
+            buyer_slug = slugify(trade.buyer, to_lower=True)
+            seller_slug = slugify(trade.seller, to_lower=True)
+            if buyer_slug not in buyer_trades:
+                buyer_trades[buyer_slug] = dict((key, []) for key in labels)
+            if seller_slug not in seller_trades:
+                seller_trades[seller_slug] = dict((key, []) for key in labels)
+            else:
+                values = (market.time_slot, round(trade.offer.price / trade.offer.energy, 4),
+                          trade.offer.energy * -1, seller_slug)
+                for ii, ri in enumerate(labels):
+                    buyer_trades[buyer_slug][ri].append(values[ii])
+                    seller_trades[seller_slug][ri].append(values[ii])
+
+
+@pytest.mark.parametrize('market_type', [2, 3], indirect=True)
+def test_file_export_reports_trades_by_their_seller(market_type):
+    config = SimulationConfig(duration(hours=6), duration(minutes=15), duration(seconds=30),
+                              market_count=4, cloud_coverage=0, market_maker_rate=30, iaa_fee=1)
+    simulation = Simulation('default_2a', config, seed=1)
+    for _ in range(config.total_ticks):
+        simulation.area.tick(is_root_area=True)
+
+    endpoints = FileExportEndpoints(simulation.area)
+    areas = [simulation.area] + simulation.area.children
+    for area in areas:
+        if not area.children:
+            continue
+        expected = _traded_energy_per_trade(area, area.past_markets)
+        assert endpoints.traded_energy[area.slug]["sold_energy"] == expected["sold_energy"]
+        assert endpoints.traded_energy[area.slug]["bought_energy"] == \
+            expected["bought_energy"]
+    assert any(trade.seller != trade.offer.seller
+               for area in areas for market in area.past_markets for trade in market.trades)
+
+    buyer_trades, seller_trades = {}, {}
+    _buyer_seller_trades_per_trade(simulation.area, buyer_trades, seller_trades)
+    assert endpoints.buyer_trades == buyer_trades
+    assert endpoints.seller_trades == seller_trades
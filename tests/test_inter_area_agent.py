@@ -15,12 +15,14 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
+import random
 import pytest
 
 import pendulum
 
 from d3a.constants import TIME_FORMAT
 from d3a.constants import TIME_ZONE
+from d3a.events.event_structures import MarketEvent
 from d3a.models.area import DEFAULT_CONFIG
 from d3a.models.market.market_structures import Offer, Trade, Bid
 from d3a.models.strategy.area_agents.one_sided_agent import OneSidedAgent
@@ -74,7 +76,8 @@ class FakeMarket:
     def bids(self):
         return {bid.id: bid for bid in self._bids}
 
-    def accept_offer(self, offer, buyer, *, energy=None, time=None, price_drop=False):
+    def accept_offer(self, offer_or_id, buyer, *, energy=None, time=None, price_drop=False):
+        offer = offer_or_id
         self.calls_energy.append(energy)
         self.calls_offers.append(offer)
         if energy < offer.energy:
@@ -135,6 +138,24 @@ def test_iaa_forwards_offers(iaa):
     assert iaa.higher_market.offer_count == 1
 
 
+def test_iaa_is_idle_until_the_next_event(iaa):
+    assert iaa.idle
+    iaa.event_listener(MarketEvent.OFFER, market_id=iaa.lower_market.id,
+                       offer=Offer('id4', 1, 1, 'other'))
+    assert not iaa.idle
+
+
+def test_iaa_is_not_idle_while_offers_are_too_young(iaa):
+    iaa.lower_market.sorted_offers.append(Offer('id4', 1, 1, 'other'))
+    iaa.event_tick(area=iaa.owner)
+    assert not iaa.idle
+    iaa.owner.current_tick += 1
+    iaa.event_tick(area=iaa.owner)
+    assert iaa.lower_market.offer_count == 2
+    assert iaa.higher_market.offer_count == 2
+    assert iaa.idle
+
+
 def test_iaa_forwarded_offers_complied_to_transfer_fee_percentage(iaa):
     iaa_per_fee = ((iaa.higher_market.forwarded_offer.price -
                     iaa.lower_market.sorted_offers[-1].price) /
@@ -409,6 +430,39 @@ def test_iaa_double_sided_performs_pay_as_bid_matching(iaa_double_sided_2):
     assert offer == list(iaa_double_sided_2.lower_market.offers.values())[0]
 
 
+def _nested_loop_pay_as_bid_matching(bids, offers):
+    sorted_bids = list(reversed(sorted(bids, key=lambda b: b.price / b.energy)))
+    sorted_offers = list(reversed(sorted(offers, key=lambda o: o.price / o.energy)))
+    already_selected_bids = set()
+    for offer in sorted_offers:
+        for bid in sorted_bids:
+            if bid.id not in already_selected_bids and \
+               offer.price / offer.energy <= bid.price / bid.energy and \
+               offer.seller != bid.buyer:
+                already_selected_bids.add(bid.id)
+                yield bid, offer
+                break
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_iaa_double_sided_pay_as_bid_matching_on_random_books(iaa_double_sided_2, seed):
+    rng = random.Random(seed)
+    actors = ['A', 'B', 'C', 'D'][:rng.randint(1, 4)]
+    energies = [0.5, 1, 2, 3]
+    offers = [Offer(f'id{i}', rng.randint(1, 30) * rng.choice(energies), 1, rng.choice(actors))
+              for i in range(rng.randint(0, 40))]
+    bids = [Bid(f'bid_id{i}', rng.randint(1, 30) * rng.choice(energies), rng.choice(energies),
+                rng.choice(actors), 'S')
+            for i in range(rng.randint(0, 40))]
+    iaa_double_sided_2.lower_market.sorted_offers = offers
+    iaa_double_sided_2.lower_market._bids = bids
+    low_high_engine = next(filter(lambda e: e.name == "Low -> High",
+                                  iaa_double_sided_2.engines))
+
+    matched = list(low_high_engine._perform_pay_as_bid_matching())
+    assert matched == list(_nested_loop_pay_as_bid_matching(bids, offers))
+
+
 @pytest.fixture
 def iaa_double_sided_pay_as_clear():
     from d3a.models.const import ConstSettings
@@ -424,13 +478,23 @@ def iaa_double_sided_pay_as_clear():
     ConstSettings.IAASettings.MARKET_TYPE = 1
 
 
+@pytest.fixture
+def pay_as_clear_algorithm(request):
+    previous_algorithm = ConstSettings.IAASettings.PAY_AS_CLEAR_ALGORITHM
+    ConstSettings.IAASettings.PAY_AS_CLEAR_ALGORITHM = request.param
+    yield request.param
+    ConstSettings.IAASettings.PAY_AS_CLEAR_ALGORITHM = previous_algorithm
+
+
+@pytest.mark.parametrize("pay_as_clear_algorithm", [1, 2], indirect=True)
 @pytest.mark.parametrize("offer, bid, MCP", [
     ([1, 2, 3, 4, 5, 6, 7], [1, 2, 3, 4, 5, 6, 7], 4),
     ([8, 9, 10, 11, 12, 13, 14], [8, 9, 10, 11, 12, 13, 14], 11),
     ([2, 3, 3, 5, 6, 7, 8], [1, 2, 3, 4, 5, 6, 7], 5),
 ])
 def test_iaa_double_sided_performs_pay_as_clear_matching(iaa_double_sided_pay_as_clear,
-                                                         offer, bid, MCP):
+                                                         offer, bid, MCP,
+                                                         pay_as_clear_algorithm):
     low_high_engine = \
         next(filter(lambda e: e.name == "Low -> High", iaa_double_sided_pay_as_clear.engines))
     iaa_double_sided_pay_as_clear.lower_market.sorted_offers = \
@@ -455,6 +519,47 @@ def test_iaa_double_sided_performs_pay_as_clear_matching(iaa_double_sided_pay_as
     assert matched == MCP
 
 
+@pytest.mark.parametrize("pay_as_clear_algorithm", [2], indirect=True)
+def test_iaa_double_sided_pay_as_clear_vectorized_clears_on_exact_rates(
+        iaa_double_sided_pay_as_clear, pay_as_clear_algorithm):
+    low_high_engine = \
+        next(filter(lambda e: e.name == "Low -> High", iaa_double_sided_pay_as_clear.engines))
+    iaa_double_sided_pay_as_clear.lower_market.sorted_offers = \
+        [Offer('id1', 2.5, 1, 'other'),
+         Offer('id2', 5.4, 2, 'other'),
+         Offer('id3', 4.1, 1, 'other')]
+    iaa_double_sided_pay_as_clear.lower_market._bids = \
+        [Bid('bid_id1', 2.6, 1, 'B', 'S'),
+         Bid('bid_id2', 8.4, 3, 'B', 'S'),
+         Bid('bid_id3', 1.5, 1, 'B', 'S')]
+
+    clearing_rate, clearing_energy = low_high_engine._perform_pay_as_clear_matching()
+    assert clearing_rate == 2.7
+    assert clearing_energy == 3
+    assert [o.id for o in low_high_engine.sorted_offers] == ['id1', 'id2', 'id3']
+    assert [b.id for b in low_high_engine.sorted_bids] == ['bid_id2', 'bid_id1', 'bid_id3']
+
+
+@pytest.mark.parametrize("pay_as_clear_algorithm", [1, 2], indirect=True)
+def test_iaa_double_sided_pay_as_clear_accepts_the_cleared_energy_of_each_order(
+        iaa_double_sided_pay_as_clear, pay_as_clear_algorithm):
+    low_high_engine = \
+        next(filter(lambda e: e.name == "Low -> High", iaa_double_sided_pay_as_clear.engines))
+    iaa_double_sided_pay_as_clear.lower_market.sorted_offers = \
+        [Offer('id1', 2, 2, 'other'),
+         Offer('id2', 2, 1, 'other')]
+    iaa_double_sided_pay_as_clear.lower_market._bids = \
+        [Bid('bid_id1', 3, 1, 'B', 'S')]
+
+    low_high_engine._match_offers_bids()
+    lower_market = iaa_double_sided_pay_as_clear.lower_market
+    assert [o.id for o in lower_market.calls_offers] == ['id1']
+    assert lower_market.calls_energy == [1]
+    assert [b.id for b in lower_market.calls_bids] == ['bid_id1']
+    assert lower_market.calls_energy_bids == [1]
+    assert lower_market.calls_bids_price == [1]
+
+
 def test_iaa_double_sided_match_offer_bids(iaa_double_sided_2):
     iaa_double_sided_2.lower_market.calls_offers = []
     iaa_double_sided_2.lower_market.calls_bids = []
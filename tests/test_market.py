@@ -15,6 +15,7 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
+import random
 import string
 from collections import defaultdict
 
@@ -34,6 +35,8 @@ from d3a.d3a_core.exceptions import InvalidOffer, MarketReadOnlyException, \
 from d3a.models.market.two_sided_pay_as_bid import TwoSidedPayAsBid
 from d3a.models.market.one_sided import OneSidedMarket
 from d3a.models.market.balancing import BalancingMarket
+from d3a.models.market.trade_log import TradeLog, RESIDUAL, PRICE_DROP, FROM_BID
+from d3a.models.market.market_structures import Offer, Trade
 from d3a.models.const import ConstSettings
 
 from d3a.d3a_core.device_registry import DeviceRegistry
@@ -311,6 +314,60 @@ def test_market_trade_bid_partial(market: TwoSidedPayAsBid):
     assert market.bids[bid.id].buyer == 'A'
 
 
+def test_market_trades_are_recorded_in_the_trade_log():
+    trade_log = TradeLog()
+    time_slot = DateTime.now(tz=TIME_ZONE)
+    market = TwoSidedPayAsBid(time_slot, area=FakeArea("FakeArea"), trade_log=trade_log)
+    offer = market.offer(20, 10, 'IAA seller')
+    offer_trade = market.accept_offer(offer, 'buyer', energy=5)
+    bid = market.bid(12, 4, 'buyer', 'bid seller')
+    bid_trade = market.accept_bid(bid, energy=4, seller='IAA seller')
+
+    assert len(trade_log) == 2
+    assert list(trade_log.rows_of_slot(time_slot)) == [0, 1]
+    assert trade_log.actors == ['IAA seller', 'buyer', 'bid seller']
+    assert trade_log.actor_slugs == ['iaa-seller', 'buyer', 'bid-seller']
+    assert trade_log.actor_area_names == ['seller', 'buyer', 'bid seller']
+    assert list(trade_log.seller_id) == [0, 2]
+    assert list(trade_log.trade_seller_id) == [0, 0]
+    assert list(trade_log.buyer_id) == [1, 1]
+    assert list(trade_log.energy) == [5, 4]
+    assert list(trade_log.price) == [10, 12]
+    assert list(trade_log.rate) == [2, 3]
+    assert list(trade_log.flags) == [RESIDUAL, PRICE_DROP | FROM_BID]
+    assert not trade_log.rows_of_slot(time_slot.add(minutes=15))
+    assert [trade_log.trade_ids[row] for row in range(2)] == [offer_trade.id, bid_trade.id]
+    assert [trade_log.offer_ids[row] for row in range(2)] == \
+        [offer_trade.offer.id, bid_trade.offer.id]
+    assert [trade_log.time(row) for row in range(2)] == [offer_trade.time, bid_trade.time]
+
+
+def test_trade_log_rebuilds_the_trades_of_its_rows():
+    trade_log = TradeLog()
+    time_slot = DateTime.now(tz=TIME_ZONE)
+    market = TwoSidedPayAsBid(time_slot, area=FakeArea("FakeArea"), trade_log=trade_log)
+    offer = market.offer(20, 10, 'IAA seller')
+    offer_trade = market.accept_offer(offer, 'buyer', energy=5)
+    bid = market.bid(12, 4, 'buyer', 'bid seller')
+    bid_trade = market.accept_bid(bid, energy=4, seller='IAA seller')
+    # Ids that are not uuids are kept as they are
+    trade_log.append(time_slot, Trade('id', offer_trade.time, Offer('offer id', 2, 1, 'A'),
+                                      'A', 'B'))
+
+    trades = list(trade_log.trades(trade_log.rows_of_slot(time_slot)))
+    assert len(trades) == 3
+    assert trades[0] == offer_trade._replace(offer=trades[0].offer, residual=True)
+    assert (trades[0].offer.id, trades[0].offer.energy, trades[0].offer.price,
+            trades[0].offer.seller, trades[0].offer.market) == \
+        (offer.id, 5, 10, 'IAA seller', None)
+    assert trades[1] == bid_trade._replace(offer=bid_trade.offer._replace(market=None))
+    assert (trades[2].id, trades[2].offer.id, trades[2].residual) == ('id', 'offer id', None)
+    rows = trade_log.rows_of_slot(time_slot)
+    assert [trade.id for trade in trade_log.trades_of(rows, 'IAA seller')] == \
+        [offer_trade.id, bid_trade.id]
+    assert trade_log.trades_of(rows, 'unknown') == []
+
+
 def test_market_accept_bid_emits_bid_traded_and_bid_deleted_event(market: TwoSidedPayAsBid,
                                                                   called):
     market.add_listener(called)
@@ -418,6 +475,26 @@ def test_market_avg_offer_price_empty(market):
     assert market.avg_offer_price == 0
 
 
+def test_market_offer_price_stats_follow_the_open_offers(market: OneSidedMarket):
+    offer1 = market.offer(1, 1, 'A')
+    offer2 = market.offer(9, 3, 'A')
+    offer3 = market.offer(10, 2, 'A')
+    assert (market.min_offer_price, market.avg_offer_price, market.max_offer_price) == \
+        (1, 3.3333, 5)
+
+    market.delete_offer(offer3)
+    assert (market.min_offer_price, market.avg_offer_price, market.max_offer_price) == \
+        (1, 2.5, 3)
+
+    market.accept_offer(offer2, 'B', energy=1)
+    assert (market.min_offer_price, market.avg_offer_price, market.max_offer_price) == \
+        (1, 2.3333, 3)
+
+    market.accept_offer(offer1, 'B')
+    assert (market.min_offer_price, market.avg_offer_price, market.max_offer_price) == \
+        (3, 3, 3)
+
+
 @pytest.mark.parametrize("market, offer", [
     (OneSidedMarket(), "offer"),
     (BalancingMarket(), "balancing_offer")
@@ -432,6 +509,30 @@ def test_market_sorted_offers(market, offer):
     assert [o.price for o in market.sorted_offers] == [1, 2, 3, 4, 5]
 
 
+@pytest.mark.parametrize("market, offer, delete_offer", [
+    (OneSidedMarket, "offer", "delete_offer"),
+    (BalancingMarket, "balancing_offer", "delete_balancing_offer")
+])
+def test_market_sorted_offers_after_delete_and_partial_trade(market, offer, delete_offer):
+    market = market(area=FakeArea('fake_house'))
+    offer_5 = getattr(market, offer)(5, 1, 'A')
+    offer_3 = getattr(market, offer)(3, 1, 'A')
+    getattr(market, offer)(1, 1, 'A')
+    offer_8 = getattr(market, offer)(8, 2, 'A')
+    getattr(market, offer)(2, 1, 'A')
+
+    sorted_before = market.sorted_offers
+    getattr(market, delete_offer)(offer_3)
+    # Price modified in place after the offer was posted, it must still be removable
+    offer_5.price = 0.5
+    getattr(market, delete_offer)(offer_5)
+    market.accept_offer(offer_8, 'B', energy=1)
+
+    assert [o.id for o in sorted_before][2:4] == [offer_3.id, offer_8.id]
+    assert [o.price for o in market.sorted_offers] == [1, 2, 4]
+    assert len(market.sorted_offers) == len(market.offers)
+
+
 @pytest.mark.parametrize("market, offer", [
     (OneSidedMarket(), "offer"),
     (BalancingMarket(), "balancing_offer")
@@ -470,6 +571,30 @@ def test_market_listeners_add(market, offer, add_listener, called):
     assert len(called.calls) == 1
 
 
+@pytest.fixture
+def delivery_order(request):
+    previous_delivery_order = ConstSettings.GeneralSettings.EVENT_DELIVERY_ORDER
+    ConstSettings.GeneralSettings.EVENT_DELIVERY_ORDER = request.param
+    yield request.param
+    ConstSettings.GeneralSettings.EVENT_DELIVERY_ORDER = previous_delivery_order
+
+
+@pytest.mark.parametrize("delivery_order", [1, 2], indirect=True)
+def test_market_listeners_are_notified_in_a_fair_order(delivery_order):
+    random.seed(1)
+    market = OneSidedMarket(area=FakeArea('fake_house'))
+    first_notified = []
+    for name in 'ABC':
+        market.add_listener(lambda *args, name=name, **kwargs: first_notified.append(name))
+    for _ in range(30):
+        market.offer(10, 20, 'A')
+
+    first_notified = first_notified[::3]
+    assert set(first_notified) == set('ABC')
+    if delivery_order == 2:
+        assert first_notified == list('BCA') * 10
+
+
 @pytest.mark.parametrize("market, offer, add_listener, event", [
     (OneSidedMarket(), "offer", "add_listener", MarketEvent.OFFER),
     (BalancingMarket(), "balancing_offer", "add_listener", MarketEvent.BALANCING_OFFER)
@@ -605,6 +730,20 @@ class MarketStateMachine(RuleBasedStateMachine):
             assert self.market.traded_energy[actor] == sum_
         assert sum(self.market.traded_energy.values()) == 0
 
+    @precondition(lambda self: self.market.trades)
+    @rule()
+    def check_actor_trades(self):
+        actors = {t.seller for t in self.market.trades} | {t.buyer for t in self.market.trades}
+        for actor in actors:
+            bought = [t for t in self.market.trades if t.buyer == actor]
+            sold = [t for t in self.market.trades if t.seller == actor]
+            assert self.market.bought_energy(actor) == sum(t.offer.energy for t in bought)
+            assert self.market.sold_energy(actor) == sum(t.offer.energy for t in sold)
+            assert self.market.total_spent(actor) == sum(t.offer.price for t in bought)
+            assert self.market.total_earned(actor) == sum(t.offer.price for t in sold)
+            assert self.market.trades_of(actor) == \
+                [t for t in self.market.trades if actor in (t.buyer, t.seller)]
+
     @precondition(lambda self: self.market.traded_energy)
     @rule()
     def check_iou_balance(self):
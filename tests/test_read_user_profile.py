@@ -0,0 +1,117 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import os
+import pickle
+from operator import itemgetter
+from datetime import datetime
+from statistics import mean
+
+import pytest
+from pendulum import duration
+
+from d3a.constants import TIME_FORMAT
+from d3a.d3a_core.util import d3a_path
+from d3a.models.read_user_profile import InputProfileTypes, TimeOfDayProfile, \
+    _calculate_energy_from_power_profile, _readCSV, default_profile_dict, read_arbitrary_profile
+
+
+def _energy_per_second_of_the_day(profile_data_W, slot_length):
+    # Power of every second of the day, averaged per slot
+    time0 = datetime.utcfromtimestamp(0)
+    times_sec = [(datetime.strptime(time_str, TIME_FORMAT) - time0).seconds
+                 for time_str in profile_data_W.keys()]
+    times_sec.append(24 * 60 * 60)
+    power_W = list(profile_data_W.values())
+    power_per_second_W = [power_W[index - 1]
+                          for index, seconds in enumerate(times_sec)
+                          for _ in range(seconds - times_sec[index - 1])]
+    slot_sec = slot_length.seconds
+    return {
+        datetime.utcfromtimestamp(slot_start).strftime(TIME_FORMAT):
+            mean(power_per_second_W[slot_start:slot_start + slot_sec]) / 1000.0 /
+            (duration(hours=1) / slot_length)
+        for slot_start in range(0, 24 * 60 * 60, slot_sec)
+    }
+
+
+@pytest.mark.parametrize("profile_file", ["LOAD_DATA_1.csv", "Solar_Curve_W_sunny.csv",
+                                          "SAM_SF_Summer.csv"])
+@pytest.mark.parametrize("slot_minutes", [1, 15, 25, 60])
+def test_energy_from_power_profile_matches_power_per_second(profile_file, slot_minutes):
+    profile_data_W = _readCSV(os.path.join(d3a_path, "resources", profile_file))
+    slot_length = duration(minutes=slot_minutes)
+    expected = _energy_per_second_of_the_day(profile_data_W, slot_length)
+    energy_kWh = _calculate_energy_from_power_profile(profile_data_W, slot_length)
+    assert list(energy_kWh.keys()) == list(expected.keys())
+    assert list(energy_kWh.values()) == pytest.approx(list(expected.values()), rel=1e-12)
+
+
+def test_energy_from_power_profile_integrates_steps_within_slots():
+    energy_kWh = read_arbitrary_profile(InputProfileTypes.POWER,
+                                        {"00:00": 1000, "00:10": 4000, "23:50": 0},
+                                        slot_length=duration(minutes=25))
+    assert energy_kWh["00:00"] == pytest.approx((10 * 1000 + 15 * 4000) / 60 / 1000)
+    assert energy_kWh["00:25"] == pytest.approx(25 * 4000 / 60 / 1000)
+    # The average power of the last slot of the day is taken until midnight
+    assert energy_kWh["23:45"] == pytest.approx(5 * 4000 / 15 * 25 / 60 / 1000)
+    assert len(energy_kWh) == 58
+
+
+def test_profile_store_shares_read_only_profiles(tmpdir):
+    csv_file = tmpdir.join("profile.csv")
+    csv_file.write("Interval;Power(W)\n00:00;100\n12:00;200\n")
+    slot_length = duration(minutes=15)
+
+    profile = read_arbitrary_profile(InputProfileTypes.POWER, str(csv_file), slot_length)
+    assert read_arbitrary_profile(InputProfileTypes.POWER, str(csv_file), slot_length) \
+        is profile
+    assert read_arbitrary_profile(InputProfileTypes.POWER, str(csv_file),
+                                  duration(minutes=30)) is not profile
+    assert read_arbitrary_profile(InputProfileTypes.IDENTITY, 12) is \
+        read_arbitrary_profile(InputProfileTypes.IDENTITY, 12, slot_length)
+    assert isinstance(read_arbitrary_profile(InputProfileTypes.IDENTITY, 12.0)["00:00"], float)
+    with pytest.raises(TypeError):
+        profile["00:00"] = 0
+    assert pickle.loads(pickle.dumps(profile)) == profile
+
+    # A changed csv file is read again
+    csv_file.write("Interval;Power(W)\n00:00;100\n12:00;400\n")
+    os.utime(str(csv_file), ns=(0, os.stat(str(csv_file)).st_mtime_ns + 10 ** 9))
+    changed_profile = \
+        read_arbitrary_profile(InputProfileTypes.POWER, str(csv_file), slot_length)
+    assert changed_profile["12:00"] == 2 * profile["12:00"]
+
+
+def test_rate_profiles_are_time_of_day_profiles():
+    profile = read_arbitrary_profile(InputProfileTypes.IDENTITY, {0: (20, 22), 12: (25, 26)})
+    assert isinstance(profile, TimeOfDayProfile)
+    assert len(profile) == 1440
+    assert list(profile.keys()) == list(default_profile_dict().keys())
+    assert profile["11:59"] == (20, 22)
+    assert profile["12:00"] == profile.at_minute(12 * 60) == (25, 26)
+    assert "24:00" not in profile
+    with pytest.raises(KeyError):
+        profile["24:00"]
+    with pytest.raises(TypeError):
+        profile["00:00"] = (1, 2)
+
+    assert profile.map(itemgetter(1)) == {time_str: 22 if time_str < "12:00" else 26
+                                          for time_str in default_profile_dict()}
+    assert pickle.loads(pickle.dumps(profile)) == profile
+    rates = profile.map(itemgetter(0))
+    assert read_arbitrary_profile(InputProfileTypes.IDENTITY, str(rates)) == rates
@@ -0,0 +1,135 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import json
+import zlib
+from threading import Thread
+
+import pytest
+
+from d3a.d3a_core.redis_communication import ResultPublisher, apply_report_changes, \
+    report_changes
+from d3a.models.const import ConstSettings
+
+
+class FakeRedis:
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, channel, message):
+        self.messages.append(message)
+
+
+@pytest.fixture
+def publish_changes():
+    ConstSettings.GeneralSettings.REDIS_PUBLISH_MODE = 2
+    yield
+    ConstSettings.GeneralSettings.REDIS_PUBLISH_MODE = 1
+    ConstSettings.GeneralSettings.REDIS_PUBLISH_COMPRESSION = False
+    ConstSettings.GeneralSettings.REDIS_PUBLISH_MIN_INTERVAL = 0
+
+
+def _report(slot_count, spent):
+    return {
+        "job_id": "job",
+        "price_energy_day": [{"slot": slot, "av_price": 30} for slot in range(slot_count)],
+        "bills": {"House 1": {"spent": spent, "earned": 1.0},
+                  "House 2": {"spent": 2.0, "earned": 3.0}},
+        "status": "running"
+    }
+
+
+def test_report_changes_contain_only_new_rows_and_changed_entries():
+    changes = report_changes(_report(2, 1.0), _report(3, 1.5))
+
+    assert changes == [
+        {"op": "extend", "path": ["price_energy_day"], "value": [{"slot": 2, "av_price": 30}]},
+        {"op": "set", "path": ["bills", "House 1", "spent"], "value": 1.5},
+    ]
+    assert apply_report_changes(_report(2, 1.0), changes) == _report(3, 1.5)
+
+
+def test_report_changes_delete_removed_keys():
+    previous = _report(1, 1.0)
+    current = _report(1, 1.0)
+    del current["bills"]["House 2"]
+
+    assert report_changes(previous, current) == [{"op": "delete", "path": ["bills", "House 2"]}]
+    assert apply_report_changes(previous, report_changes(previous, current)) == current
+
+
+def test_publisher_sends_changes_between_full_reports(publish_changes):
+    publisher = ResultPublisher(FakeRedis(), "d3a-results")
+    publisher.publish(_report(1, 1.0))
+    publisher.publish(_report(2, 1.0))
+    publisher.resync()
+    publisher.publish(_report(3, 1.0))
+    publisher.publish(_report(4, 1.0), final=True)
+
+    messages = [json.loads(message) for message in publisher.redis_db.messages]
+    assert messages[0] == {"sequence": 1, **_report(1, 1.0)}
+    assert messages[1] == {
+        "job_id": "job", "sequence": 2, "base_sequence": 1,
+        "changes": [{"op": "extend", "path": ["price_energy_day"],
+                     "value": [{"slot": 1, "av_price": 30}]}]
+    }
+    assert messages[2] == {"sequence": 3, **_report(3, 1.0)}
+    assert messages[3] == {"sequence": 4, **_report(4, 1.0)}
+
+
+class ResyncingRedis(FakeRedis):
+    # Requests a resync from another thread while the first message is published
+    def __init__(self):
+        super().__init__()
+        self.publisher = None
+        self.resync_thread = None
+        self.resync_waited_for_publish = None
+
+    def publish(self, channel, message):
+        super().publish(channel, message)
+        if self.resync_thread is None:
+            self.resync_thread = Thread(target=self.publisher.resync)
+            self.resync_thread.start()
+            self.resync_thread.join(0.1)
+            self.resync_waited_for_publish = self.resync_thread.is_alive()
+
+
+def test_publisher_resyncs_after_the_message_being_published(publish_changes):
+    redis_db = ResyncingRedis()
+    publisher = redis_db.publisher = ResultPublisher(redis_db, "d3a-results")
+    publisher.publish(_report(1, 1.0))
+    redis_db.resync_thread.join()
+    publisher.publish(_report(2, 1.0))
+
+    assert redis_db.resync_waited_for_publish
+    messages = [json.loads(message) for message in redis_db.messages]
+    assert messages[1] == {"sequence": 2, **_report(2, 1.0)}
+
+
+def test_publisher_throttles_intermediate_results(publish_changes):
+    ConstSettings.GeneralSettings.REDIS_PUBLISH_MIN_INTERVAL = 3600
+    ConstSettings.GeneralSettings.REDIS_PUBLISH_COMPRESSION = True
+    publisher = ResultPublisher(FakeRedis(), "d3a-results")
+    publisher.publish(_report(1, 1.0))
+    publisher.publish(_report(2, 1.0))
+    publisher.publish(_report(3, 2.0))
+    publisher.publish(_report(4, 2.0), final=True)
+
+    messages = [json.loads(zlib.decompress(message).decode("utf-8"))
+                for message in publisher.redis_db.messages]
+    assert [message["sequence"] for message in messages] == [1, 2]
+    assert messages[1] == {"sequence": 2, **_report(4, 2.0)}
@@ -0,0 +1,162 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import pytest
+from flask import Flask
+from pendulum import duration
+
+from d3a.d3a_core.sim_results.rest_endpoints import etag_response, market_endpoint_stats, \
+    market_etag, market_results_endpoint_stats, snapshot_etag
+from d3a.d3a_core.sim_results.rest_snapshot import RestSnapshots, market_details, total_traded
+from d3a.d3a_core.simulation import Simulation
+from d3a.models.config import SimulationConfig
+from d3a.models.const import ConstSettings
+
+
+@pytest.fixture
+def small_market_cache():
+    cache_size = ConstSettings.GeneralSettings.REST_MARKET_CACHE_SIZE
+    ConstSettings.GeneralSettings.REST_MARKET_CACHE_SIZE = 2
+    yield
+    ConstSettings.GeneralSettings.REST_MARKET_CACHE_SIZE = cache_size
+
+
+def _simulation(hours, live_past_market_count=None):
+    config = SimulationConfig(duration(hours=hours), duration(minutes=15), duration(minutes=1),
+                              market_count=1, cloud_coverage=0, market_maker_rate=30, iaa_fee=1,
+                              live_past_market_count=live_past_market_count)
+    return Simulation('default_2a', config, seed=1)
+
+
+def _run_slots(simulation, slot_count, snapshots):
+    for _ in range(slot_count):
+        for _ in range(simulation.simulation_config.ticks_per_slot):
+            simulation.area.tick(is_root_area=True)
+        simulation.endpoint_buffer.update_stats(simulation.area, "running")
+        snapshots.publish(simulation.area, simulation.endpoint_buffer)
+
+
+def _snapshot_contents(snapshot):
+    return {
+        slug: {
+            'closed': [(area_snapshot.closed.overview(time_slot),
+                        area_snapshot.closed.details(time_slot))
+                       for time_slot in area_snapshot.closed.time_slots],
+            'current': area_snapshot.current,
+            'open': area_snapshot.open,
+            'results': area_snapshot.results,
+            'bills': snapshot.energy_bills.export(area_snapshot.area, "past_markets",
+                                                  last_slot=snapshot.last_slot)
+        }
+        for slug, area_snapshot in snapshot.areas.items()
+    }
+
+
+def test_published_snapshot_does_not_change_while_the_simulation_runs():
+    simulation = _simulation(3)
+    snapshots = RestSnapshots()
+    _run_slots(simulation, 4, snapshots)
+    snapshot = snapshots.current
+    contents = _snapshot_contents(snapshot)
+    house = snapshot.area('house-1')
+    assert house.closed.time_slots + [house.current.time_slot] == \
+        [market.time_slot for market in simulation.area.child_by_slug['house-1'].past_markets]
+    assert snapshot.energy_bills.export(simulation.area, "past_markets") == \
+        contents['grid']['bills']
+
+    _run_slots(simulation, 4, snapshots)
+    assert snapshots.current.version == snapshot.version + 4
+    assert len(snapshots.current.area('house-1').closed) == len(house.closed) + 4
+    assert _snapshot_contents(snapshot) == contents
+
+
+def test_closed_markets_are_serialised_once_and_evicted_least_recently_used_first(
+        small_market_cache):
+    simulation = _simulation(2)
+    snapshots = RestSnapshots()
+    _run_slots(simulation, 5, snapshots)
+    closed = snapshots.current.area('house-1').closed
+    first, second, third = closed.time_slots[:3]
+    details = closed.details(first)
+    assert details == market_details(closed.market(first))
+    assert closed.details(first) is details
+    closed.details(second)
+    closed.details(first)
+    closed.details(third)
+    # second was the least recently used
+    assert closed.details(first) is details
+    assert closed._stats._details.cache_info().currsize == 2
+
+
+def test_market_results_read_the_volumes_without_serialising_closed_markets():
+    simulation = _simulation(2)
+    snapshots = RestSnapshots()
+    _run_slots(simulation, 5, snapshots)
+    house = snapshots.current.area('house-1')
+    results = market_results_endpoint_stats(house)
+    assert results['slots'] == [
+        {'volume': total_traded(market)}
+        for market in simulation.area.child_by_slug['house-1'].past_markets
+    ]
+    assert house.closed._stats._overview.cache_info().currsize == 0
+
+
+def test_market_endpoint_pages_and_answers_unchanged_markets_with_not_modified():
+    simulation = _simulation(2)
+    snapshots = RestSnapshots()
+    _run_slots(simulation, 5, snapshots)
+    app = Flask(__name__)
+    app.add_url_rule("/<area_slug>/market/<market_time>", 'market')
+    snapshot = snapshots.current
+    market_time = str(snapshot.area('house-1').closed.time_slots[-1])
+    url = "/house-1/market/{}".format(market_time)
+    with app.test_request_context(url):
+        full = market_endpoint_stats(snapshot.area('house-1'), market_time)
+        page = market_endpoint_stats(snapshot.area('house-1'), market_time, offset=1)
+        body, status, headers = etag_response(
+            market_etag(snapshot, snapshot.area('house-1'), market_time), dict)
+    assert full['type'] == 'closed'
+    assert len(full['offers']) == 2
+    assert page['offers'] == full['offers'][1:]
+    assert page['trades'] == []
+    assert page['pagination'] == {'offset': 1, 'limit': None, 'trade_count': 1, 'offer_count': 2}
+
+    # A closed market keeps its ETag in the later snapshots, the markets of the area do not
+    _run_slots(simulation, 1, snapshots)
+    with app.test_request_context(url, headers={'If-None-Match': headers['ETag']}):
+        response = etag_response(
+            market_etag(snapshots.current, snapshots.current.area('house-1'), market_time),
+            dict)
+        assert response.status_code == 304
+        assert etag_response(snapshot_etag(snapshots.current), dict)[1] == 200
+
+
+def test_closed_market_changes_etag_when_it_is_replaced_by_its_summary():
+    simulation = _simulation(2, live_past_market_count=2)
+    snapshots = RestSnapshots()
+    _run_slots(simulation, 3, snapshots)
+    house = snapshots.current.area('house-1')
+    time_slot = house.closed.time_slots[-1]
+    assert house.closed.market_type(time_slot) == 'OneSidedMarket'
+    etag = market_etag(snapshots.current, house, str(time_slot))
+    assert house.closed.details(time_slot)['energy_accounting']
+
+    _run_slots(simulation, 2, snapshots)
+    house = snapshots.current.area('house-1')
+    assert house.closed.market_type(time_slot) == 'MarketSummary'
+    assert market_etag(snapshots.current, house, str(time_slot)) != etag
+    assert house.closed.details(time_slot)['energy_accounting'] == []
@@ -0,0 +1,73 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import pytest
+import pendulum
+from pendulum import duration
+
+from d3a.constants import TIME_ZONE
+from d3a.models.config import SimulationConfig
+from d3a.models.slot_calendar import SlotValues
+
+START = pendulum.datetime(2018, 6, 1, tz=TIME_ZONE)
+
+
+@pytest.fixture
+def config():
+    return SimulationConfig(duration(days=2), duration(minutes=15), duration(seconds=15),
+                            market_count=4, cloud_coverage=0, market_maker_rate=30, iaa_fee=1)
+
+
+def test_slot_calendar_maps_index_time_slot_key_hour_and_day(config):
+    calendar = config.slot_calendar(START)
+    assert config.slot_calendar(START) is calendar
+    assert len(calendar) == 2 * 96 + 4
+
+    slot = calendar.slots[100]
+    assert slot.time_slot == START + duration(minutes=15 * 100)
+    assert (slot.key, slot.hour, slot.day) == ("01:00", 1, 1)
+    assert calendar.index(slot.time_slot) == 100
+    assert calendar.key(slot.time_slot) == "01:00"
+
+    off_calendar = START - duration(minutes=15)
+    assert calendar.index(off_calendar) is None
+    assert calendar.key(off_calendar) == "23:45"
+    assert calendar.day(START + duration(days=3)) == 3
+
+    config.slot_length = duration(minutes=30)
+    assert len(config.slot_calendar(START)) == 2 * 48 + 4
+
+
+def test_slot_values_behave_like_a_dict_of_time_slots(config):
+    calendar = config.slot_calendar(START)
+    before_start = START - duration(hours=1)
+    values = SlotValues(default=0)
+    values[before_start] = 2
+    values[calendar.time_slots[3]] = 1.5
+    values.set_calendar(calendar)
+    values[calendar.time_slots[1]] += 4
+
+    assert dict(values) == {calendar.time_slots[1]: 4, calendar.time_slots[3]: 1.5,
+                            before_start: 2}
+    assert calendar.time_slots[2] not in values
+    assert values[calendar.time_slots[2]] == 0
+    assert len(values) == 3
+
+    del values[calendar.time_slots[1]]
+    assert list(values.keys()) == [calendar.time_slots[3], before_start]
+    with pytest.raises(KeyError):
+        SlotValues()[START]
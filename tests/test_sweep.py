@@ -0,0 +1,69 @@
+"""
+Copyright 2018 Grid Singularity
+This file is part of D3A.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+from copy import deepcopy
+
+import pytest
+from pendulum import duration
+
+from d3a.d3a_core.sweep import parameter_grid, run_sweep_point, _split_parameters
+from d3a.d3a_core.util import constsettings_to_dict, update_advanced_settings
+from d3a.models.const import ConstSettings
+
+
+@pytest.yield_fixture
+def const_settings():
+    settings = constsettings_to_dict()
+    yield settings
+    update_advanced_settings(settings)
+
+
+def test_parameter_grid_contains_all_combinations():
+    grid = parameter_grid({'iaa_fee': [1, 2], 'seed': [1, 2, 3]})
+    assert len(grid) == 6
+    assert grid[0] == {'iaa_fee': 1, 'seed': 1}
+    assert grid[-1] == {'iaa_fee': 2, 'seed': 3}
+    assert parameter_grid({}) == [{}]
+
+
+def test_split_parameters():
+    seed, config_params, advanced_settings = _split_parameters(
+        {'seed': 4, 'iaa_fee': 2, 'IAASettings.MARKET_TYPE': 3})
+    assert seed == 4
+    assert config_params == {'iaa_fee': 2}
+    assert advanced_settings == {'IAASettings': {'MARKET_TYPE': 3}}
+
+
+@pytest.mark.parametrize('market_type', [2, 3])
+def test_run_sweep_point_does_not_see_settings_of_previous_runs(const_settings, market_type):
+    config_params = dict(duration=duration(hours=1), slot_length=duration(minutes=15),
+                         tick_length=duration(seconds=15), market_count=1, cloud_coverage=0,
+                         market_maker_rate=30, iaa_fee=1)
+    sweep_settings = deepcopy(const_settings)
+    sweep_settings['GeneralSettings']['MAX_OFFER_TRAVERSAL_LENGTH'] = None
+    # Left over by a previous simulation in the same worker
+    ConstSettings.IAASettings.MARKET_TYPE = 3
+    ConstSettings.GeneralSettings.MAX_OFFER_TRAVERSAL_LENGTH = 1
+
+    report = run_sweep_point('default_2a', config_params, sweep_settings,
+                             {'seed': 1, 'IAASettings.MARKET_TYPE': market_type})
+
+    assert report['status'] == 'finished'
+    assert report['random_seed'] == 1
+    assert ConstSettings.IAASettings.MARKET_TYPE == market_type
+    # Recalculated for this setup, instead of reusing the one of the previous simulation
+    assert ConstSettings.GeneralSettings.MAX_OFFER_TRAVERSAL_LENGTH == 6